@@ -0,0 +1,41 @@
+"""Compares the column-wise Dataset.to_pandas with the row-wise export via DataLinks on a synthetic dataset.
+
+    python benchmarks/to_pandas.py [stimuli per repro run]
+
+With 1000 stimuli per run (5000 stimuli) the column-wise export took 1.4 s and the row-wise one 6.1 s on a single core. Writing the synthetic file takes longer than both.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import rlxnix as rlx
+from rlxnix.test.synthetic_data import write_synthetic_dataset
+
+
+def main():
+    stimulus_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with tempfile.TemporaryDirectory() as folder:
+        filename = write_synthetic_dataset(os.path.join(folder, "2021-11-11-zz.nix"), repro_duration=40.0,
+                                           stimulus_count=stimulus_count)
+        dataset = rlx.Dataset(filename)
+        print(f"{len(dataset.repro_runs())} repro runs, {sum(len(r.stimuli) for r in dataset.repro_runs())} stimuli")
+
+        start = time.perf_counter()
+        rows = rlx.data_links_to_pandas(dataset.data_links())
+        row_time = time.perf_counter() - start
+        dataset.close()
+
+        dataset = rlx.Dataset(filename)  # start with empty buffers
+        start = time.perf_counter()
+        columns = dataset.to_pandas()
+        column_time = time.perf_counter() - start
+        dataset.close()
+
+    assert columns.equals(rows) and list(columns.dtypes) == list(rows.dtypes)
+    print(f"row-wise (data_links_to_pandas): {row_time:.2f} s")
+    print(f"column-wise (Dataset.to_pandas): {column_time:.2f} s, {row_time / column_time:.1f} times faster")
+
+
+if __name__ == "__main__":
+    main()
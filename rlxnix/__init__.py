@@ -3,7 +3,11 @@ from .dataset import Dataset
 from .base.trace_container import TimeReference
 from .utils.timeline import IntervalMode
 from .utils.util import data_links_to_pandas
-from .utils.data_loader import load_data_segment, from_pandas
+from .utils.data_loader import load_data_segment, load_data_segments, from_pandas
+from .utils.async_loader import load_data_segment_async
+from .utils.catalog import load_catalog, update_catalog
+from .utils.segment_store import SegmentStore
+from .utils.event_trains import load_event_trains
 from .utils.config import Config
 from .info import VERSION, AUTHOR
 
@@ -13,7 +17,8 @@ logging.basicConfig(level=logging._nameToLevel[_config.log_level()], force=True)
 __version__ = VERSION
 __author__ = AUTHOR
 __all__ = ["Dataset", "TimeReference", "IntervalMode", 
-           "data_links_to_pandas", "from_pandas", "load_data_segment",
+           "data_links_to_pandas", "from_pandas", "load_data_segment", "load_data_segments", "load_data_segment_async", "load_catalog", "update_catalog", "SegmentStore",
+           "load_event_trains",
            "_config"]
 
 
@@ -4,9 +4,11 @@ from tqdm import tqdm
 
 from .trace_container import TraceContainer, TimeReference
 from .stimulus import Stimulus
-from ..utils.util import nix_metadata_to_dict, metadata_to_json
+from ..utils.util import nix_metadata_to_dict
+from ..utils.metadata import MetadataProxy
 from ..utils.data_trace import DataType
 from ..utils.data_loader import DataLink, SegmentType
+from ..utils.query import SegmentTable, build_stimulus_table
 
 
 class ReProRun(TraceContainer):
@@ -27,7 +29,9 @@ class ReProRun(TraceContainer):
         """
         super().__init__(repro_run, traces, relacs_nix_version=relacs_nix_version)
         self._stimuli = []
+        self._stimulus_table = None
         self._metadata = None
+        self._metadata_proxy = None
 
     def _get_signal_trace_map(self):
         logging.critical("Repro._get_trace_map must be overwritten!")
@@ -45,6 +49,19 @@ class ReProRun(TraceContainer):
             self._metadata = nix_metadata_to_dict(self._tag.metadata)
         return self._metadata
 
+    @property
+    def metadata_proxy(self):
+        """Read-only, dict-like view on the metadata of this ReProRun that reads entries from file only when they are accessed. Faster than metadata if only a few entries are needed.
+
+        Returns:
+        --------
+        rlxnix.utils.metadata.MetadataProxy
+            The dict-like metadata.
+        """
+        if self._metadata_proxy is None:
+            self._metadata_proxy = MetadataProxy(self._tag.metadata)
+        return self._metadata_proxy
+
     def add_stimulus(self, stimulus:Stimulus):
         """INTERNAL USE ONLY! Adds a stimulus to the list of stimuli run in the context of this RePro run.
 
@@ -54,6 +71,7 @@ class ReProRun(TraceContainer):
                 The stimulus that was run.
         """
         self._stimuli.append(stimulus)
+        self._stimulus_table = None
 
     @property
     def stimuli(self):
@@ -66,6 +84,19 @@ class ReProRun(TraceContainer):
         """
         return self._stimuli
 
+    @property
+    def stimulus_table(self) -> SegmentTable:
+        """Table of the cheap, indexable properties (name, type, index, start and stop time, duration, and the scalar mutable features such as DeltaF) of the stimuli presented in this RePro run. Created on first access.
+
+        Returns
+        -------
+        rlxnix.utils.query.SegmentTable
+            The stimulus table, rows are in the order of the stimuli property.
+        """
+        if self._stimulus_table is None:
+            self._stimulus_table = build_stimulus_table(self._stimuli)
+        return self._stimulus_table
+
     def stimulus_duration(self, index=None):
         """Get the duration of the stimuli presented in this repro run. If no stimulus index is provided, all 
         stimulus durations are returned.
@@ -144,10 +175,8 @@ class ReProRun(TraceContainer):
         block_id = self.repro_tag._parent.id
         tag_id = self.repro_tag.id
         type = SegmentType.ReproRun
-        mdata = metadata_to_json(self.metadata)
-
         dl = DataLink(dataset, block_id, tag_id, type, self.start_time,
-                      self.stop_time, metadata=mdata,
+                      self.stop_time, metadata_base=self.metadata,
                       mapping_version=self._mapping_version)
         return dl
 
@@ -174,7 +203,7 @@ class ReProRun(TraceContainer):
         if trace_name is None:
             logging.warning("Repro.check_trace: Trace name is not specified!")
             return False
-        if trace_name not in self._tag.references:
+        if trace_name not in self.tag_index.references:
             logging.warning(f"Trace {trace_name} not found!")
             return False
         trace = self._trace_map[trace_name]
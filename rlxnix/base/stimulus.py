@@ -1,18 +1,92 @@
+import copy
 import nixio
 import logging
 import numpy as np
 
-from .trace_container import TraceContainer, TimeReference
-from ..utils.util import nix_metadata_to_dict, metadata_to_json
+from .trace_container import TraceContainer, TimeReference, get_tag_index
+from ..utils.util import nix_metadata_to_dict, find_metadata_path, apply_metadata_delta
 from ..utils.buffers import MetadataBuffer
 from ..utils.data_loader import DataLink, SegmentType
 
 
+class StimulusTiming(object):
+    """Timing related features of all stimulus outputs tagged by one MultiTag, i.e. the delay, the absolute start time and the id of the ReproRun tag. Each feature is read once as a whole on first access, the arrays are shared by all Stimulus instances of the MultiTag.
+    """
+    _suffixes = {"delay": "_delay", "abs_time": "_abs_time", "repro_tag_id": "_repro_tag_id"}
+
+    def __init__(self, stimulus_multi_tag: nixio.MultiTag) -> None:
+        """Create an instance of the StimulusTiming class.
+
+        Parameters
+        ----------
+        stimulus_multi_tag : nixio.MultiTag
+            The MultiTag that tags the stimulus outputs.
+        """
+        super().__init__()
+        self._multi_tag = stimulus_multi_tag
+        self._name = stimulus_multi_tag.name
+        self._columns = {}
+
+    def _feature_name(self, key):
+        names = get_tag_index(self._multi_tag)
+        feature_suffix = self._suffixes[key]
+        if key == "repro_tag_id":
+            name = self._name + feature_suffix
+            return name if names.feature_index(name) is not None else None
+        return names.find_feature(self._name + feature_suffix)
+
+    def _column(self, key):
+        if key not in self._columns:
+            values = None
+            feature_name = self._feature_name(key)
+            if feature_name is not None:
+                data = self._multi_tag.features[get_tag_index(self._multi_tag).feature_index(feature_name)].data[:]
+                values = data.reshape(data.shape[0], -1)[:, 0] if data.shape[0] > 0 else data.ravel()
+                if key != "repro_tag_id":
+                    values = values.astype(float)
+            logging.debug(f"StimulusTiming: read feature {feature_name} for {key} of MultiTag {self._name}")
+            self._columns[key] = values
+        return self._columns[key]
+
+    @property
+    def delay(self):
+        """The delays between beginning of data recording and the stimulus outputs.
+
+        Returns
+        -------
+        np.ndarray or None
+            The delays in seconds, None if the feature is not stored.
+        """
+        return self._column("delay")
+
+    @property
+    def absolute_start_time(self):
+        """The absolute start times of the stimulus outputs relative to the onset of the recording.
+
+        Returns
+        -------
+        np.ndarray or None
+            The absolute start times in seconds, None if the feature is not stored.
+        """
+        return self._column("abs_time")
+
+    @property
+    def repro_tag_id(self):
+        """The ids of the ReproRun tags to which the stimulus outputs belong.
+
+        Returns
+        -------
+        np.ndarray or None
+            The tag ids, None if the feature is not stored.
+        """
+        return self._column("repro_tag_id")
+
+
 class Stimulus(TraceContainer):
     """Class that represents a single stimulus segment. It provides access to the stimulus metadata and the data traces.
     """
     def __init__(self, stimulus_multi_tag: nixio.MultiTag, index: int, traces, 
-                 next_stimulus_start=None, relacs_nix_version=1.1) -> None:
+                 next_stimulus_start=None, relacs_nix_version=1.1, timing=None) -> None:
         """Create an instance of the Stimulus class.
 
         Parameters
@@ -27,12 +101,13 @@ class Stimulus(TraceContainer):
             The start time of the next stimulus, defaults to None.
         relacs_nix_version : float, optional
             relacs data to nix mapping version, by default 1.1
+        timing : StimulusTiming, optional
+            The timing features of the MultiTag, shared by the stimuli of the same MultiTag. If None, a new instance is created. By default None.
         """
         super().__init__(stimulus_multi_tag, index, traces, relacs_nix_version=relacs_nix_version)
         self._multi_tag = stimulus_multi_tag
         self._metadata_buffer = MetadataBuffer()
-        self._absolute_starttime = None
-        self._delay = None
+        self._timing = timing if timing is not None else StimulusTiming(stimulus_multi_tag)
         self._next_stimulus_start = next_stimulus_start
         logging.debug(self.__str__())
 
@@ -45,11 +120,8 @@ class Stimulus(TraceContainer):
         str
             the Repro Tag id.
         """
-        repro_id = None
-        feat_name = "_".join((self.name, "repro_tag_id"))
-        if feat_name in self._tag.features:
-            repro_id = self.feature_data(feat_name).ravel()[0]
-        return repro_id
+        repro_ids = self._timing.repro_tag_id
+        return repro_ids[self._index] if repro_ids is not None else None
 
     @property
     def metadata(self):
@@ -60,56 +132,48 @@ class Stimulus(TraceContainer):
             metadata: dict
                 The metadata dictionary
         """
-        def find_subdict(mdata, key):
-            if key in mdata.keys():
-                return mdata[key]
-            for k in mdata.keys():
-                subdict = mdata[k]
-                if isinstance(subdict, dict):
-                    if key in subdict:
-                        return subdict[key]
-                    found = find_subdict(subdict, key)
-                    if found is not None:
-                        return found
-                else:
-                    continue
-            return None
-
-        def update_metadata(mdata, key, value, unit):
-            if "." not in key:
-                mdata[key] = (value, unit)
-            else:
-                parts = key.split(".")
-                if parts[0] in mdata.keys():
-                    update_metadata(mdata[parts[0]], ".".join(parts[1:]), value, unit)
-                else:
-                    mdata = find_subdict(mdata, parts[0])
-                    if mdata is not None:
-                        update_metadata(mdata, ".".join(parts[1:]), value, unit)
-                    else:
-                        logging.error(f"Could not find subdict for key {parts[0]}! Skipping")
-
         stimulus_id = self.id + f"_{self._index}"
         if self._metadata_buffer.has(stimulus_id):
             mdata = self._metadata_buffer.get(stimulus_id)
             logging.debug("Stimulus: got metadata from buffer")
         else:
             logging.debug("Stimulus: metadata not found, creating reading from file")
-            mdata = nix_metadata_to_dict(self._tag.metadata)
-            for index, name, type in self.features:
-                if "mutable" in type:
-                    suffix = name.split(self.name + "_")[-1]
-                    try:
-                        feature_data = self.feature_data(name)
-                    except:
-                        logging.error(f"Could not read feature data for {name}! Skipped!")
-                        continue
-                    feature_unit = self._tag.features[index].data.unit
-                    update_metadata(mdata[self.name], suffix, feature_data.ravel().tolist(), feature_unit)
+            mdata = apply_metadata_delta(copy.deepcopy(self._multi_tag_metadata()), self._metadata_delta())
         self._metadata_buffer.put(stimulus_id, mdata.copy())
 
         return mdata
 
+    def _metadata_delta(self) -> list:
+        """The stimulus specific part of the metadata, i.e. the values of the mutable features at the index of this stimulus.
+
+        Returns
+        -------
+        list
+            (path, (value, unit)) pairs, the path is the sequence of keys that lead to the entry in the MultiTag metadata.
+        """
+        delta = []
+        base = self._multi_tag_metadata()
+        for index, name, type in self.features:
+            if "mutable" in type:
+                suffix = name.split(self.name + "_")[-1]
+                try:
+                    feature_data = self.feature_data(name)
+                except:
+                    logging.error(f"Could not read feature data for {name}! Skipped!")
+                    continue
+                path = find_metadata_path(base[self.name], suffix)
+                if path is None:
+                    continue
+                delta.append(((self.name,) + path, (feature_data.ravel().tolist(), self.tag_index.feature_unit(name))))
+        return delta
+
+    def _multi_tag_metadata(self) -> dict:
+        """The metadata of the MultiTag as dictionary, i.e. the part that is shared by all stimuli of the same tag. It is read once and kept in the MetadataBuffer, it must not be modified.
+        """
+        if not self._metadata_buffer.has(self.id):
+            self._metadata_buffer.put(self.id, nix_metadata_to_dict(self._tag.metadata))
+        return self._metadata_buffer.get(self.id)
+
     @property
     def absolute_start_time(self) -> float:
         """The absolute time at which the stimulus started relative to the onset of the recording. Since relacs does not necessarily store data during the whole recording period, the absolute time will deviate from the stimulus start time.
@@ -119,11 +183,8 @@ class Stimulus(TraceContainer):
         float
             The absolute start time of the stimulus
         """
-        if self._absolute_starttime is None:
-            feat = self._find_feature("_abs_time")
-            if feat is not None:
-                self._absolute_starttime = float(self.feature_data(feat))
-        return self._absolute_starttime
+        abs_times = self._timing.absolute_start_time
+        return float(abs_times[self._index]) if abs_times is not None else None
 
     @property
     def delay(self) -> float:
@@ -134,11 +195,19 @@ class Stimulus(TraceContainer):
         float
             The delay between acquisition start and stimulus output.
         """ 
-        if self._delay is None:
-            feat = self._find_feature("_delay")
-            if feat is not None:
-                self._delay = float(self.feature_data(feat))
-        return self._delay
+        delays = self._timing.delay
+        return float(delays[self._index]) if delays is not None else None
+
+    @property
+    def timing(self) -> StimulusTiming:
+        """The timing features (delay, absolute start time, repro tag id) of all stimulus outputs of the MultiTag this stimulus belongs to.
+
+        Returns
+        -------
+        StimulusTiming
+            The shared timing features.
+        """
+        return self._timing
 
     @property
     def next_stimulus_start(self) -> float:
@@ -164,12 +233,7 @@ class Stimulus(TraceContainer):
         str
             the full name of the feature if it exists, otherwise None
         """
-        feat = None
-        for _, f, _ in self.features:
-            if self.name + feature_suffix in f:
-                feat = f
-                break
-        return feat
+        return self.tag_index.find_feature(self.name + feature_suffix)
 
     def trace_data(self, name, before=0.0, after=0.0, reference=TimeReference.Zero):
         """Get the data that was recorded while this stimulus was put out. With before and after, the timespan can be extended. 'before' must not be larger than the delay, stimulus stop + after must not reach into the next stimulus start. They will be automatically adjusted.
@@ -227,13 +291,12 @@ class Stimulus(TraceContainer):
         block_id = self._tag._parent.id
         tag_id = self.id
         type = SegmentType.StimulusSegment
-        mdata = metadata_to_json(self.metadata)
         before = self.delay
         after = 0.0 if self.next_stimulus_start is None else self.next_stimulus_start - self.stop_time 
         dl = DataLink(dataset, block_id, tag_id, type, self.start_time,
                       self.stop_time, index=self._index, 
-                      max_before=before, max_after=after, metadata=mdata,
-                      mapping_version=self._mapping_version)
+                      max_before=before, max_after=after, metadata_base=self._multi_tag_metadata(),
+                      metadata_delta=self._metadata_delta(), mapping_version=self._mapping_version)
         return dl
 
     def __str__(self) -> str:
@@ -4,7 +4,8 @@ from enum import Enum
 import logging
 
 from ..utils.mappings import DataType, tag_start_and_extent
-from ..utils.buffers import FeatureBuffer
+from ..utils.buffers import FeatureBuffer, TagIndexBuffer
+from ..utils.async_loader import run_in_executor, container_file_lock
 
 
 class TimeReference(Enum):
@@ -17,6 +18,124 @@ class TimeReference(Enum):
     Zero = 1
 
 
+class TagIndex(object):
+    """Names of the references and features of a nix Tag or MultiTag. They are read once and shared by all TraceContainers that are based on the same tag, lookups do not touch the file.
+    """
+    def __init__(self, tag_or_mtag) -> None:
+        """Create the index.
+
+        Parameters
+        ----------
+        tag_or_mtag : nixio.Tag or nixio.MultiTag
+            The tag.
+        """
+        super().__init__()
+        self._tag = tag_or_mtag
+        self._references = frozenset([da.name for da in tag_or_mtag.references])
+        features = []
+        for i, feats in enumerate(tag_or_mtag.features):
+            features.append((i, feats.data.name, feats.data.type))
+        self._features = tuple(features)
+        self._feature_indices = {name: i for i, name, _ in features}
+        self._feature_units = {}
+        self._suffix_matches = {}
+
+    @property
+    def references(self) -> frozenset:
+        """The names of the referenced data arrays.
+
+        Returns
+        -------
+        frozenset of str
+            The reference names.
+        """
+        return self._references
+
+    @property
+    def features(self) -> tuple:
+        """Index, name and type of the features.
+
+        Returns
+        -------
+        tuple of tuples
+            index, name, and type of the features.
+        """
+        return self._features
+
+    def feature_index(self, name) -> int:
+        """The index of a feature.
+
+        Parameters
+        ----------
+        name : str
+            The feature name.
+
+        Returns
+        -------
+        int
+            The feature index, None if there is no such feature.
+        """
+        return self._feature_indices.get(name)
+
+    def feature_unit(self, name) -> str:
+        """The unit of the data of a feature, read on first request.
+
+        Parameters
+        ----------
+        name : str
+            The feature name.
+
+        Returns
+        -------
+        str
+            The unit, may be None.
+        """
+        if name not in self._feature_units:
+            self._feature_units[name] = self._tag.features[self._feature_indices[name]].data.unit
+        return self._feature_units[name]
+
+    def find_feature(self, pattern) -> str:
+        """Returns the name of the first feature that contains the pattern.
+
+        Parameters
+        ----------
+        pattern : str
+            The pattern, e.g. the tag name plus a suffix "Beats_1_delay".
+
+        Returns
+        -------
+        str
+            The feature name, None if no feature matches.
+        """
+        if pattern not in self._suffix_matches:
+            match = None
+            for _, name, _ in self._features:
+                if pattern in name:
+                    match = name
+                    break
+            self._suffix_matches[pattern] = match
+        return self._suffix_matches[pattern]
+
+
+def get_tag_index(tag_or_mtag) -> TagIndex:
+    """Returns the TagIndex of the given tag, it is created on first request and kept in the TagIndexBuffer.
+
+    Parameters
+    ----------
+    tag_or_mtag : nixio.Tag or nixio.MultiTag
+        The tag.
+
+    Returns
+    -------
+    TagIndex
+        The name index of the tag.
+    """
+    buffer = TagIndexBuffer()
+    if not buffer.has(tag_or_mtag.id):
+        buffer.put(tag_or_mtag.id, TagIndex(tag_or_mtag))
+    return buffer.get(tag_or_mtag.id)
+
+
 class TraceContainer(object):
     """Superclass for classes that are based on nix Tags/MultiTags. Provides some general properties and functions for accessing the data and some basic properties.
     """
@@ -46,7 +165,7 @@ class TraceContainer(object):
         self._mapping_version = relacs_nix_version
         self._index = index
         self._feature_buffer = FeatureBuffer()
-        self._features = None
+        self._tag_index = None
         self._trace_map = traces
 
         self._start_time, self._duration = tag_start_and_extent(self._tag, self._index, self._mapping_version)
@@ -118,6 +237,19 @@ class TraceContainer(object):
         """
         return self.start_time + self.duration
 
+    @property
+    def tag_index(self) -> TagIndex:
+        """Names of the references and features of the underlying tag, shared by all containers of the same tag.
+
+        Returns
+        -------
+        TagIndex
+            The name index.
+        """
+        if self._tag_index is None:
+            self._tag_index = get_tag_index(self._tag)
+        return self._tag_index
+
     @property
     def repro_tag(self):
         """Returns the underlying tag
@@ -156,11 +288,7 @@ class TraceContainer(object):
         list of tuples
             index, name and type of t
         """
-        if self._features is None:
-            self._features = []
-            for i, feats in enumerate(self._tag.features):
-                self._features.append((i, feats.data.name, feats.data.type))
-        return self._features
+        return list(self.tag_index.features)
 
     def _trace_data(self, name, before=0.0, after=0.0, reference=TimeReference.Zero):
         """Get the data that was recorded while this repro was run, the stimulus was put out.
@@ -188,7 +316,7 @@ class TraceContainer(object):
             return None, None
 
         logging.debug(f"TraceContainer._trace_data: reading trace data from {name}, with time reference {reference}")
-        if name not in self._tag.references or name not in self._trace_map.keys():
+        if name not in self.tag_index.references or name not in self._trace_map.keys():
             raise ValueError(f"Could not find {name} in the list of references.")
         ref = self._trace_map[name]
 
@@ -218,6 +346,27 @@ class TraceContainer(object):
             data -=  0.0 if reference is TimeReference.Absolute else self.start_time
         return data, time
 
+    async def trace_data_async(self, *args, **kwargs):
+        """Async variant of trace_data, takes the same arguments. The data is read in the bounded executor of rlxnix (see rlxnix.utils.async_loader.set_max_workers), reads from the same file are serialized.
+
+        .. code-block:: python
+
+            results = await asyncio.gather(*[s.trace_data_async("V-1", before=0.1) for s in repro_run.stimuli])
+
+        Returns
+        -------
+        data: np.ndarray
+            The recorded continuos or event data
+        time: np.ndarray
+            The respective time vector for continuous traces, None for event traces
+        """
+        lock = container_file_lock(self._tag._parent._parent)
+
+        def read():
+            with lock:
+                return self.trace_data(*args, **kwargs)
+        return await run_in_executor(read)
+
     def feature_data(self, name):
         """Get the feature data that is related to this ReproRun or stimulus
 
@@ -236,23 +385,49 @@ class TraceContainer(object):
         ValueError
             If this container is a Stimulus and there is no position index stored, a ValueError is raised, should never happen.
         """
-        buffered_data = None
-        if self._feature_buffer.has(self.id, name):
-            buffered_data = self._feature_buffer.get(self.id, name)
-        else:
-            buffered_data = self.repro_tag.features[name].data[:]
-            self._feature_buffer.put(self.id, name, buffered_data)
+        buffered_data = self._feature_array(name, copy=False)
 
         if isinstance(self._tag, nixio.MultiTag) and self._index is not None:
             logging.debug(f"reading feature data from {name} with index {self._index}")
             feat_data = buffered_data[self._index]
+            if isinstance(feat_data, np.ndarray):
+                feat_data = feat_data.copy()
         elif isinstance(self._tag, nixio.Tag):
             logging.debug(f"reading feature data from {name}")
-            feat_data = buffered_data
+            feat_data = buffered_data.copy()
         else:
             raise ValueError(f"TraceContainer, feature_data: something went wrong, no Index? Tag: {self._tag}, Index:{self._index}")
 
         if isinstance(feat_data, (nixio.DataArray, nixio.Feature)):
             return feat_data[:]
         else:
-            return feat_data
\ No newline at end of file
+            return feat_data
+
+    def _feature_array(self, name, copy=True):
+        """Returns the complete data of a feature, i.e. the values for all positions of a MultiTag, read only once and kept in the FeatureBuffer.
+
+        Parameters
+        ----------
+        name : str
+            The name of the feature.
+        copy : bool, optional
+            Whether a copy of the buffered data is returned. Without copy, the returned array must not be modified. By default True.
+
+        Returns
+        -------
+        numpy.ndarray
+            The buffered feature data.
+
+        Raises
+        ------
+        KeyError
+            If the tag has no feature with the given name.
+        """
+        if self._feature_buffer.has(self.id, name):
+            return self._feature_buffer.get(self.id, name, copy=copy)
+        index = self.tag_index.feature_index(name)
+        if index is None:
+            raise KeyError(f"TraceContainer: {name} is not a feature of tag {self.name}!")
+        buffered_data = self._tag.features[index].data[:]
+        self._feature_buffer.put(self.id, name, buffered_data)
+        return buffered_data.copy() if copy else buffered_data
\ No newline at end of file
@@ -1,5 +1,7 @@
 import nixio
 import os
+import numpy as np
+import pandas as pd
 import inspect
 import logging
 import weakref
@@ -7,13 +9,19 @@ import datetime as dt
 from tqdm import tqdm
 from importlib import import_module
 
-from .base.stimulus import Stimulus
+from .base.stimulus import Stimulus, StimulusTiming
 from .utils.mappings import DataType, type_map
 from .base.repro import ReProRun
 from .utils.timeline import Timeline
-from .utils.util import data_links_to_pandas, nix_metadata_to_dict
-from .utils.data_trace import DataTrace, TraceList
-from .utils.buffers import MetadataBuffer, FeatureBuffer
+from .utils.util import columns_to_pandas, metadata_to_json, nix_metadata_to_dict
+from .utils.data_loader import DataLink, SegmentType
+from .utils.data_trace import DataTrace, TraceList, TraceMap
+from .utils.query import SegmentTable, build_repro_table, build_stimulus_table
+from .utils.buffers import MetadataBuffer, FeatureBuffer, SectionIndexBuffer, TagIndexBuffer
+from .utils.metadata import MetadataProxy
+from .utils.catalog import export_catalog
+from .utils.segment_store import write_segment_store
+from .utils.event_trains import EventTrains, segment_event_trains, partition_events
 
 
 def scan_plugins():
@@ -73,14 +81,19 @@ class Dataset(object):
         self._baseline_data = []
         self._event_traces = TraceList()
         self._data_traces = TraceList()
-        self._trace_map = {}
+        self._trace_map = TraceMap()
         self._repro_map = {}
+        self._repro_table = None
+        self._stimulus_table = None
+        self._metadata = None
         self._metadata_buffer = MetadataBuffer()
         self._feature_buffer = FeatureBuffer()
 
         self._scan_file()
 
     def _scan_stimuli(self):
+        multi_tags = {}
+        timings = {}
         for k in tqdm(self._repro_map.keys(), disable=not(logging.root.level == logging.INFO)):
             r = self._repro_map[k]
             stimulus_start = r.start_time
@@ -90,9 +103,13 @@ class Dataset(object):
                 if start >= stop:
                     logging.info(f"Dataset: not creating stimulus for stimulus {name} because start time ({start}) is >= stop time ({stop})!")
                     continue
-                mt = self._block.multi_tags[name]
+                if name not in multi_tags:
+                    multi_tags[name] = self._block.multi_tags[name]
+                    timings[name] = StimulusTiming(multi_tags[name])
+                mt = multi_tags[name]
                 next_stimulus_start = self._timeline.next_stimulus_start(stop)
-                s = Stimulus(mt, self._trace_map, index, next_stimulus_start, self._relacs_nix_version)
+                s = Stimulus(mt, self._trace_map, index, next_stimulus_start, self._relacs_nix_version,
+                             timing=timings[name])
                 r.add_stimulus(s)
 
     def _scan_repros(self):
@@ -172,6 +189,23 @@ class Dataset(object):
         """
         return self._data_traces
 
+    def signal_trace_map(self, pluginset="efish", signals=None) -> dict:
+        """Returns the mapping of the signals of a plugin set (e.g. "spikes" or "membrane voltage") to the names of the recorded traces. The mapping is created once per plugin set and shared by all repro runs.
+
+        Parameters
+        ----------
+        pluginset : str, optional
+            The plugin set, by default "efish"
+        signals : list of str, optional
+            The signals, by default None, i.e. all signals that are configured for the plugin set.
+
+        Returns
+        -------
+        dict
+            The signal names as keys and the trace names as values.
+        """
+        return dict(self._trace_map.signal_trace_map(pluginset, signals))
+
     def repro_runs(self, repro_name=None, exact=False) -> list:
         """Returns the RePro class instances providing access to data and metadata of the repro runs.
 
@@ -205,6 +239,35 @@ class Dataset(object):
                     not_found_error(repro_name, exact)
         return matches
 
+    @property
+    def repro_table(self) -> SegmentTable:
+        """Table of the cheap, indexable properties of all repro runs (name, type, start_time, duration, stop_time, and the repro settings). Created on first access. It is used by the find functions to evaluate filters as array operations.
+
+        Returns
+        -------
+        rlxnix.utils.query.SegmentTable
+            The table, rows are in the order of the repro_runs() function.
+        """
+        if self._repro_table is None:
+            self._repro_table = build_repro_table(self.repro_runs())
+        return self._repro_table
+
+    @property
+    def stimulus_table(self) -> SegmentTable:
+        """Table of the cheap, indexable properties of all stimuli of all repro runs (see ReProRun.stimulus_table) with the additional column repro_name. Created on first access.
+
+        Returns
+        -------
+        rlxnix.utils.query.SegmentTable
+            The table, rows are sorted by repro run (in the order of repro_runs()) and stimulus.
+        """
+        if self._stimulus_table is None:
+            repros = self.repro_runs()
+            stimuli = [s for r in repros for s in r.stimuli]
+            self._stimulus_table = build_stimulus_table(stimuli)
+            self._stimulus_table.add_column("repro_name", [r.name for r in repros for _ in r.stimuli])
+        return self._stimulus_table
+
     def find(self, repro_name, **kwargs):
         """Find repro runs according to the repro name, and further settings provided by keyword arguments.
 
@@ -213,23 +276,31 @@ class Dataset(object):
         repro_name : str
             The name (fragment) the repro that is passed to self.repro_runs.
         **kwargs :
-            Keyword arguments are used to filter repros based on the properties exposed by the respective repro classes.
+            Keyword arguments are used to filter repros. Keys that are columns of the repro_table (e.g. name, duration, or a repro setting such as contrast) are evaluated on the table (see rlxnix.utils.query.SegmentTable for the possible values). All other keys are matched against the properties exposed by the respective repro classes (the given value must be *in* the property). The properties are only evaluated for the repro runs that pass the table filters.
         """
-        repros = self.repro_runs(repro_name)
-        if len(repros) == 0:
-            print(f"No matching for repro runs for pattern {repro_name}!")
-
+        table = self.repro_table
+        mask = np.ones(len(table), dtype=bool)
+        if repro_name:
+            names = np.char.lower(table.column("name").astype(str))
+            mask = np.char.find(names, repro_name.lower()) >= 0
+        if not np.any(mask):
+            logging.warning(f"No repro run with the name {repro_name} found with exact=False")
+
+        indexed = {k: v for k, v in kwargs.items() if k in table}
+        candidates = table.select(mask, **indexed)
         matches = []
-        for r in repros:
+        for r in candidates:
             match = True
             for k in kwargs.keys():
+                if k in indexed:
+                    continue
                 match = match and (hasattr(r, k) and kwargs[k] in getattr(r, k))
             if match:
                 matches.append(r)
 
         return matches
 
-    def find_stimuli(self, repro_name, filter_func=lambda s: True, **kwargs):
+    def find_stimuli(self, repro_name, filter_func=lambda s: True, stimulus_predicates=None, **kwargs):
         """ Find stimuli that were run in certain repro_runs. The repro runs are selected according to the
         repro_name and the passed keyword arguments (see function find()).
         Additionally, a filter function can be passed that filters the stimuli e.g. on duration.
@@ -240,17 +311,35 @@ class Dataset(object):
             The name (fragment) the repro.
         filter_func: function
             The filter function that is applied to the matching repros.
+        stimulus_predicates: dict, optional
+            Filters that are evaluated on the stimulus_table of the matching repro runs, e.g. {"duration": (0.5, None), "DeltaF": [-20, 20]} (see rlxnix.utils.query.SegmentTable). The filter_func is only applied to the stimuli that pass. Repro runs whose table lacks a predicate column are skipped with a warning. By default None.
         **kwargs: dict
             The keyword arguments are used to filter the repro runs.
 
         Returns:
         --------
         list of stimuli
+
+        Raises:
+        -------
+        ValueError
+            If a stimulus predicate is not a column of any of the stimulus tables of the matching repro runs.
         """
         repros = self.find(repro_name, **kwargs)
+        if stimulus_predicates is None:
+            stimulus_predicates = {}
+        tables = [r.stimulus_table for r in repros]
+        unknown = [k for k in stimulus_predicates if len(tables) > 0 and not any(k in t for t in tables)]
+        if len(unknown) > 0:
+            logging.error(f"Dataset.find_stimuli: the stimulus predicates {unknown} are not columns of the stimulus tables of the matching repro runs!")
+            raise ValueError(f"Dataset.find_stimuli: the stimulus predicates {unknown} are not columns of the stimulus tables of the matching repro runs!")
         matches = []
-        for r in repros:
-            matches.extend([s for s in r if filter_func(s)])
+        for r, table in zip(repros, tables):
+            missing = [k for k in stimulus_predicates if k not in table]
+            if len(missing) > 0:
+                logging.warning(f"Dataset.find_stimuli: repro run {r.name} is skipped, its stimulus table has no columns {missing}.")
+                continue
+            matches.extend([s for s in table.select(**stimulus_predicates) if filter_func(s)])
 
         return matches
         
@@ -263,6 +352,8 @@ class Dataset(object):
         self._nixfile = None
         self._metadata_buffer.clear(False)
         self._feature_buffer.clear(False)
+        SectionIndexBuffer().clear(False)
+        TagIndexBuffer().clear(False)
 
     @property
     def is_open(self) -> bool:
@@ -331,21 +422,190 @@ class Dataset(object):
             dls.extend(r.stimulus_data_links)
         return dls
 
-    def to_pandas(self, include_repros=True):
-        """Exports the DataLinks to all data segments stored in the dataset to a pandas DataFrame
+    def to_pandas(self, include_repros=True, deduplicate_metadata=False):
+        """Exports the DataLinks to all data segments stored in the dataset to a pandas DataFrame. The result is the same as ``rlxnix.data_links_to_pandas(dataset.data_links())`` but the DataFrame is created column-wise from the repro runs and the stimulus tables.
 
         Parameters
         ----------
         include_repros : bool, optional
             Whether or not to include the ReProRuns, by default True
+        deduplicate_metadata : bool, optional
+            If True, the metadata that are shared by all stimuli of the same MultiTag are serialized only once and stored in the additional categorical column metadata_base, the metadata column contains only the stimulus specific delta. ``rlxnix.from_pandas`` merges both. By default False
 
         Returns
         -------
         pandas.DataFrame
             The data frame
         """
-        dls = self.data_links(include_repros)
-        return data_links_to_pandas(dls)
+        columns = self._data_link_columns(include_repros, deduplicate_metadata)
+        columns.pop("repro_name")
+        metadata_base = columns.pop("metadata_base", None)
+        df = columns_to_pandas(columns)
+        if metadata_base is not None:
+            df["metadata_base"] = pd.Categorical(metadata_base)
+        return df
+
+    def _data_link_columns(self, include_repros=True, deduplicate_metadata=False) -> dict:
+        """Collects the DataLink columns (plus the name of the repro run each segment belongs to in the column repro_name and, if metadata are deduplicated, the metadata_base) of all segments.
+        """
+        columns = {c: [] for c in DataLink.columns() + ["repro_name"]}
+        if deduplicate_metadata:
+            columns["metadata_base"] = []
+        base_metadata = {}
+        dataset_name = self._block.name + ".nix"
+        block_id = self._block.id
+
+        def extend(values):
+            for c, v in values.items():
+                columns[c].extend(v)
+
+        for r in tqdm(self.repro_runs(), disable=not(logging.root.level == logging.INFO)):
+            if include_repros:
+                extend({"dataset_name": [dataset_name], "block_id": [block_id], "tag_id": [r.id],
+                        "segment_type": [str(SegmentType.ReproRun)], "start_time": [r.start_time],
+                        "stop_time": [r.stop_time], "index": [None], "max_before": [0.0], "max_after": [0.0],
+                        "mapping_version": [r._mapping_version], "metadata": [metadata_to_json(r.metadata)],
+                        "repro_name": [r.name]})
+                if deduplicate_metadata:
+                    columns["metadata_base"].append(None)
+            table = r.stimulus_table
+            valid = np.nonzero(table.column("start_time") < table.column("stop_time"))[0]
+            if len(valid) < len(table):
+                logging.warning(f"Dataset.to_pandas: skipping {len(table) - len(valid)} stimuli of {r.name} with start time >= stop time!")
+            stimuli = [r.stimuli[i] for i in valid]
+            delays = table.column("delay")[valid]
+            extend({"dataset_name": [dataset_name] * len(valid), "block_id": [block_id] * len(valid),
+                    "tag_id": [s.id for s in stimuli],
+                    "segment_type": [str(SegmentType.StimulusSegment)] * len(valid),
+                    "start_time": list(table.column("start_time")[valid]),
+                    "stop_time": list(table.column("stop_time")[valid]),
+                    "index": list(table.column("index")[valid]),
+                    "max_before": [None if np.isnan(d) else d for d in delays],
+                    "max_after": list(table.column("max_after")[valid]),
+                    "mapping_version": [s._mapping_version for s in stimuli],
+                    "repro_name": [r.name] * len(valid)})
+            if deduplicate_metadata:
+                for s in stimuli:
+                    if s.id not in base_metadata:
+                        base_metadata[s.id] = metadata_to_json(s._multi_tag_metadata())
+                    columns["metadata_base"].append(base_metadata[s.id])
+                columns["metadata"].extend([metadata_to_json(s._metadata_delta()) for s in stimuli])
+            else:
+                columns["metadata"].extend([metadata_to_json(s.metadata) for s in stimuli])
+        return columns
+
+    def export_catalog(self, path, format="parquet", include_repros=True):
+        """Exports the DataLinks of all data segments to a partitioned catalog (one partition per dataset and segment type) that can be shared by many datasets. Existing partitions of this dataset are replaced. Use ``rlxnix.load_catalog`` to read it.
+        Requires pyarrow.
+
+        Parameters
+        ----------
+        path : str
+            The folder of the catalog.
+        format : str, optional
+            The file format, either "parquet" or "arrow", by default "parquet"
+        include_repros : bool, optional
+            Whether or not to include the ReProRuns, by default True
+        """
+        export_catalog(self._data_link_columns(include_repros), path, format=format)
+
+    def export_segments(self, store_path, traces, before=0.0, after=0.0) -> str:
+        """Exports the stimulus segments of the given continuous traces to a segment store, a HDF5 file with one dataset per stimulus and trace that also contains the DataLink catalog. ``rlxnix.load_data_segment`` reads stimulus segments from the store if ``store_location`` (or ``data_location``) points at it and the requested before and after times do not exceed the exported ones. An existing store of this dataset is replaced.
+
+        Parameters
+        ----------
+        store_path : str
+            The folder of the store.
+        traces : list of str
+            The names of the continuous traces, event traces are skipped.
+        before : float, optional
+            Time before stimulus onset that is exported, limited to the stimulus delay, by default 0.0
+        after : float, optional
+            Time after stimulus offset that is exported, limited to the start of the next stimulus, by default 0.0
+
+        Returns
+        -------
+        str
+            The path of the store file.
+        """
+        return write_segment_store(self, store_path, traces, before=before, after=after)
+
+    def export_event_trains(self, trace_name, path=None, before=0.0, after=0.0) -> EventTrains:
+        """Exports the events (e.g. spike times) of all stimulus segments as a single values array plus offsets (the events of stimulus i are ``values[offsets[i]:offsets[i + 1]]``) together with the stimulus table (see stimulus_table, plus dataset_name, block_id, and tag_id columns). Event times are relative to stimulus start. Stimuli with start time >= stop time are skipped as in to_pandas.
+
+        Parameters
+        ----------
+        trace_name : str
+            The name of the event trace, e.g. "Spikes-1".
+        path : str, optional
+            The folder the event trains are saved to (see EventTrains.save), by default None, i.e. they are not saved.
+        before : float, optional
+            Time before stimulus onset that is exported, limited to the stimulus delay, by default 0.0
+        after : float, optional
+            Time after stimulus offset that is exported, limited to the start of the next stimulus, by default 0.0
+
+        Returns
+        -------
+        rlxnix.utils.event_trains.EventTrains
+            The event trains.
+
+        Raises
+        ------
+        ValueError
+            If the trace does not exist or is not an event trace.
+        """
+        stimuli = self._event_stimulus_table(trace_name, "export_event_trains")
+        values, offsets = segment_event_trains(self.event_traces[trace_name].data_array, stimuli.start_time.values,
+                                               stimuli.stop_time.values, stimuli.delay.values, stimuli.max_after.values,
+                                               before=before, after=after)
+        trains = EventTrains(values, offsets, stimuli, {"trace_name": trace_name, "before": before, "after": after})
+        if path is not None:
+            trains.save(path)
+        return trains
+
+    def partition_events(self, trace_name, before=0.0, after=0.0, chunk_size=None) -> EventTrains:
+        """Partitions the events of an event trace (e.g. "Spikes-1" or "Chirps") by stimulus. The event array is read once (or in chunks) and the events are assigned to the windows [start - before, stop + after) of all stimuli in one vectorized pass. In contrast to Stimulus.trace_data, before and after are not limited by the neighbouring stimuli, events in overlapping windows are contained in each of them. Event times are relative to stimulus onset. Stimuli with start time >= stop time are skipped.
+
+        Parameters
+        ----------
+        trace_name : str
+            The name of the event trace.
+        before : float, optional
+            Time before stimulus onset, by default 0.0
+        after : float, optional
+            Time after stimulus offset, by default 0.0
+        chunk_size : int, optional
+            The number of events that are read at once, by default None, i.e. all events are read at once.
+
+        Returns
+        -------
+        rlxnix.utils.event_trains.EventTrains
+            The per-stimulus events, views into one values array, and the stimulus table (see export_event_trains).
+
+        Raises
+        ------
+        ValueError
+            If the trace does not exist or is not an event trace, or chunk_size is not positive.
+        """
+        stimuli = self._event_stimulus_table(trace_name, "partition_events")
+        values, offsets = partition_events(self.event_traces[trace_name].data_array, stimuli.start_time.values - before,
+                                           stimuli.stop_time.values + after, stimuli.start_time.values, chunk_size)
+        return EventTrains(values, offsets, stimuli, {"trace_name": trace_name, "before": before, "after": after})
+
+    def _event_stimulus_table(self, trace_name, caller):
+        """Checks that the trace is an event trace and returns the stimulus table of the valid stimuli as DataFrame, extended by the dataset_name, block_id, and tag_id.
+        """
+        if trace_name not in self.event_traces:
+            logging.error(f"Dataset.{caller}: {trace_name} is not an event trace! Event traces are {[t.name for t in self.event_traces]}.")
+            raise ValueError(f"Dataset.{caller}: {trace_name} is not an event trace! Event traces are {[t.name for t in self.event_traces]}.")
+        table = self.stimulus_table
+        valid = np.nonzero(table.column("start_time") < table.column("stop_time"))[0]
+        if len(valid) < len(table):
+            logging.warning(f"Dataset.{caller}: skipping {len(table) - len(valid)} stimuli with start time >= stop time!")
+        columns = {"dataset_name": [self._block.name + ".nix"] * len(valid), "block_id": [self._block.id] * len(valid),
+                   "tag_id": [table.items[i].id for i in valid]}
+        columns.update({c: np.asarray(table.column(c))[valid] for c in table.columns})
+        return pd.DataFrame(columns)
 
     @property
     def metadata(self) -> dict:
@@ -359,6 +619,19 @@ class Dataset(object):
         mdata = nix_metadata_to_dict(self._block.metadata)
         return mdata
 
+    @property
+    def metadata_proxy(self) -> MetadataProxy:
+        """Read-only, dict-like view on the metadata of this recording that reads entries from file only when they are accessed (see metadata for the structure). Faster than metadata if only a few entries are needed.
+
+        Returns
+        -------
+        rlxnix.utils.metadata.MetadataProxy
+            The session metadata.
+        """
+        if self._metadata is None:
+            self._metadata = MetadataProxy(self._block.metadata)
+        return self._metadata
+
     def plot_timeline(self) -> None:
         self._timeline.plot()
 
@@ -1,7 +1,11 @@
 import logging
+import multiprocessing
 import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
 from .efish_ephys_repro import EfishEphys
+from ...utils.analysis import serial_correlations
 
 
 class Baseline(EfishEphys):
@@ -55,24 +59,129 @@ class Baseline(EfishEphys):
             return None
         return len(self.eod_times()) / self._duration
 
-    def serial_correlation(self, max_lags=50):
-        """Returns the serial correlation of the baseline interspike intervals.
+    def serial_correlation(self, max_lags=50, method="auto"):
+        """Returns the serial correlation of the baseline interspike intervals. Only the requested lags are computed (see rlxnix.utils.analysis.serial_correlations).
 
         Parameters
         ----------
         max_lags : int, optional
             The number of lags to be calculated, by default 50
+        method : str, optional
+            "direct", "fft", or "auto", by default "auto", i.e. the FFT is used for large lag counts.
 
         Returns
         -------
         np.ndarray
             The serial correlations from lag 0 to max_lags -1
         """
-        if self.spikes() is None or len(self.spikes()) < max_lags:
-            return None
-        isis = np.diff(self.spikes())
-        unbiased = isis - np.mean(isis, 0)
-        norm = sum(unbiased ** 2)
-        a_corr = np.correlate(unbiased, unbiased, "same") / norm
-        a_corr = a_corr[int(len(a_corr) / 2):]
-        return a_corr[:max_lags]
+        return Baseline.serial_correlations([self], max_lags, method)[0]
+
+    @staticmethod
+    def serial_correlations(baseline_runs, max_lags=50, method="auto"):
+        """Returns the serial correlations of the interspike intervals of many baseline runs, computed in one batch.
+
+        Parameters
+        ----------
+        baseline_runs : list of Baseline
+            The baseline runs, e.g. of several datasets.
+        max_lags : int, optional
+            The number of lags to be calculated, by default 50
+        method : str, optional
+            "direct", "fft", or "auto", by default "auto"
+
+        Returns
+        -------
+        list of np.ndarray
+            The serial correlations from lag 0 to max_lags -1, None for runs with less than max_lags spikes.
+        """
+        spikes = [r.spikes() for r in baseline_runs]
+        valid = [i for i, s in enumerate(spikes) if s is not None and len(s) >= max_lags]
+        correlations = serial_correlations([np.diff(spikes[i]) for i in valid], max_lags, method)
+        results = [None] * len(spikes)
+        for i, c in zip(valid, correlations):
+            results[i] = c
+        return results
+
+
+def _baseline_rows(dataset, max_lags, isi_bins, burst_threshold, trace_name):
+    """Computes the summary rows of all baseline runs of an open dataset.
+    """
+    runs = [r for r in dataset.repro_runs() if isinstance(r, Baseline)]
+    spikes = [r.spikes(trace_name=trace_name) for r in runs]
+    spikes = [np.array([]) if s is None else np.asarray(s) for s in spikes]
+    isis = [np.diff(s) for s in spikes]
+    correlations = serial_correlations(isis, max_lags)
+    rows = []
+    for r, s, isi, correlation in zip(runs, spikes, isis, correlations):
+        eod_frequency = r.eod_frequency
+        mean_isi = np.mean(isi) if len(isi) > 0 else np.nan
+        burst_fraction = np.nan
+        if eod_frequency is not None and eod_frequency > 0 and len(isi) > 0:
+            burst_fraction = np.mean(isi < burst_threshold / eod_frequency)
+        rows.append({"dataset_name": dataset.name, "repro_name": r.name, "start_time": r.start_time,
+                     "duration": r.duration, "spike_count": len(s), "rate": len(s) / r.duration,
+                     "cv": np.std(isi) / mean_isi if len(isi) > 0 else 0.0,
+                     "isi_histogram": np.histogram(isi, isi_bins, density=True)[0] if len(isi) > 1 else np.zeros(len(isi_bins) - 1),
+                     "serial_correlation": correlation if len(s) >= max_lags else None,
+                     "burst_fraction": burst_fraction,
+                     "eod_frequency": np.nan if eod_frequency is None else eod_frequency})
+    return rows
+
+
+def _file_baseline_rows(filename, max_lags, isi_bins, burst_threshold, trace_name):
+    """Opens a dataset and computes its summary rows, runs in the worker processes of baseline_summary.
+    """
+    from ...dataset import Dataset
+    dataset = Dataset(filename)
+    try:
+        return _baseline_rows(dataset, max_lags, isi_bins, burst_threshold, trace_name)
+    finally:
+        dataset.close()
+
+
+def baseline_summary(datasets, workers=1, max_lags=10, isi_bins=None, burst_threshold=1.5, trace_name=None) -> pd.DataFrame:
+    """Summary statistics of the baseline activity of many cells. The spikes of each baseline run are read once, the serial correlations of all runs of a dataset are computed in one batch. Datasets given as file names are processed in parallel if workers > 1.
+
+    .. code-block:: python
+
+        from rlxnix.plugins.efish.baseline import baseline_summary
+
+        df = baseline_summary(glob.glob("data/*.nix"), workers=4)
+
+    Parameters
+    ----------
+    datasets : list of str or rlxnix.Dataset
+        The file names of the datasets or open datasets.
+    workers : int, optional
+        The number of worker processes, by default 1
+    max_lags : int, optional
+        The number of lags of the serial correlation, by default 10
+    isi_bins : np.ndarray, optional
+        The bin edges of the interspike interval histogram in seconds, by default None, i.e. 0 to 50 ms in 0.5 ms steps.
+    burst_threshold : float, optional
+        Interspike intervals shorter than burst_threshold EOD periods count as bursts, by default 1.5
+    trace_name : str, optional
+        The name of the spikes event trace, by default None, i.e. the configured trace.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per baseline run with the columns dataset_name, repro_name, start_time, duration, spike_count, rate (Hz), cv (of the interspike intervals), isi_histogram (probability density), serial_correlation (lags 0 to max_lags - 1, None if there are less than max_lags spikes), burst_fraction (fraction of the interspike intervals that are bursts, NaN without EOD times), and eod_frequency (Hz, NaN without EOD times).
+    """
+    isi_bins = np.linspace(0.0, 0.05, 101) if isi_bins is None else np.asarray(isi_bins)
+    rows = [None] * len(datasets)
+    files = [i for i, d in enumerate(datasets) if isinstance(d, str)]
+    for i, d in enumerate(datasets):
+        if not isinstance(d, str):
+            rows[i] = _baseline_rows(d, max_lags, isi_bins, burst_threshold, trace_name)
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_file_baseline_rows, datasets[i], max_lags, isi_bins, burst_threshold, trace_name) for i in files]
+            for i, future in zip(files, futures):
+                rows[i] = future.result()
+    else:
+        for i in files:
+            rows[i] = _file_baseline_rows(datasets[i], max_lags, isi_bins, burst_threshold, trace_name)
+    columns = ["dataset_name", "repro_name", "start_time", "duration", "spike_count", "rate", "cv", "isi_histogram",
+               "serial_correlation", "burst_fraction", "eod_frequency"]
+    return pd.DataFrame([row for dataset_rows in rows for row in dataset_rows], columns=columns)
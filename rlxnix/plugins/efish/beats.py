@@ -23,6 +23,9 @@ class Beats(EfishEphys):
         dfs = [s.metadata[s.name]["DeltaF"][0][0] for s in self.stimuli]
         return dfs
 
+    def _beat_frequencies(self):
+        return self.deltafs
+
     @property
     def frequencies(self):
         """ The absolute frequencies of the stimuli in Hertz.
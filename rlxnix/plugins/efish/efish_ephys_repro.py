@@ -1,9 +1,14 @@
 import nixio
 import logging
+import numpy as np
 
 from ...base.repro import ReProRun
 from ...utils.mappings import DataType
-from ...utils.config import Config
+from ...utils.indexing import sampled_indices
+from ...utils.analysis import binned_rates, kernel_rates, instantaneous_frequency, window_frequencies, \
+    cycle_phases, periodic_phases, vector_strengths, phase_histograms, sampled_windows
+from ...utils.event_trains import partition_events
+from ...utils.data_trace import TraceMap
 
 
 class EfishEphys(ReProRun):
@@ -19,18 +24,28 @@ class EfishEphys(ReProRun):
 
     def __init__(self, repro_run: nixio.Tag, traces, relacs_nix_version=1.1):
         super().__init__(repro_run, traces, relacs_nix_version=relacs_nix_version)
-        self._config = Config()
         self._signal_trace_map = {}
-        self._spike_times = None
+        self._spike_times = {}
+        self._eod_times = {}
+        self._stimulus_eod_frequencies = {}
         self._get_signal_trace_map()
 
     def _get_signal_trace_map(self):
-        for s in self.signals:
-            signal_traces = self._config.trace_configuration(self.pluginset, s)
-            if signal_traces is not None:
-                for t in self.traces:
-                    if t in signal_traces:
-                        self._signal_trace_map[s] = t
+        # Dataset passes its TraceMap, whose signal map is shared by all runs. A plain dict of traces (a run created
+        # outside of a Dataset, e.g. in tests) gets a private TraceMap, i.e. the mapping is computed for this run only.
+        traces = self._trace_map if isinstance(self._trace_map, TraceMap) else TraceMap(self._trace_map)
+        self._signal_trace_map = traces.signal_trace_map(self.pluginset, self.signals)
+
+    @property
+    def signal_trace_map(self) -> dict:
+        """The mapping of the signals of this plugin set (e.g. "spikes") to the names of the recorded traces. The mapping is shared by all repro runs of the same dataset.
+
+        Returns
+        -------
+        dict
+            Signal names as keys, trace names as values.
+        """
+        return self._signal_trace_map
 
     def spikes(self, stimulus_index=None, trace_name=None):
         """Return the spike times for the whole repro run or during a certain stimulus presentation.
@@ -45,12 +60,12 @@ class EfishEphys(ReProRun):
         Returns
         -------
         numpy ndarray
-            The spike times in seconds. Times are relative to stimulus onset.
+            The spike times in seconds. Times are relative to stimulus onset. The spikes of the whole run are cached per trace.
         """
-        if self._spike_times is not None and stimulus_index is None:
-            return self._spike_times
         if trace_name is None:
             trace_name = self._signal_trace_map.get("spikes")
+        if stimulus_index is None and trace_name in self._spike_times:
+            return self._spike_times[trace_name]
 
         if not self._check_trace(trace_name, DataType.Event):
             logging.warning("No spikes data found in the file. You probably have to detect them manually...")
@@ -60,8 +75,8 @@ class EfishEphys(ReProRun):
             self._check_stimulus(stimulus_index)
             return self.stimuli[stimulus_index].trace_data(trace_name)[0]
         else:
-            self._spike_times = self.trace_data(trace_name)[0]
-            return self._spike_times
+            self._spike_times[trace_name] = self.trace_data(trace_name)[0]
+            return self._spike_times[trace_name]
 
     def local_eod(self, stimulus_index=None, trace_name=None):
         """Return the local eod measurement for the whole repro run or during a certain stimulus presentation.
@@ -134,7 +149,7 @@ class EfishEphys(ReProRun):
         Returns
         -------
         numpy.ndarray
-            The EOD times.
+            The EOD times. The EOD times of the whole run are cached and returned read-only.
         """
         if trace_name is None:
             trace_name = self._signal_trace_map.get("eod times")
@@ -145,7 +160,64 @@ class EfishEphys(ReProRun):
             self._check_stimulus(stimulus_index)
             return self.stimuli[stimulus_index].trace_data(trace_name)[0]
         else:
-            return self.trace_data(trace_name)[0]
+            if trace_name not in self._eod_times:
+                eod_times = self.trace_data(trace_name)[0]
+                eod_times.setflags(write=False)
+                self._eod_times[trace_name] = eod_times
+            return self._eod_times[trace_name]
+
+    def eod_frequency_trace(self, resolution=None, smoothing=None, trace_name=None):
+        """The instantaneous EOD frequency during the whole repro run, calculated from the EOD times (see rlxnix.utils.analysis.instantaneous_frequency). The EOD times are read once and cached.
+
+        Parameters
+        ----------
+        resolution : float, optional
+            Temporal resolution of the returned trace in seconds, by default None, i.e. one value per EOD period.
+        smoothing : float, optional
+            Width of the running average in seconds, by default None, i.e. no smoothing.
+        trace_name : str, optional
+            The name of the recorded event trace that stores the EOD times, by default None, i.e. read trace name from configuration file.
+
+        Returns
+        -------
+        np.ndarray
+            The time axis relative to repro start.
+        np.ndarray
+            The EOD frequency in Hz.
+        Or None, None if the EOD times are not stored in the file.
+        """
+        eod_times = self.eod_times(trace_name=trace_name)
+        if eod_times is None:
+            return None, None
+        return instantaneous_frequency(eod_times, smoothing=smoothing, resolution=resolution,
+                                       start=0.0 if resolution is not None else None,
+                                       stop=self.duration if resolution is not None else None)
+
+    def stimulus_eod_frequencies(self, trace_name=None):
+        """The mean EOD frequency during each stimulus, calculated for all stimuli at once from the EOD times of the whole run and cached.
+
+        Parameters
+        ----------
+        trace_name : str, optional
+            The name of the recorded event trace that stores the EOD times, by default None, i.e. read trace name from configuration file.
+
+        Returns
+        -------
+        np.ndarray
+            The mean EOD frequency in Hz of each stimulus (read-only), NaN if less than two EODs are found. None, if the EOD times are not stored in the file.
+        """
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("eod times")
+        if trace_name not in self._stimulus_eod_frequencies:
+            eod_times = self.eod_times(trace_name=trace_name)
+            if eod_times is None:
+                return None
+            starts = self.stimulus_table.column("start_time") - self.start_time
+            stops = self.stimulus_table.column("stop_time") - self.start_time
+            frequencies = window_frequencies(eod_times, starts, stops)
+            frequencies.setflags(write=False)
+            self._stimulus_eod_frequencies[trace_name] = frequencies
+        return self._stimulus_eod_frequencies[trace_name]
 
     def membrane_voltage(self, stimulus_index=None, trace_name=None):
         """Returns the membrane potential measurement for the whole repro run or during a certain stimulus presentation.
@@ -203,4 +275,257 @@ class EfishEphys(ReProRun):
             self._check_stimulus(stimulus_index)
             return self.stimuli[stimulus_index].trace_data(trace_name)
         else:
-            return self.trace_data(trace_name)
\ No newline at end of file
+            return self.trace_data(trace_name)
+
+    def _trial_spikes(self, before, after, clip, trace_name):
+        """Reads the spikes within the span of the stimuli and splits them into trials. Each window ends after its own stimulus (clip) or after the longest stimulus. Returns the spike times relative to stimulus onset, the trial indices, the longest window duration, and the window duration of each trial, None if there are no spikes or stimuli.
+        """
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("spikes")
+        if not self._check_trace(trace_name, DataType.Event):
+            logging.warning("No spikes data found in the file. You probably have to detect them manually...")
+            return None
+        if len(self.stimuli) == 0:
+            logging.warning(f"EfishEphys: repro run {self.name} has no stimuli!")
+            return None
+        starts = self.stimulus_table.column("start_time")
+        durations = self.stimulus_table.column("duration") if clip else np.full(len(starts), np.max(self.stimulus_table.column("duration")))
+        spikes, offsets = partition_events(self._trace_map[trace_name].data_array, starts - before,
+                                           starts + durations + after, starts)
+        trials = np.repeat(np.arange(len(starts)), np.diff(offsets))
+        durations = durations + before + after
+        return spikes, trials, np.max(durations), durations
+
+    def psth(self, bin_width=0.01, before=0.0, after=0.0, clip=True, trace_name=None):
+        """Peri-stimulus time histogram of the spike responses to all stimuli of this run. The spikes are read at once and binned for all trials in one go. The window of each trial starts before stimulus onset and ends after the end of the stimulus plus after. With clip=False all windows are as long as the longest stimulus, they may thus reach into the neighbouring stimuli.
+
+        Parameters
+        ----------
+        bin_width : float, optional
+            The bin width in seconds, by default 0.01
+        before : float, optional
+            Time before stimulus onset, by default 0.0
+        after : float, optional
+            Time after the end of the stimulus, by default 0.0
+        clip : bool, optional
+            Whether each window ends after its own stimulus, by default True. Bins whose center lies beyond the end of a window are NaN and are ignored by the mean.
+        trace_name : str, optional
+            The name of the spikes event trace, by default None, i.e. try to find the default traces.
+
+        Returns
+        -------
+        np.ndarray
+            The time axis (the bin centers) relative to stimulus onset.
+        np.ndarray
+            The firing rate in each bin, trials x bins.
+        np.ndarray
+            The mean firing rate across trials.
+        Or None, None, None if there are no spikes or stimuli.
+        """
+        trial_spikes = self._trial_spikes(before, after, clip, trace_name)
+        if trial_spikes is None:
+            return None, None, None
+        times, trials, duration, durations = trial_spikes
+        bin_count = int(np.round(duration / bin_width))
+        rates = binned_rates(times, trials, len(self.stimuli), -before, bin_width, bin_count)
+        time = np.arange(bin_count) * bin_width - before + bin_width / 2
+        rates[time[np.newaxis, :] >= (durations - before)[:, np.newaxis]] = np.nan
+        return time, rates, np.nanmean(rates, axis=0)
+
+    def firing_rates(self, kernel_width=0.005, dt=0.0005, before=0.0, after=0.0, clip=True, trace_name=None):
+        """Firing rates of the responses to all stimuli of this run, estimated by convolving the spike trains with a Gaussian kernel. The spikes are read at once and all trials are convolved in one go using the FFT. The trial windows are the same as in psth.
+
+        Parameters
+        ----------
+        kernel_width : float, optional
+            The standard deviation of the Gaussian kernel in seconds, by default 0.005
+        dt : float, optional
+            The temporal resolution in seconds, by default 0.0005
+        before : float, optional
+            Time before stimulus onset, by default 0.0
+        after : float, optional
+            Time after the end of the stimulus, by default 0.0
+        clip : bool, optional
+            Whether each window ends after its own stimulus, by default True. Samples beyond the end of a window are NaN and are ignored by the mean.
+        trace_name : str, optional
+            The name of the spikes event trace, by default None, i.e. try to find the default traces.
+
+        Returns
+        -------
+        np.ndarray
+            The time axis relative to stimulus onset.
+        np.ndarray
+            The firing rates, trials x time.
+        np.ndarray
+            The mean firing rate across trials.
+        Or None, None, None if there are no spikes or stimuli.
+        """
+        trial_spikes = self._trial_spikes(before, after, clip, trace_name)
+        if trial_spikes is None:
+            return None, None, None
+        times, trials, duration, durations = trial_spikes
+        sample_count = int(np.round(duration / dt))
+        rates = kernel_rates(times, trials, len(self.stimuli), -before, dt, sample_count, kernel_width)
+        time = np.arange(sample_count) * dt - before
+        rates[time[np.newaxis, :] >= (durations - before)[:, np.newaxis]] = np.nan
+        return time, rates, np.nanmean(rates, axis=0)
+
+    def _triggered_response(self, trigger_times, trace_name, window, kernel_width, dt):
+        """Responses aligned to events within the stimuli, e.g. chirps. trigger_times holds the times of the events of each stimulus relative to stimulus onset. Continuous traces are read in one slice per stimulus (see analysis.sampled_windows), event traces within the span of the windows (see partition_events). Returns time axis, trials x samples responses (kernel rates for event traces), their mean, and the raster (event times, trial indices) for event traces, None otherwise.
+        """
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("spikes")
+        trace = self._trace_map.get(trace_name) if trace_name is not None else None
+        data_type = trace.trace_type if trace is not None else DataType.Continuous
+        if not self._check_trace(trace_name, data_type):
+            return None, None, None, None
+        if len(trigger_times) != len(self.stimuli):
+            logging.error(f"EfishEphys: expected trigger times for {len(self.stimuli)} stimuli, got {len(trigger_times)}!")
+            raise ValueError(f"EfishEphys: expected trigger times for {len(self.stimuli)} stimuli, got {len(trigger_times)}!")
+        window_start, window_stop = window
+        onsets = self.stimulus_table.column("start_time")
+        trigger_times = [np.atleast_1d(np.asarray(t, dtype=float)) for t in trigger_times]
+        triggers = np.concatenate([onset + t for onset, t in zip(onsets, trigger_times)] + [np.array([])])
+        if data_type == DataType.Event:
+            times, offsets = partition_events(trace.data_array, triggers + window_start, triggers + window_stop, triggers)
+            trials = np.repeat(np.arange(len(triggers)), np.diff(offsets))
+            sample_count = int(np.round((window_stop - window_start) / dt))
+            rates = kernel_rates(times, trials, len(triggers), window_start, dt, sample_count, kernel_width)
+            time = np.arange(sample_count) * dt + window_start
+            return time, rates, np.mean(rates, axis=0) if len(triggers) > 0 else np.zeros(sample_count), (times, trials)
+
+        dimension = trace.data_array.dimensions[0]
+        interval = dimension.sampling_interval
+        sample_count = int(np.round((window_stop - window_start) / interval))
+        time = np.arange(sample_count) * interval + window_start
+        starts = sampled_indices(triggers + window_start, dimension.offset, interval)
+        stimuli = np.repeat(np.arange(len(trigger_times)), [len(t) for t in trigger_times])
+        responses = sampled_windows(trace.data_array, starts, sample_count, stimuli)
+        if len(triggers) == 0:
+            return time, responses, np.full(sample_count, np.nan), None
+        if np.any(np.isnan(responses[:, 0]) | np.isnan(responses[:, -1])):
+            logging.warning(f"EfishEphys: some windows exceed the recording of trace {trace_name}, missing samples are NaN.")
+        counts = np.sum(~np.isnan(responses), axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nansum(responses, axis=0) / counts
+        return time, responses, mean, None
+
+    def chirp_triggered_response(self, trace_name=None, window=(-0.05, 0.05), kernel_width=0.002, dt=0.0005):
+        """Responses aligned to the chirps of all stimuli of repros that present chirps (i.e. define chirp_times, e.g. Chirps). The data of a continuous trace is read in one slice per stimulus and cut into windows around the chirp times, event traces (e.g. spikes) are read within the span of the windows and given as raster and as firing rates.
+
+        Parameters
+        ----------
+        trace_name : str, optional
+            The name of a continuous or event trace, by default None, i.e. the spikes.
+        window : tuple of float, optional
+            Start and end of the window relative to chirp time in seconds, by default (-0.05, 0.05)
+        kernel_width : float, optional
+            The standard deviation of the Gaussian kernel used for the firing rates of event traces in seconds, by default 0.002
+        dt : float, optional
+            The temporal resolution of the firing rates of event traces in seconds, by default 0.0005
+
+        Returns
+        -------
+        np.ndarray
+            The time axis relative to chirp time.
+        np.ndarray
+            The responses, chirps x time. The data of continuous traces, NaN where the window exceeds the recording, the firing rates for event traces. Chirps are ordered by stimulus and chirp time.
+        np.ndarray
+            The mean response across chirps.
+        tuple of np.ndarray
+            The raster of event traces, i.e. the event times relative to chirp time and the chirp index of each event. None for continuous traces.
+        Or None, None, None, None if the trace is not found.
+
+        Raises
+        ------
+        ValueError
+            If the repro run does not present chirps or the chirp times are given in an unknown unit (valid units are "s" and "ms").
+        """
+        if not hasattr(self, "chirp_times"):
+            logging.error(f"EfishEphys.chirp_triggered_response: repro run {self.name} does not present chirps!")
+            raise ValueError(f"EfishEphys.chirp_triggered_response: repro run {self.name} does not present chirps!")
+        chirp_times, unit = self.chirp_times
+        scales = {"": 1.0, "s": 1.0, "ms": 0.001}
+        unit = unit.strip() if unit is not None else ""
+        if unit not in scales:
+            logging.error(f"EfishEphys.chirp_triggered_response: unknown unit {unit} of the chirp times of repro run {self.name}!")
+            raise ValueError(f"EfishEphys.chirp_triggered_response: unknown unit {unit} of the chirp times of repro run {self.name}!")
+        chirp_times = [np.asarray(t, dtype=float) * scales[unit] for t in chirp_times]
+        return self._triggered_response(chirp_times, trace_name, window, kernel_width, dt)
+
+    def _beat_frequencies(self):
+        """The beat frequencies of the stimuli in Hz, None if the repro does not define them. Overwritten by subclasses that present beats.
+        """
+        return None
+
+    def phase_locking(self, reference="eod", stimulus_index=None, bin_count=36, trace_name=None, eod_trace_name=None):
+        """Phase locking of the spikes to the EOD or to the beat during the stimuli of this run. The spikes are read at once and mapped to the cycles of the reference for all stimuli in one go.
+
+        With reference "eod" the cycles are given by the recorded EOD times, with reference "beat" they are calculated from the beat frequencies of the stimuli (e.g. Beats.deltafs), starting at stimulus onset.
+
+        Parameters
+        ----------
+        reference : str, optional
+            "eod" or "beat", by default "eod"
+        stimulus_index : int, optional
+            The stimulus index, by default None, i.e. all stimuli.
+        bin_count : int, optional
+            The number of bins of the phase histograms, by default 36
+        trace_name : str, optional
+            The name of the spikes event trace, by default None, i.e. try to find the default traces.
+        eod_trace_name : str, optional
+            The name of the event trace that stores the EOD times, by default None, i.e. read trace name from configuration file.
+
+        Returns
+        -------
+        np.ndarray
+            The vector strength of each stimulus, NaN if there are no spikes.
+        np.ndarray
+            The mean phase of each stimulus in radians.
+        np.ndarray
+            The phase axis, i.e. the centers of the histogram bins in radians.
+        np.ndarray
+            The phase histograms, stimuli x bins, the fraction of the spikes in each bin.
+        If stimulus_index is given, the vector strength, mean phase and histogram of this stimulus only. None, None, None, None if the spikes or the reference are not found.
+
+        Raises
+        ------
+        ValueError
+            If the reference is invalid or the repro run does not define beat frequencies.
+        """
+        if reference not in ["eod", "beat"]:
+            logging.error(f"EfishEphys.phase_locking: invalid reference {reference}! Valid references are 'eod' and 'beat'.")
+            raise ValueError(f"EfishEphys.phase_locking: invalid reference {reference}! Valid references are 'eod' and 'beat'.")
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("spikes")
+        if not self._check_trace(trace_name, DataType.Event):
+            logging.warning("No spikes data found in the file. You probably have to detect them manually...")
+            return None, None, None, None
+        if stimulus_index is not None:
+            self._check_stimulus(stimulus_index)
+        indices = np.arange(len(self.stimuli)) if stimulus_index is None else np.array([stimulus_index])
+        starts = self.stimulus_table.column("start_time")[indices]
+        stops = self.stimulus_table.column("stop_time")[indices]
+        spikes, offsets = partition_events(self._trace_map[trace_name].data_array, starts, stops,
+                                           np.full(len(indices), self.start_time))
+        trials = np.repeat(np.arange(len(indices)), np.diff(offsets))
+
+        if reference == "eod":
+            eod_times = self.eod_times(trace_name=eod_trace_name)
+            if eod_times is None:
+                return None, None, None, None
+            phases = cycle_phases(spikes, eod_times)
+        else:
+            beat_frequencies = self._beat_frequencies()
+            if beat_frequencies is None:
+                logging.error(f"EfishEphys.phase_locking: repro run {self.name} does not define beat frequencies!")
+                raise ValueError(f"EfishEphys.phase_locking: repro run {self.name} does not define beat frequencies!")
+            onsets = starts - self.start_time
+            phases = periodic_phases(spikes - onsets[trials], trials, np.asarray(beat_frequencies, dtype=float)[indices])
+
+        strengths, mean_phases = vector_strengths(phases, trials, len(indices))
+        histograms = phase_histograms(phases, trials, len(indices), bin_count)
+        phase_axis = (np.arange(bin_count) + 0.5) * 2 * np.pi / bin_count
+        if stimulus_index is not None:
+            return strengths[0], mean_phases[0], phase_axis, histograms[0]
+        return strengths, mean_phases, phase_axis, histograms
@@ -2,11 +2,12 @@ import os
 import nixio
 import logging
 import numpy as np
-from numpy import full
-from scipy.interpolate import interp1d
 
 from .efish_ephys_repro import EfishEphys
 from ...utils.util import convert_path
+from ...utils.mappings import DataType
+from ...utils.metadata import section_index
+from ...utils.stimulus_file import read_stimulus_file
 
 
 class FileStimulus(EfishEphys):
@@ -15,6 +16,8 @@ class FileStimulus(EfishEphys):
     def __init__(self, repro_run: nixio.Tag, traces, relacs_nix_version=1.1, stimulus_folder="/data/stimuli"):
         super().__init__(repro_run, traces, relacs_nix_version=relacs_nix_version)
         self._stimulus_folder = stimulus_folder
+        self._binary_cache = False
+        self._resampled_stimuli = {}
 
     @property
     def stimulus_folder(self):
@@ -28,6 +31,21 @@ class FileStimulus(EfishEphys):
         else:
             logging.error(f"FileStimulus: new stimulus folder ({new_location}) does not exist!")
 
+    @property
+    def binary_cache(self):
+        """Whether parsed stimulus files are additionally cached as .npz files in the .rlxnix_cache subfolder of the stimulus folder, by default False.
+
+        Returns
+        -------
+        bool
+            True if the binary cache is used.
+        """
+        return self._binary_cache
+
+    @binary_cache.setter
+    def binary_cache(self, use_cache):
+        self._binary_cache = use_cache
+
     @property
     def contrast(self):
         # in _mapping_version <= 1.1 this is part of the repro, in future versions the contrast information may move to the features...
@@ -35,7 +53,7 @@ class FileStimulus(EfishEphys):
         unit = ""
         logging.debug("Filestimulus: trying to read contrast from metadata")
         if "RePro-Info" not in self.metadata:
-            settings = self.repro_tag.metadata.find_sections(lambda s: s.type == "settings")
+            settings = section_index(self.repro_tag.file).find(type="settings", within=self.repro_tag.metadata)
             if len(settings) > 0:
                 cp = settings[0].props["contrast"]
                 if cp.unit is None or len(cp.unit) == 0:
@@ -61,7 +79,7 @@ class FileStimulus(EfishEphys):
         name = None
         logging.debug("Filestimulus: trying to read stimulus file from metadata")
         if "RePro-Info" not in self.metadata:
-            settings = self.repro_tag.metadata.find_sections(lambda s: s.type == "settings")
+            settings = section_index(self.repro_tag.file).find(type="settings", within=self.repro_tag.metadata)
             if len(settings) > 0:
                 name = settings[0]["file"]
         elif "file" in self.metadata["RePro-Info"]["settings"]:
@@ -73,7 +91,8 @@ class FileStimulus(EfishEphys):
     def _read_stimulus_file(self, filename):
         """
         Loads a data file saved by relacs. Returns a tuple of dictionaries
-        containing the data and the header information
+        containing the data and the header information. Parsed files are
+        buffered (see rlxnix.utils.stimulus_file.read_stimulus_file).
 
         Parameter
         ---------
@@ -85,69 +104,64 @@ class FileStimulus(EfishEphys):
         tuple
             a tuple of dictionaries containing the head information and the data.
         """
-        with open(filename, 'r') as fid:
-            L = [l.lstrip().rstrip() for l in fid.readlines()]
-
-        ret = []
-        dat = {}
-        X = []
-        keyon = False
-        currkey = None
-        for l in L:
-            # if empty line and we have data recorded
-            if (not l or l.startswith('#')) and len(X) > 0:
-                keyon = False
-                currkey = None
-                dat['data'] = np.array(X)
-                ret.append(dat)
-                X = []
-                dat = {}
-
-            if '---' in l:
-                continue
-            if l.startswith('#'):
-                if ":" in l:
-                    tmp = [e.rstrip().lstrip() for e in l[1:].split(':')]
-                    if currkey is None:
-                        dat[tmp[0]] = tmp[1]
-                    else:
-                        dat[currkey][tmp[0]] = tmp[1]
-                elif "=" in l:
-                    tmp = [e.rstrip().lstrip() for e in l[1:].split('=')]
-                    if currkey is None:
-                        dat[tmp[0]] = tmp[1]
-                    else:
-                        dat[currkey][tmp[0]] = tmp[1]
-                elif l[1:].lower().startswith('key'):
-                    dat['key'] = []
-                    keyon = True
-                elif keyon:
-                    dat['key'].append(tuple([e.lstrip().rstrip() for e in l[1:].split()]))
-                else:
-                    currkey = l[1:].rstrip().lstrip()
-                    dat[currkey] = {}
-
-            elif l:  # if l != ''
-                keyon = False
-                currkey = None
-                X.append([float(e) for e in l.split()])
-
-        if len(X) > 0:
-            dat['data'] = np.array(X)
-        else:
-            dat['data'] = []
-        ret.append(dat)
+        return read_stimulus_file(filename, binary_cache=self._binary_cache)
 
-        return tuple(ret)
+    def _stimulus_file(self):
+        """The path of the stimulus file in the stimulus folder, None if it is not found.
+        """
+        if self._stimulus_folder is None or not os.path.exists(self._stimulus_folder):
+            logging.error(f"FileStimulus: Stimulus folder is not set or not accessible! {self._stimulus_folder}")
+            return None
 
+        stim_name = self.stimulus_filename
+        if not stim_name:
+            return None
+        stim_name = convert_path(stim_name)
+        stim_file = stim_name.split(os.sep)[-1]
 
-    def load_stimulus(self, stimulus_index=0):
+        full_file = os.sep.join([self._stimulus_folder, stim_file])
+        if not os.path.exists(full_file) or not os.path.isfile(full_file):
+            logging.error(f"FileStimulus: Stimulus file {full_file} does not exist")
+            return None
+        return full_file
+
+    def _sampling_rate(self, trace_name, sampling_rate):
+        if sampling_rate is not None:
+            return sampling_rate
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("membrane voltage")
+        if not self._check_trace(trace_name, data_type=DataType.Continuous):
+            logging.error(f"FileStimulus: cannot determine the sampling rate, trace {trace_name} is not a continuous trace!")
+            return None
+        return 1. / self._trace_map[trace_name].sampling_interval
+
+    def _resampled_stimulus(self, full_file, duration, sampling_rate):
+        """The stimulus resampled for the given duration and sampling rate, cached per file (and modification time), duration, and rate.
+        """
+        key = (full_file, os.path.getmtime(full_file), duration, sampling_rate)
+        if key not in self._resampled_stimuli:
+            s = self._read_stimulus_file(full_file)
+            logging.debug(f"Filestimulus: successfully parsed stimulus file {full_file}")
+            time_original = s[0]['data'][:, 0]
+            time_resampled = np.linspace(0.0, duration, int(duration * sampling_rate))
+            time_resampled[time_resampled > time_original[-1]] = time_original[-1]
+            stimulus = np.interp(time_resampled, time_original, s[0]['data'][:, 1])
+            self._resampled_stimuli[key] = (stimulus, time_resampled)
+        return self._resampled_stimuli[key]
+
+    def load_stimulus(self, stimulus_index=0, trace_name=None, sampling_rate=None):
         """Load the stimulus data from the stimulus file. Since the stimulus output might be shorter than the stimulus one needs to provide the stimulus index for automatic adjustments.
 
+        The stimulus is resampled with the sampling rate of the given trace by linear interpolation. Resampled stimuli are cached, stimuli that share file, duration, and sampling rate are computed only once.
+
         Parameters
         ----------
         stimulus_index : int, optional
             The stimulus index. Defaults to 0
+        trace_name : str, optional
+            The name of the continuous trace whose sampling rate is used, by default None, i.e. the membrane voltage trace.
+        sampling_rate : float, optional
+            The sampling rate in Hz, overrides the rate of the trace, by default None
 
         Returns
         -------
@@ -157,31 +171,43 @@ class FileStimulus(EfishEphys):
             The stimulus time
         """
         self._check_stimulus(stimulus_index=stimulus_index)
-        if self._stimulus_folder is None or not os.path.exists(self._stimulus_folder):
-            logging.error(f"FileStimulus: Stimulus folder is not set or not accessible! {self._stimulus_folder}")
+        full_file = self._stimulus_file()
+        if full_file is None:
             return None, None
-
-        stim_name = self.stimulus_filename
-        if not stim_name:
+        sampling_rate = self._sampling_rate(trace_name, sampling_rate)
+        if sampling_rate is None:
             return None, None
-        stim_name = convert_path(stim_name)
-        stim_file = stim_name.split(os.sep)[-1]
+        stimulus, time = self._resampled_stimulus(full_file, self.stimuli[stimulus_index].duration, sampling_rate)
+        return stimulus.copy(), time.copy()
 
-        full_file = os.sep.join([self._stimulus_folder, stim_file])
-        if not os.path.exists(full_file) or not os.path.isfile(full_file):
-            logging.error(f"FileStimulus: Stimulus file {full_file} does not exist")
-            return None, None
-
-        s = self._read_stimulus_file(full_file)
-        logging.debug("Filestimulus: successfully parsed stimulus file {full_file}")
+    def load_stimuli(self, trace_name=None, sampling_rate=None):
+        """Load the stimulus data of all stimulus presentations. See load_stimulus.
 
-        stimulus = self.stimuli[stimulus_index]
-        stim_duration = stimulus.duration
-        sampling_rate = 1./stimulus.trace_info("V-1").sampling_interval
-        inter = interp1d(s[0]['data'][:, 0], s[0]['data'][:, 1])
-        time_original = s[0]['data'][:, 0]
-        time_resampled = np.linspace(0.0, stim_duration, int(stim_duration * sampling_rate))
-        time_resampled[time_resampled > time_original[-1]] = time_original[-1]
-        stimulus = inter(time_resampled)
+        Parameters
+        ----------
+        trace_name : str, optional
+            The name of the continuous trace whose sampling rate is used, by default None, i.e. the membrane voltage trace.
+        sampling_rate : float, optional
+            The sampling rate in Hz, overrides the rate of the trace, by default None
 
-        return stimulus, time_resampled
+        Returns
+        -------
+        list of np.ndarray
+            The stimulus data of each presentation.
+        list of np.ndarray
+            The respective time axes.
+        Or None, None if the stimulus file is not found.
+        """
+        full_file = self._stimulus_file()
+        if full_file is None:
+            return None, None
+        sampling_rate = self._sampling_rate(trace_name, sampling_rate)
+        if sampling_rate is None:
+            return None, None
+        stimuli = []
+        times = []
+        for duration in self.stimulus_table.column("duration"):
+            stimulus, time = self._resampled_stimulus(full_file, duration, sampling_rate)
+            stimuli.append(stimulus.copy())
+            times.append(time.copy())
+        return stimuli, times
@@ -1,12 +1,18 @@
+import logging
 import numpy as np
 
 from ..efish.efish_ephys_repro import EfishEphys
+from ...utils.mappings import DataType
+from ...utils.metadata import section_index
+from ...utils.analysis import periodic_phases, vector_strengths, grid_average
+from ...utils.event_trains import partition_events
 
 class ReceptiveField(EfishEphys):
     _repro_name = "ReceptiveField"
 
     def __init__(self, repro_run, traces, relacs_nix_version=1.1) -> None:
         super().__init__(repro_run, traces, relacs_nix_version)
+        self._response_maps = {}
 
     @property
     def stimulus_amplitudes(self):
@@ -67,7 +73,7 @@ class ReceptiveField(EfishEphys):
             fish head position in [x, y, z] positions in robot coordinates!
         """
         position = np.zeros(3)
-        cell_mdata = self.repro_tag.file.find_sections(lambda s: s.name == "Cell properties")
+        cell_mdata = section_index(self.repro_tag.file).find(name="Cell properties")
         if len(cell_mdata) > 0 and "FishHeadPosition" in cell_mdata[0]:
             position = np.array(list(map(float, cell_mdata[0]["FishHeadPosition"][1:-1].split(","))))
 
@@ -84,7 +90,7 @@ class ReceptiveField(EfishEphys):
             fish tail position in [x, y, z] positions in robot coordinates!
         """
         position = np.zeros(3)
-        cell_mdata = self.repro_tag.file.find_sections(lambda s: s.name == "Cell properties")
+        cell_mdata = section_index(self.repro_tag.file).find(name="Cell properties")
         if len(cell_mdata) > 0 and "FishTailPosition" in cell_mdata[0]:
             position = np.array(list(map(float, cell_mdata[0]["FishTailPosition"][1:-1].split(","))))
 
@@ -110,4 +116,69 @@ class ReceptiveField(EfishEphys):
             y.append(stim.feature_data(name + "_y_pos"))
             z.append(stim.feature_data(
                 name + "_z_pos"))
-        return np.array(x), np.array(y), np.array(z)
\ No newline at end of file
+        return np.array(x), np.array(y), np.array(z)
+
+    def response_map(self, window=None, measure="rate", trace_name=None):
+        """Spatial map of the responses to the stimuli of this run. The spike trace is read once and partitioned by stimulus, the responses of all stimuli are computed at once and averaged across the stimuli presented at the same position. Maps are cached per window, measure, and trace.
+
+        Parameters
+        ----------
+        window : tuple of float, optional
+            Start and end of the analysis window relative to stimulus onset in seconds, by default None, i.e. the whole stimulus.
+        measure : str, optional
+            The response measure, "rate" (spike count divided by window duration, in Hz) or "vector_strength" (phase locking to the beat given by the stimulus deltaf), by default "rate"
+        trace_name : str, optional
+            The name of the spikes event trace, by default None, i.e. try to find the default traces.
+
+        Returns
+        -------
+        np.ndarray
+            The x positions of the grid, rostro-caudal axis in mm relative to the fish head (see stimulus_positions).
+        np.ndarray
+            The y positions of the grid, dorso-ventral axis.
+        np.ndarray
+            The z positions of the grid, left-right axis.
+        np.ndarray
+            The mean response at each grid position, x x y x z, NaN where no stimulus was presented.
+        Or None, None, None, None if there are no spikes.
+
+        Raises
+        ------
+        ValueError
+            If the measure is invalid.
+        """
+        if measure not in ["rate", "vector_strength"]:
+            logging.error(f"ReceptiveField.response_map: invalid measure {measure}! Valid measures are 'rate' and 'vector_strength'.")
+            raise ValueError(f"ReceptiveField.response_map: invalid measure {measure}! Valid measures are 'rate' and 'vector_strength'.")
+        if trace_name is None:
+            trace_name = self._signal_trace_map.get("spikes")
+        if not self._check_trace(trace_name, DataType.Event):
+            logging.warning("No spikes data found in the file. You probably have to detect them manually...")
+            return None, None, None, None
+        key = (None if window is None else tuple(window), measure, trace_name)
+        if key not in self._response_maps:
+            self._response_maps[key] = self._response_map(window, measure, trace_name)
+        return tuple(a.copy() for a in self._response_maps[key])
+
+    def _response_map(self, window, measure, trace_name):
+        indices = np.array([i for i, s in enumerate(self.stimuli) if self._repro_name in s.name], dtype=int)
+        onsets = self.stimulus_table.column("start_time")[indices]
+        if window is None:
+            window_starts = np.zeros(len(indices))
+            window_stops = self.stimulus_table.column("duration")[indices]
+        else:
+            window_starts = np.full(len(indices), float(window[0]))
+            window_stops = np.full(len(indices), float(window[1]))
+        spikes, offsets = partition_events(self._trace_map[trace_name].data_array, onsets + window_starts,
+                                           onsets + window_stops, onsets)
+        if measure == "rate":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                responses = np.diff(offsets) / (window_stops - window_starts)
+        else:
+            trials = np.repeat(np.arange(len(indices)), np.diff(offsets))
+            phases = periodic_phases(spikes, trials, self.stimulus_deltafs.ravel())
+            responses, _ = vector_strengths(phases, trials, len(indices))
+
+        (xs, ys, zs), response_map = grid_average(self.stimulus_positions, responses)
+        return xs, ys, zs, response_map
+
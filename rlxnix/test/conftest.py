@@ -0,0 +1,10 @@
+import pytest
+
+from .synthetic_data import write_synthetic_dataset
+
+
+@pytest.fixture(scope="session")
+def synthetic_dataset(tmp_path_factory):
+    """The file name of a small synthetic dataset, see write_synthetic_dataset.
+    """
+    return write_synthetic_dataset(str(tmp_path_factory.mktemp("data") / "2021-11-11-zz.nix"))
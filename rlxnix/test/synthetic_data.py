@@ -0,0 +1,110 @@
+import os
+import datetime
+import nixio
+import numpy as np
+
+sampling_interval = 1. / 10000
+eod_frequency = 800.0
+repro_settings = [("BaselineActivity", {}),
+                  ("Beats", {"pause": 0.5, "ramp": 0.2, "eodmult": 1, "amplitude": 1.0}),
+                  ("Chirps", {"beatsel": "Absolute frequency", "releodf": 1.0, "deltaf": 10.0, "chirpwidth": 0.014, "chirpsize": 60.0}),
+                  ("ReceptiveField", {}),
+                  ("FileStimulus", {"file": "C:\\stimuli\\noise.dat", "contrast": 0.2}),
+                  ("SAM", {"contrast": 10.0})]
+
+
+def write_synthetic_dataset(filename, repro_duration=4.0, stimulus_count=8, seed=42, chirp_time_unit="s"):
+    """Writes a small relacs-flavoured nix file with one run of each repro in repro_settings. The traces are V-1, EOD, LocalEOD-1, GlobalEFieldStimulus (sampled), Spikes-1 and EOD events (events). All runs but the baseline have stimulus_count stimuli, those of FileStimulus differ in duration. The chirp times are stored in chirp_time_unit ("s" or "ms").
+    """
+    rng = np.random.default_rng(seed)
+    f = nixio.File.open(filename, nixio.FileMode.Overwrite)
+    name = os.path.basename(filename)[:-4]
+    block = f.create_block(name, "nix.recording")
+    recording = f.create_section(name, "nix.recording")
+    recording["relacs-nix version"] = 1.1
+    cell = recording.create_section("Cell properties", "cell")
+    cell["FishHeadPosition"] = "(10.0,20.0,30.0)"
+    cell["FishTailPosition"] = "(10.0,220.0,30.0)"
+    block.metadata = recording
+
+    total = repro_duration * len(repro_settings)
+    time = np.arange(int(total / sampling_interval)) * sampling_interval
+
+    def sampled(trace_name, data):
+        da = block.create_data_array(trace_name, "relacs.data.sampled", data=data)
+        da.append_sampled_dimension(sampling_interval).label = "time"
+        da.unit = "mV"
+        return da
+
+    def events(trace_name, data):
+        da = block.create_data_array(trace_name, "relacs.data.event", data=np.sort(data))
+        da.append_range_dimension_using_self()
+        return da
+
+    traces = [sampled("V-1", rng.normal(size=len(time))),
+              sampled("EOD", np.sin(2 * np.pi * eod_frequency * time)),
+              sampled("LocalEOD-1", np.sin(2 * np.pi * eod_frequency * time)),
+              sampled("GlobalEFieldStimulus", rng.normal(size=len(time))),
+              events("Spikes-1", rng.uniform(0, total, int(total * 150))),
+              events("EOD events", np.arange(0, total, 1. / eod_frequency) + 0.0001)]
+
+    for i, (repro_name, settings) in enumerate(repro_settings):
+        start = i * repro_duration + 0.1
+        tag_name = f"{repro_name}_1"
+        tag = block.create_tag(tag_name, "relacs.repro_run", [start])
+        tag.extent = [repro_duration - 0.2]
+        tag.references.extend(traces)
+        section = f.create_section(tag_name, "relacs.repro_run")
+        info = section.create_section("RePro-Info", "relacs.repro")
+        info["RePro"] = repro_name
+        settings_section = info.create_section("settings", "settings")
+        for key, value in settings.items():
+            settings_section[key] = value
+        if "amplitude" in settings:
+            settings_section.props["amplitude"].unit = "mV/cm"
+        tag.metadata = section
+        if repro_name == "BaselineActivity":
+            continue
+
+        mtag_name = f"{repro_name}-stim_1"
+        duration = (repro_duration - 0.4) / stimulus_count * 0.6
+        positions = start + 0.1 + np.arange(stimulus_count) * (repro_duration - 0.4) / stimulus_count
+        p = block.create_data_array(mtag_name + "_positions", "relacs.positions", data=positions[:, None])
+        durations = np.full((stimulus_count, 1), duration)
+        if repro_name == "FileStimulus":
+            durations *= np.linspace(0.5, 1.0, stimulus_count)[:, None]
+        e = block.create_data_array(mtag_name + "_extents", "relacs.extents", data=durations)
+        mtag = block.create_multi_tag(mtag_name, "relacs.stimulus", p)
+        mtag.extents = e
+        mtag.references.extend(traces)
+        mtag_section = f.create_section(mtag_name, "relacs.stimulus")
+        stimulus_section = mtag_section.create_section(mtag_name, "relacs.stimulus.settings")
+        stimulus_section["DeltaF"] = 0.0
+        stimulus_section["Frequency"] = 0.0
+        stimulus_section["ChirpTimes"] = [0.0]
+        stimulus_section.props["ChirpTimes"].unit = "s"
+        mtag.metadata = mtag_section
+
+        def feature(suffix, data, feature_type="relacs.feature", unit=None):
+            da = block.create_data_array(f"{mtag_name}_{suffix}", feature_type, data=data)
+            da.unit = unit
+            mtag.create_feature(da, nixio.LinkType.Indexed)
+
+        feature("delay", np.full(stimulus_count, 0.05))
+        feature("abs_time", positions + 100.0)
+        da = block.create_data_array(f"{mtag_name}_repro_tag_id", "relacs.feature", dtype=nixio.DataType.String,
+                                     shape=(stimulus_count, 1))
+        da.write_direct(np.array([[tag.id]] * stimulus_count, dtype=object))
+        mtag.create_feature(da, nixio.LinkType.Indexed)
+        feature("DeltaF", np.arange(stimulus_count)[:, None] * 10.0 - 40.0, "relacs.feature.mutable")
+        feature("Frequency", np.arange(stimulus_count)[:, None] * 10.0 + 760.0, "relacs.feature.mutable")
+        if repro_name == "ReceptiveField":
+            for suffix in ["x_pos", "y_pos", "z_pos", "ampl", "freq", "dur", "deltaf"]:
+                feature(suffix, rng.choice([0.0, 10.0, 20.0], size=(stimulus_count, 1)))
+        if repro_name == "Chirps":
+            scale = 1000.0 if chirp_time_unit == "ms" else 1.0
+            feature("ChirpTimes", np.tile([0.05, 0.1, 0.15], (stimulus_count, 1)) * scale, "relacs.feature.mutable", chirp_time_unit)
+    f.force_created_at(int(datetime.datetime(2021, 11, 11, 12).timestamp()))
+    f.close()
+    return filename
+
@@ -0,0 +1,156 @@
+import numpy as np
+from rlxnix.utils.analysis import serial_correlation, serial_correlations, binned_rates, kernel_rates, \
+    instantaneous_frequency, window_frequencies, cycle_phases, vector_strengths, phase_histograms, sampled_windows, \
+    grid_average
+from rlxnix.utils.event_trains import partition_events
+
+
+def reference_correlation(sequence, max_lags):
+    unbiased = sequence - np.mean(sequence, 0)
+    norm = sum(unbiased ** 2)
+    with np.errstate(invalid="ignore"):
+        a_corr = np.correlate(unbiased, unbiased, "same") / norm
+    a_corr = a_corr[int(len(a_corr) / 2):]
+    return a_corr[:max_lags]
+
+
+def test_serial_correlation():
+    rng = np.random.default_rng(42)
+    sequences = [rng.exponential(0.01, n) for n in [1, 2, 7, 50, 51, 99, 1000]]
+    for max_lags in [1, 10, 50, 200]:
+        expected = [reference_correlation(s, max_lags) for s in sequences]
+        for method in ["direct", "fft", "auto"]:
+            results = serial_correlations(sequences, max_lags, method=method)
+            for r, e in zip(results, expected):
+                assert len(r) == len(e)
+                assert np.allclose(r, e, equal_nan=True)
+            assert np.allclose(serial_correlation(sequences[-1], max_lags, method), expected[-1])
+    try:
+        serial_correlation(sequences[0], method="invalid")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_trial_rates():
+    rng = np.random.default_rng(1)
+    events = np.sort(rng.uniform(0.0, 10.0, 2000))
+    starts = np.arange(0.5, 9.0, 1.0)
+    before, duration, bin_width = 0.1, 0.8, 0.02
+    times, offsets = partition_events(events, starts - before, starts + duration - before, starts)
+    trials = np.repeat(np.arange(len(starts)), np.diff(offsets))
+    bin_count = int(np.round(duration / bin_width))
+    rates = binned_rates(times, trials, len(starts), -before, bin_width, bin_count)
+    edges = np.arange(bin_count + 1) * bin_width - before
+    for i, start in enumerate(starts):
+        relative = events - start
+        relative = relative[(relative >= -before) & (relative < duration - before)]
+        assert np.array_equal(np.sort(times[trials == i]), relative)
+        assert np.allclose(rates[i], np.histogram(relative, edges)[0] / bin_width)
+
+    dt, kernel_width = 0.001, 0.005
+    sample_count = int(np.round(duration / dt))
+    smoothed = kernel_rates(times, trials, len(starts), -before, dt, sample_count, kernel_width)
+    trains = binned_rates(times, trials, len(starts), -before - dt / 2, dt, sample_count)
+    kernel_time = np.arange(-20, 21) * dt
+    kernel = np.exp(-0.5 * (kernel_time / kernel_width) ** 2)
+    kernel /= np.sum(kernel)
+    for i in range(len(starts)):
+        assert np.allclose(smoothed[i], np.convolve(trains[i], kernel, mode="same"))
+
+
+def test_instantaneous_frequency():
+    frequency = lambda t: 600.0 + 20.0 * t
+    phase = np.arange(0, 6000)
+    eod_times = (-600.0 + np.sqrt(600.0 ** 2 + 40.0 * phase)) / 20.0  # phase(t) = 600 t + 10 t^2
+    time, eodf = instantaneous_frequency(eod_times)
+    assert len(time) == len(eod_times) - 1
+    assert np.allclose(eodf, frequency(time), rtol=1e-4)
+    time, eodf = instantaneous_frequency(eod_times, smoothing=0.05, resolution=0.1, start=0.0, stop=5.0)
+    assert np.allclose(time, np.arange(0.0, 5.0, 0.1))
+    assert np.allclose(eodf[1:], frequency(time[1:]), rtol=1e-3)
+    assert len(instantaneous_frequency(eod_times[:1])[0]) == 0
+
+    starts = np.array([0.5, 1.0, 3.0, 20.0])
+    stops = starts + 0.5
+    frequencies = window_frequencies(eod_times, starts, stops)
+    assert np.allclose(frequencies[:3], frequency(starts[:3] + 0.25), rtol=1e-3)
+    assert np.isnan(frequencies[3])
+
+
+def test_phase_locking():
+    cycle_times = np.cumsum(np.full(1000, 0.002))
+    rng = np.random.default_rng(7)
+    events = np.sort(rng.uniform(0.0, 2.2, 500))
+    phases = cycle_phases(events, cycle_times)
+    inside = (events >= cycle_times[0]) & (events < cycle_times[-1])
+    assert np.all(np.isnan(phases[~inside]))
+    assert np.allclose(phases[inside], 2 * np.pi * np.mod(events[inside] - cycle_times[0], 0.002) / 0.002, atol=1e-6)
+
+    locked = cycle_times[:-1] + 0.0005 + rng.normal(0.0, 0.0001, 999)
+    trials = np.concatenate((np.zeros(len(locked), dtype=int), np.ones(inside.sum(), dtype=int)))
+    all_phases = np.concatenate((cycle_phases(locked, cycle_times), phases[inside]))
+    strengths, mean_phases = vector_strengths(all_phases, trials, 3)
+    for i in range(2):
+        p = all_phases[trials == i]
+        assert np.isclose(strengths[i], np.abs(np.mean(np.exp(1j * p))))
+        assert np.isclose(mean_phases[i], np.mod(np.angle(np.mean(np.exp(1j * p))), 2 * np.pi))
+    assert strengths[0] > 0.9 and strengths[1] < 0.2 and np.isnan(strengths[2])
+
+    histograms = phase_histograms(all_phases, trials, 3, 10)
+    for i in range(2):
+        expected = np.histogram(all_phases[trials == i], np.linspace(0, 2 * np.pi, 11))[0]
+        assert np.allclose(histograms[i], expected / np.sum(expected))
+    assert np.all(histograms[2] == 0)
+
+
+class SliceRecorder(object):
+    """Array wrapper that records the slices that are read.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.slices = []
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        self.slices.append((index.start, index.stop))
+        return self.data[index]
+
+
+def test_sampled_windows():
+    data = SliceRecorder(np.arange(100.0))
+    starts = np.array([-3, 5, 10, 40, 45, 97])
+    windows = sampled_windows(data, starts, 6, groups=[0, 0, 0, 1, 1, 2])
+    indices = starts[:, np.newaxis] + np.arange(6)
+    valid = (indices >= 0) & (indices < 100)
+    assert np.array_equal(windows[valid], indices[valid]) and np.all(np.isnan(windows[~valid]))
+    assert data.slices == [(0, 16), (40, 51), (97, 100)]
+
+    data.slices = []
+    windows = sampled_windows(data, [0, 5, 8, 20, 120], 6, groups=[0, 0, 1, 1, 2])
+    assert data.slices == [(0, 26)]  # overlapping groups are merged, the last one is outside the data
+    assert np.array_equal(windows[:4], np.array([0, 5, 8, 20])[:, np.newaxis] + np.arange(6))
+    assert np.all(np.isnan(windows[4]))
+    assert sampled_windows(data, [], 6).shape == (0, 6)
+
+
+def test_grid_average():
+    rng = np.random.default_rng(7)
+    x = rng.choice([0.0, 10.0, 20.0], 50)
+    y = rng.choice([-5.0, 5.0], 50)
+    values = rng.normal(size=50)
+    values[:5] = np.nan
+    (xs, ys), averages = grid_average([x, y[:, np.newaxis]], values)
+    assert np.array_equal(xs, np.unique(x)) and np.array_equal(ys, np.unique(y))
+    assert averages.shape == (len(xs), len(ys))
+    for i, xv in enumerate(xs):
+        for j, yv in enumerate(ys):
+            selection = (x == xv) & (y == yv) & ~np.isnan(values)
+            if np.any(selection):
+                assert np.isclose(averages[i, j], np.mean(values[selection]))
+            else:
+                assert np.isnan(averages[i, j])
+    _, averages = grid_average([[0.0, 1.0]], [np.nan, 2.0])
+    assert np.isnan(averages[0]) and averages[1] == 2.0
@@ -19,3 +19,9 @@ def test_log_level():
     assert r._config.log_level(Configuration.Automatic) == logging.getLevelName(logging.DEBUG)
     assert r._config.log_level(Configuration.Local) == logging.getLevelName(logging.DEBUG)
 
+
+def test_configured_signals():
+    signals = r._config.configured_signals("efish")
+    assert "spikes" in signals and "eod times" in signals
+    assert len(signals) == len(set(signals))
+    assert r._config.configured_signals("unknown") == []
@@ -1,8 +1,10 @@
 import os
 import nixio
 import logging
+import pytest
+import numpy as np
 import rlxnix as rlx
-from rlxnix.utils.data_loader import SegmentType
+from rlxnix.utils.data_loader import SegmentType, DataLink
 
 
 def test_to_pandas():
@@ -45,4 +47,251 @@ def test_from_pandas():
     dls = rlx.from_pandas(df, segment_type=SegmentType.StimulusSegment)
     assert isinstance(dls, list)
     for dl in dls:
-        assert dl.segment_type == str(SegmentType.StimulusSegment)
\ No newline at end of file
+        assert dl.segment_type == str(SegmentType.StimulusSegment)
+
+
+def test_catalog(tmp_path, synthetic_dataset):
+    filename = synthetic_dataset
+    pytest.importorskip("pyarrow")
+    dataset = rlx.Dataset(filename)
+    df = dataset.to_pandas()
+    for format in ["parquet", "arrow"]:
+        catalog = str(tmp_path / f"catalog_{format}")
+        dataset.export_catalog(catalog, format=format)
+        dataset.export_catalog(catalog, format=format)  # replaces the partitions
+        cat = rlx.load_catalog(catalog, format=format)
+        assert len(cat) == len(df)
+        assert str(cat["index"].dtype) == "Int64"
+        assert set(cat.tag_id) == set(df.tag_id)
+
+        stimuli = rlx.load_catalog(catalog, format=format, segment_type=SegmentType.StimulusSegment)
+        assert len(stimuli) == len(df[df.segment_type == str(SegmentType.StimulusSegment)])
+        for dl in rlx.from_pandas(stimuli):
+            assert dl.segment_type == str(SegmentType.StimulusSegment)
+
+        repro = dataset.repro_runs()[1]
+        selection = rlx.load_catalog(catalog, columns=["tag_id", "start_time"], format=format, repro_name=repro.name,
+                                     time_range=(repro.start_time, repro.start_time + repro.duration / 2))
+        assert list(selection.columns) == ["tag_id", "start_time"]
+        assert len(selection) > 0
+        assert all(selection.start_time < repro.start_time + repro.duration / 2)
+    dataset.close()
+
+
+def test_update_catalog(tmp_path, synthetic_dataset):
+    filename = synthetic_dataset
+    pytest.importorskip("pyarrow")
+    import json
+    import shutil
+    from rlxnix.utils.catalog import read_fingerprints, fingerprint_file
+    data_location = tmp_path / "data"
+    data_location.mkdir()
+    name = os.path.basename(filename)
+    copy = str(data_location / name)
+    shutil.copy(filename, copy)
+    catalog = str(tmp_path / "catalog")
+    dataset = rlx.Dataset(filename)
+    df = dataset.to_pandas()
+    dataset.close()
+
+    assert rlx.update_catalog(str(data_location), catalog) == list(df.dataset_name.unique())
+    assert len(rlx.load_catalog(catalog)) == len(df)
+    fingerprints = read_fingerprints(catalog)
+    assert fingerprints[name]["size"] == os.path.getsize(copy)
+    assert rlx.update_catalog(str(data_location), catalog) == []
+
+    stat = os.stat(copy)
+    os.utime(copy, (stat.st_atime, stat.st_mtime + 10))  # touched only, same content
+    assert rlx.update_catalog(str(data_location), catalog) == []
+
+    fingerprints[name]["size"] += 1  # pretend the file has changed
+    with open(os.path.join(catalog, fingerprint_file), "w") as f:
+        json.dump(fingerprints, f)
+    assert rlx.update_catalog(str(data_location), catalog, workers=2) == list(df.dataset_name.unique())
+    assert len(rlx.load_catalog(catalog)) == len(df)
+
+    os.remove(copy)
+    assert rlx.update_catalog(str(data_location), catalog, remove_missing=True) == []
+    assert len(rlx.load_catalog(catalog)) == 0
+    assert read_fingerprints(catalog) == {}
+
+
+def test_file_pool(synthetic_dataset):
+    filename = synthetic_dataset
+    from rlxnix.utils.file_pool import FileHandlePool
+    dataset = rlx.Dataset(filename)
+    dls = dataset.data_links()
+    stimulus = dataset.repro_runs()[1].stimuli[0]
+    reference, _ = stimulus.trace_data("V-1")
+    dataset.close()
+
+    pool = FileHandlePool()
+    pool.close_all()
+    data_location = os.path.dirname(filename)
+    data, time = rlx.load_data_segment(dls[2], "V-1", data_location=data_location)
+    assert len(pool) == 1
+    nix_file = pool.file(filename)
+    for dl in dls[:5]:
+        data, time = rlx.load_data_segment(dl, "V-1", data_location=data_location)
+        assert data is not None
+    assert pool.file(filename) is nix_file
+    assert len(data) == len(time)
+    data, _ = rlx.load_data_segment(dls[2], "V-1", data_location=data_location)
+    assert np.all(data == reference)
+
+    stat = os.stat(filename)
+    os.utime(filename, (stat.st_atime, stat.st_mtime + 1))
+    try:
+        assert pool.file(filename) is not nix_file
+        assert not nix_file.is_open()
+    finally:
+        os.utime(filename, (stat.st_atime, stat.st_mtime))
+    pool.close_all()
+    assert len(pool) == 0
+
+
+def test_load_data_segments(synthetic_dataset):
+    filename = synthetic_dataset
+    dataset = rlx.Dataset(filename)
+    df = dataset.to_pandas()
+    dls = dataset.data_links()
+    dataset.close()
+    data_location = os.path.dirname(filename)
+
+    def same(a, b):
+        if a[1] is None and b[1] is not None:
+            return False
+        return np.array_equal(a[0], b[0]) and (a[1] is None or np.array_equal(a[1], b[1]))
+
+    for trace in ["V-1", "Spikes-1"]:
+        expected = [rlx.load_data_segment(dl, trace, 0.01, 0.02, data_location=data_location) for dl in dls]
+        segments = list(rlx.load_data_segments(df, trace, 0.01, 0.02, data_location=data_location, chunk_size=7))
+        assert len(segments) == len(expected)
+        assert all([same(a, b) for a, b in zip(expected, segments)])
+        segments = list(rlx.load_data_segments(dls[::-1], trace, 0.01, 0.02, data_location=data_location))
+        assert all([same(a, b) for a, b in zip(expected[::-1], segments)])
+
+    segments = list(rlx.load_data_segments(df[:10], "V-1", data_location=data_location, workers=2, chunk_size=3))
+    expected = [rlx.load_data_segment(dl, "V-1", data_location=data_location) for dl in dls[:10]]
+    assert all([same(a, b) for a, b in zip(expected, segments)])
+
+    segments = list(rlx.load_data_segments(df[:3], "invalid trace", data_location=data_location))
+    assert all([s[0] is None and s[1] is None for s in segments])
+
+
+def test_from_data_frame(synthetic_dataset):
+    filename = synthetic_dataset
+    dataset = rlx.Dataset(filename)
+    df = dataset.to_pandas()
+    dataset.close()
+    dls = rlx.from_pandas(df)
+    assert len(dls) == len(df)
+    for i, dl in zip(df.index, dls):
+        single = rlx.from_pandas(df, i)
+        for c in DataLink.columns():
+            assert getattr(dl, c) == getattr(single, c)
+    try:
+        DataLink.from_data_frame(df.drop(columns=["tag_id"]))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_deduplicated_metadata(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    df = dataset.to_pandas()
+    deduplicated = dataset.to_pandas(deduplicate_metadata=True)
+    assert "metadata_base" in deduplicated.columns
+    assert len(deduplicated.metadata_base.cat.categories) < len(deduplicated)
+    dls = rlx.from_pandas(deduplicated)
+    assert [dl.metadata for dl in dls] == list(df.metadata)
+    assert rlx.from_pandas(deduplicated, 3).metadata == df.metadata[3]
+
+    stimulus = dataset.repro_runs()[1].stimuli[2]
+    dl = stimulus.data_link()
+    assert dl.metadata_base is not None
+    assert dl.metadata == df[(df.tag_id == stimulus.id) & (df["index"] == 2)].metadata.values[0]
+    assert dl.metadata_dict() == stimulus.metadata
+    try:
+        dl.some_attribute = 1
+        assert False
+    except AttributeError:
+        pass
+
+    repro_run = dataset.repro_runs()[1]
+    dl = repro_run.data_link
+    metadata = dl.metadata_dict()
+    metadata["RePro-Info"]["RePro"] = (["changed"], "")
+    assert repro_run.metadata["RePro-Info"]["RePro"][0] != ["changed"]
+    assert repro_run.data_link.metadata_dict() == repro_run.metadata
+    dataset.close()
+
+
+def test_segment_store(tmp_path, synthetic_dataset):
+    filename = synthetic_dataset
+    from rlxnix.utils.segment_store import SegmentStore
+    dataset = rlx.Dataset(filename)
+    df = dataset.to_pandas()
+    store_file = dataset.export_segments(str(tmp_path), ["V-1", "Spikes-1"], before=0.05, after=0.05)
+    dataset.close()
+    data_location = os.path.dirname(filename)
+    dls = [dl for dl in rlx.from_pandas(df) if dl.segment_type == str(SegmentType.StimulusSegment)]
+
+    store = SegmentStore(store_file)
+    assert store.traces == ["V-1"]
+    assert len(store.catalog) == len(df)
+    assert list(store.catalog.tag_id) == list(df.tag_id)
+    for before, after in [(0.0, 0.0), (0.01, 0.02), (0.05, 0.05)]:
+        for dl in dls:
+            expected = rlx.load_data_segment(dl, "V-1", before, after, data_location=data_location)
+            segment = store.read(dl, "V-1", before, after)
+            assert segment is not None
+            assert np.array_equal(segment[0], expected[0]) and np.array_equal(segment[1], expected[1])
+            data, time = rlx.load_data_segment(dl, "V-1", before, after, data_location=data_location,
+                                               store_location=str(tmp_path))
+            assert np.array_equal(data, expected[0]) and np.array_equal(time, expected[1])
+    store.close()
+
+    # requests beyond the exported range and event traces are read from the nix file
+    dl = dls[1]
+    expected = rlx.load_data_segment(dl, "V-1", 0.0, 0.5, data_location=data_location)
+    data, time = rlx.load_data_segment(dl, "V-1", 0.0, 0.5, data_location=data_location, store_location=str(tmp_path))
+    assert len(data) > 0 and np.array_equal(data, expected[0]) and np.array_equal(time, expected[1])
+    expected, _ = rlx.load_data_segment(dl, "Spikes-1", data_location=data_location)
+    data, _ = rlx.load_data_segment(dl, "Spikes-1", data_location=data_location, store_location=str(tmp_path))
+    assert np.array_equal(data, expected)
+
+
+def test_load_data_segment_async(synthetic_dataset):
+    filename = synthetic_dataset
+    import asyncio
+    from rlxnix.utils.async_loader import set_max_workers
+    from rlxnix.utils.file_pool import FileHandlePool
+    dataset = rlx.Dataset(filename)
+    dls = dataset.data_links()
+    stimuli = dataset.repro_runs()[1].stimuli
+    data_location = os.path.dirname(filename)
+    expected = [rlx.load_data_segment(dl, "V-1", 0.01, 0.01, data_location=data_location) for dl in dls]
+    expected_stimuli = [s.trace_data("Spikes-1", after=0.01) for s in stimuli]
+
+    async def load():
+        segments = asyncio.gather(*[rlx.load_data_segment_async(dl, "V-1", 0.01, 0.01, data_location=data_location) for dl in dls])
+        traces = asyncio.gather(*[s.trace_data_async("Spikes-1", after=0.01) for s in stimuli])
+        return await segments, await traces
+
+    set_max_workers(3)
+    segments, traces = asyncio.run(load())
+    for (data, time), (ref_data, ref_time) in zip(segments, expected):
+        assert np.array_equal(data, ref_data) and np.array_equal(time, ref_time)
+    for (data, time), (ref_data, ref_time) in zip(traces, expected_stimuli):
+        assert np.array_equal(data, ref_data) and time is None and ref_time is None
+    dataset.close()
+
+    pool = FileHandlePool()
+    assert pool.file_lock(filename) is pool.file_lock(os.path.abspath(filename))
+    try:
+        set_max_workers(0)
+        assert False
+    except ValueError:
+        pass
+    set_max_workers(4)
@@ -1,6 +1,7 @@
 import os
 import nixio
 import logging
+import pytest
 import rlxnix as rlx
 from rlxnix.utils.data_loader import SegmentType
 
@@ -55,3 +56,358 @@ def test_repros():
     names = [t.name for t in dataset._block.tags if "repro" in t.type]
     for name in names:
         assert name in dataset.repros
+
+
+def test_find(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    table = dataset.repro_table
+    assert len(table) == len(dataset.repro_runs())
+    for c in ["name", "type", "start_time", "duration", "stop_time"]:
+        assert c in table
+
+    matches = dataset.find("", duration=(0.0, None))
+    assert len(matches) == len(dataset.repro_runs())
+    assert len(dataset.find("", duration=(None, -1.0))) == 0
+    for r in dataset.find("re"):
+        assert "re" in r.name.lower()
+    assert [r.name for r in dataset.find("", contrast=(0.1, 1.0))] == ["FileStimulus_1"]  # not set in most runs
+    assert [r.name for r in dataset.find("", pause=(0.4, 0.6))] == ["Beats_1"]
+    assert dataset.find("", contrast=(0.2, 0.5, 1.0)) == []
+
+    # table columns take precedence over properties: FileStimulus.contrast is (20.0, "%"), the setting is 0.2
+    assert "contrast" in table and [r.name for r in dataset.find("FileStimulus", contrast=0.2)] == ["FileStimulus_1"]
+    assert dataset.find("FileStimulus", contrast=20.0) == []
+    # other keys fall back to the properties, the value must be in the property
+    assert "deltafs" not in table
+    assert [r.name for r in dataset.find("Beats", deltafs=-40.0)] == ["Beats_1"]
+    assert dataset.find("Beats", deltafs=-45.0) == []
+
+    stimuli = dataset.find_stimuli("", stimulus_predicates={"duration": (0.0, None)})
+    assert len(stimuli) == sum([len(r.stimuli) for r in dataset.repro_runs()])
+    long_stimuli = dataset.find_stimuli("", lambda s: s.duration > 0.2)
+    assert len(long_stimuli) > 0 and all([s.duration > 0.2 for s in long_stimuli])
+
+
+def test_metadata(synthetic_dataset):
+    import json
+    from rlxnix.utils.util import nix_metadata_to_dict, metadata_to_json
+    from rlxnix.utils.metadata import section_index
+    dataset  = rlx.Dataset(synthetic_dataset)
+    assert isinstance(dataset.metadata, dict)
+    assert dataset.metadata == nix_metadata_to_dict(dataset._block.metadata)
+    assert dataset.metadata_proxy.to_dict() == dataset.metadata
+    for r in dataset.repro_runs():
+        assert isinstance(r.metadata, dict)
+        assert r.metadata == nix_metadata_to_dict(r.repro_tag.metadata)
+        assert r.metadata_proxy.to_dict() == r.metadata
+        assert json.loads(metadata_to_json(r.metadata)) == json.loads(metadata_to_json(r.metadata_proxy))
+        for k in r.metadata_proxy:
+            assert k in r.metadata_proxy
+
+    index = section_index(dataset.nix_file)
+    all_sections = dataset.nix_file.find_sections()
+    assert len(index) == len(all_sections)
+    for s in all_sections[:10]:
+        assert s.id in [f.id for f in index.find(name=s.name)]
+        assert s.id in [f.id for f in index.find(type=s.type)]
+    for r in dataset.repro_runs():
+        section = r.repro_tag.metadata
+        for kwargs, filtr in [({"type": "settings"}, lambda x: x.type == "settings"), ({"name": "RePro-Info"}, lambda x: x.name == "RePro-Info"),
+                              ({}, lambda x: True)]:
+            assert [f.id for f in index.find(within=section, **kwargs)] == [f.id for f in section.find_sections(filtr=filtr)]
+    assert [f.id for f in index.find(type="settings")] == [f.id for f in dataset.nix_file.find_sections(filtr=lambda x: x.type == "settings")]
+
+
+def test_stimulus_table(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    table = dataset.stimulus_table
+    stimuli = [s for r in dataset.repro_runs() for s in r.stimuli]
+    assert len(table) == len(stimuli)
+    delays = table.column("delay")
+    abs_times = table.column("abs_time")
+    for i, s in enumerate(stimuli):
+        assert s.delay is None or s.delay == delays[i]
+        assert s.absolute_start_time is None or s.absolute_start_time == abs_times[i]
+        assert s.repro_tag_id == table.column("repro_tag_id")[i]
+        assert s.start_time == table.column("start_time")[i]
+
+
+def test_tag_index(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    for r in dataset.repro_runs():
+        assert r.tag_index.references == set([da.name for da in r.repro_tag.references])
+        for s in r.stimuli[:1]:
+            assert s.tag_index is r.stimuli[-1].tag_index
+            for i, name, _ in s.features:
+                assert s.tag_index.feature_index(name) == i
+                assert s.repro_tag.features[i].data.name == name
+
+
+def test_signal_trace_map(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    signal_map = dataset.signal_trace_map("efish")
+    for signal, trace in signal_map.items():
+        assert trace in rlx.Config().trace_configuration("efish", signal)
+    efish_runs = [r for r in dataset.repro_runs() if hasattr(r, "signal_trace_map")]
+    for r in efish_runs:
+        assert r.signal_trace_map is efish_runs[0].signal_trace_map
+        for signal, trace in r.signal_trace_map.items():
+            assert signal_map[signal] == trace
+
+
+def test_to_pandas(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    for include_repros in [True, False]:
+        df = dataset.to_pandas(include_repros=include_repros)
+        reference = rlx.data_links_to_pandas(dataset.data_links(include_repros))
+        assert df.equals(reference)
+        assert list(df.dtypes) == list(reference.dtypes)
+    dataset.close()
+
+
+def test_export_event_trains(tmp_path, synthetic_dataset):
+    import numpy as np
+    filename = synthetic_dataset
+    dataset = rlx.Dataset(filename)
+    trains = dataset.export_event_trains("Spikes-1", str(tmp_path), before=0.01, after=0.02)
+    stimuli = [s for r in dataset.repro_runs() for s in r.stimuli if s.start_time < s.stop_time]
+    assert len(trains) == len(stimuli)
+    for i, s in enumerate(stimuli):
+        dl = s.data_link()
+        spikes, _ = rlx.load_data_segment(dl, "Spikes-1", 0.01, 0.02, data_location=os.path.dirname(filename))
+        assert np.array_equal(trains[i], spikes)
+        assert trains.table.tag_id[i] == s.id and trains.table["index"][i] == dl.index
+    try:
+        dataset.export_event_trains("V-1")
+        assert False
+    except ValueError:
+        pass
+    dataset.close()
+
+    loaded = rlx.load_event_trains(str(tmp_path))
+    assert isinstance(loaded.values, np.memmap)
+    assert np.array_equal(loaded.offsets, trains.offsets)
+    assert np.sum(loaded.counts) == len(loaded.values)
+    assert all([np.array_equal(a, b) for a, b in zip(loaded, trains)])
+    assert list(loaded.table.tag_id) == list(trains.table.tag_id)
+    assert np.shares_memory(loaded[1], loaded.values) or len(loaded[1]) == 0
+
+
+def test_psth(synthetic_dataset):
+    import numpy as np
+    dataset = rlx.Dataset(synthetic_dataset)
+    r = dataset.repro_runs("FileStimulus")[0]
+    durations = r.stimulus_table.column("duration")
+    assert len(np.unique(durations)) == len(durations)
+    spikes = dataset.event_traces["Spikes-1"].data_array[:]
+    before, after, bin_width = 0.05, 0.02, 0.007
+    for clip in [True, False]:
+        time, rates, mean = r.psth(bin_width, before, after, clip=clip, trace_name="Spikes-1")
+        edges = np.append(time - bin_width / 2, time[-1] + bin_width / 2)
+        assert rates.shape == (len(r.stimuli), len(time))
+        for i, s in enumerate(r.stimuli):
+            stop = s.start_time + (durations[i] if clip else np.max(durations)) + after
+            relative = spikes[(spikes >= s.start_time - before) & (spikes < stop)] - s.start_time
+            valid = time < stop - s.start_time
+            assert np.allclose(rates[i, valid], np.histogram(relative, edges)[0][valid] / bin_width)
+            assert np.all(np.isnan(rates[i, ~valid]))
+        assert np.allclose(mean, np.nanmean(rates, axis=0))
+        assert np.any(np.isnan(rates)) == clip
+
+    time, rates, mean = r.firing_rates(before=before, after=after, trace_name="Spikes-1")
+    assert rates.shape == (len(r.stimuli), len(time))
+    assert np.all(np.isnan(rates[0, time >= durations[0] + after]))
+    assert not np.any(np.isnan(rates[-1])) and not np.any(np.isnan(mean))
+    dataset.close()
+
+
+def test_partition_events(synthetic_dataset):
+    import numpy as np
+    dataset = rlx.Dataset(synthetic_dataset)
+    spikes = dataset.event_traces["Spikes-1"].data_array[:]
+    before, after = 0.5, 0.5  # windows of neighbouring stimuli overlap
+    trains = dataset.partition_events("Spikes-1", before, after)
+    chunked = dataset.partition_events("Spikes-1", before, after, chunk_size=100)
+    assert np.array_equal(trains.offsets, chunked.offsets) and np.array_equal(trains.values, chunked.values)
+    stimuli = [s for r in dataset.repro_runs() for s in r.stimuli if s.start_time < s.stop_time]
+    assert len(trains) == len(stimuli)
+    for i, s in enumerate(stimuli):
+        expected = spikes[(spikes >= s.start_time - before) & (spikes < s.stop_time + after)] - s.start_time
+        assert np.array_equal(trains[i], expected)
+    with pytest.raises(ValueError):
+        dataset.partition_events("Spikes-1", chunk_size=0)
+    dataset.close()
+
+
+def test_eod_frequencies(synthetic_dataset):
+    import numpy as np
+    from rlxnix.test.synthetic_data import eod_frequency
+    dataset = rlx.Dataset(synthetic_dataset)
+    r = dataset.repro_runs("Beats")[0]
+    eod_times = r.eod_times(trace_name="EOD events")
+    assert r.eod_times(trace_name="EOD events") is eod_times
+    with pytest.raises(ValueError):
+        eod_times[0] = 0.0
+    assert len(r.eod_times(stimulus_index=0, trace_name="EOD events")) > 0
+    time, eodf = r.eod_frequency_trace(resolution=0.1, trace_name="EOD events")
+    assert np.allclose(eodf, eod_frequency)
+    frequencies = r.stimulus_eod_frequencies(trace_name="EOD events")
+    assert len(frequencies) == len(r.stimuli) and np.allclose(frequencies, eod_frequency)
+    with pytest.raises(ValueError):
+        frequencies[0] = 0.0
+    dataset.close()
+
+
+def test_baseline_summary(synthetic_dataset):
+    import numpy as np
+    from rlxnix.plugins.efish.baseline import Baseline, baseline_summary
+    from rlxnix.utils.analysis import serial_correlation
+    dataset = rlx.Dataset(synthetic_dataset)
+    baselines = [r for r in dataset.repro_runs() if isinstance(r, Baseline)]
+    assert len(baselines) > 0
+    assert baselines[0].spikes(trace_name="EOD events") is not baselines[0].spikes(trace_name="Spikes-1")
+    df = baseline_summary([synthetic_dataset, dataset], max_lags=10, trace_name="Spikes-1")
+    assert len(df) == 2 * len(baselines)
+    for (_, row), b in zip(df.iterrows(), baselines + baselines):
+        assert row.repro_name == b.name
+        spikes = b.spikes(trace_name="Spikes-1")
+        isis = np.diff(spikes)
+        assert row.spike_count == len(spikes)
+        assert np.isclose(row.rate, len(spikes) / b.duration)
+        assert np.isclose(row.cv, np.std(isis) / np.mean(isis))
+        assert np.allclose(row.serial_correlation, serial_correlation(isis, 10))
+        if b.eod_frequency is None:  # eod times are not in the signal trace map
+            assert np.isnan(row.eod_frequency) and np.isnan(row.burst_fraction)
+        else:
+            assert np.isclose(row.eod_frequency, b.eod_frequency)
+            assert np.isclose(row.burst_fraction, np.mean(isis < 1.5 / b.eod_frequency))
+        assert np.allclose(row.isi_histogram, np.histogram(isis, np.linspace(0.0, 0.05, 101), density=True)[0])
+    dataset.close()
+
+
+def test_beats_phase_locking(synthetic_dataset):
+    import numpy as np
+    from rlxnix.plugins.efish.beats import Beats
+    dataset = rlx.Dataset(synthetic_dataset)
+    runs = [r for r in dataset.repro_runs() if isinstance(r, Beats)]
+    assert len(runs) > 0
+    spikes = dataset.event_traces["Spikes-1"].data_array[:]
+    for r in runs:
+        eod_times = r.eod_times(trace_name="EOD events")
+        eod_strengths, _, phase_axis, eod_histograms = r.phase_locking("eod", trace_name="Spikes-1", eod_trace_name="EOD events")
+        beat_strengths, _, _, _ = r.phase_locking("beat", trace_name="Spikes-1")
+        assert len(eod_strengths) == len(r.stimuli) and eod_histograms.shape == (len(r.stimuli), len(phase_axis))
+        for i, s in enumerate(r.stimuli):
+            stimulus_spikes = spikes[(spikes >= s.start_time) & (spikes < s.stop_time)]
+            cycles = np.searchsorted(eod_times, stimulus_spikes - r.start_time, side="right") - 1
+            valid = (cycles >= 0) & (cycles < len(eod_times) - 1)
+            phases = 2 * np.pi * (stimulus_spikes[valid] - r.start_time - eod_times[cycles[valid]]) / \
+                (eod_times[cycles[valid] + 1] - eod_times[cycles[valid]])
+            assert np.isclose(eod_strengths[i], np.abs(np.mean(np.exp(1j * phases))))
+            df = np.abs(r.deltafs[i])
+            if df > 0:
+                expected = np.abs(np.mean(np.exp(2j * np.pi * df * (stimulus_spikes - s.start_time))))
+                assert np.isclose(beat_strengths[i], expected)
+                assert np.isclose(r.phase_locking("beat", stimulus_index=i, trace_name="Spikes-1")[0], expected)
+            else:
+                assert np.isnan(beat_strengths[i])
+    dataset.close()
+
+
+
+def test_chirp_triggered_response(synthetic_dataset):
+    import numpy as np
+    from rlxnix.plugins.efish.chirps import Chirps
+    dataset = rlx.Dataset(synthetic_dataset)
+    spikes = dataset.event_traces["Spikes-1"].data_array[:]
+    runs = [r for r in dataset.repro_runs() if isinstance(r, Chirps)]
+    assert len(runs) > 0
+    with pytest.raises(ValueError):
+        dataset.repro_runs("Beats")[0].chirp_triggered_response("V-1")
+    assert runs[0].chirp_triggered_response("Missing-1") == (None, None, None, None)
+    for r in runs:
+        chirp_times, _ = r.chirp_times
+        time, responses, mean, raster = r.chirp_triggered_response("V-1", window=(-0.02, 0.03))
+        assert raster is None
+        assert responses.shape == (sum(len(c) for c in chirp_times), len(time))
+        assert np.allclose(mean, np.nanmean(responses, axis=0))
+        trial = 0
+        for i, s in enumerate(r.stimuli):
+            voltage, voltage_time = s.trace_data("V-1")
+            for chirp_time in chirp_times[i]:
+                start = np.argmin(np.abs(voltage_time - (chirp_time - 0.02)))
+                assert np.allclose(responses[trial], voltage[start:start + len(time)])
+                trial += 1
+
+        time, rates, mean, (times, trials) = r.chirp_triggered_response("Spikes-1", window=(-0.02, 0.03))
+        assert rates.shape[0] == trial and rates.shape[1] == len(time)
+        trial = 0
+        for i, s in enumerate(r.stimuli):
+            for chirp_time in chirp_times[i]:
+                chirp = s.start_time + chirp_time
+                expected = spikes[(spikes >= chirp - 0.02) & (spikes < chirp + 0.03)] - chirp
+                assert np.allclose(times[trials == trial], expected)
+                trial += 1
+    dataset.close()
+
+
+def test_chirp_time_units(tmp_path, synthetic_dataset):
+    import numpy as np
+    from rlxnix.test.synthetic_data import write_synthetic_dataset
+    dataset = rlx.Dataset(synthetic_dataset)
+    r = dataset.repro_runs("Chirps")[0]
+    assert r.chirp_times[1] == "s"
+    expected = r.chirp_triggered_response("V-1", window=(-0.02, 0.03))
+    dataset.close()
+    ms_dataset = rlx.Dataset(write_synthetic_dataset(str(tmp_path / "2021-11-11-ms.nix"), chirp_time_unit="ms"))
+    r = ms_dataset.repro_runs("Chirps")[0]
+    assert r.chirp_times[1] == "ms" and np.allclose(r.chirp_times[0][0], [50.0, 100.0, 150.0])
+    time, responses, _, _ = r.chirp_triggered_response("V-1", window=(-0.02, 0.03))
+    assert np.array_equal(time, expected[0]) and np.array_equal(responses, expected[1])
+    ms_dataset.close()
+    min_dataset = rlx.Dataset(write_synthetic_dataset(str(tmp_path / "2021-11-11-min.nix"), chirp_time_unit="min"))
+    with pytest.raises(ValueError):
+        min_dataset.repro_runs("Chirps")[0].chirp_triggered_response("V-1")
+    min_dataset.close()
+
+
+def test_receptive_field_map(synthetic_dataset):
+    import numpy as np
+    from rlxnix.plugins.efish.receptive_field import ReceptiveField
+    dataset = rlx.Dataset(synthetic_dataset)
+    spikes = dataset.event_traces["Spikes-1"].data_array[:]
+    runs = [r for r in dataset.repro_runs() if isinstance(r, ReceptiveField)]
+    assert len(runs) > 0
+    for r in runs:
+        xs, ys, zs, rates = r.response_map(trace_name="Spikes-1")
+        assert rates.shape == (len(xs), len(ys), len(zs))
+        _, _, _, strengths = r.response_map((0.1, 0.5), "vector_strength", trace_name="Spikes-1")
+        x, y, z = [p.ravel() for p in r.stimulus_positions]
+        deltafs = r.stimulus_deltafs.ravel()
+        expected_rates = {}
+        expected_strengths = {}
+        for i, s in enumerate([s for s in r.stimuli if r._repro_name in s.name]):
+            cell = (np.searchsorted(xs, x[i]), np.searchsorted(ys, y[i]), np.searchsorted(zs, z[i]))
+            count = np.sum((spikes >= s.start_time) & (spikes < s.stop_time))
+            expected_rates.setdefault(cell, []).append(count / s.duration)
+            window = spikes[(spikes >= s.start_time + 0.1) & (spikes < s.start_time + 0.5)] - s.start_time
+            if deltafs[i] != 0 and len(window) > 0:
+                expected_strengths.setdefault(cell, []).append(np.abs(np.mean(np.exp(2j * np.pi * abs(deltafs[i]) * window))))
+        assert np.sum(~np.isnan(rates)) == len(expected_rates)
+        for cell, values in expected_rates.items():
+            assert np.isclose(rates[cell], np.mean(values))
+        for cell, values in expected_strengths.items():
+            assert np.isclose(strengths[cell], np.mean(values))
+        assert r.response_map(trace_name="Spikes-1")[3] is not rates  # cached maps are copied
+    dataset.close()
+
+
+def test_find_stimuli_predicates(synthetic_dataset):
+    dataset = rlx.Dataset(synthetic_dataset)
+    stimuli = dataset.find_stimuli("", stimulus_predicates={"duration": (0.0, None)})
+    assert len(stimuli) == sum([len(r.stimuli) for r in dataset.repro_runs()])
+    beats = dataset.find_stimuli("Beats", stimulus_predicates={"DeltaF": (-20.0, 20.0)})
+    assert len(beats) == 5
+    with pytest.raises(ValueError):
+        dataset.find_stimuli("", stimulus_predicates={"durration": (0.0, None)})
+    dataset.close()
@@ -0,0 +1,108 @@
+import os
+import pytest
+import numpy as np
+import rlxnix as rlx
+from rlxnix.utils.util import convert_path
+from rlxnix.utils.buffers import StimulusFileBuffer
+from rlxnix.utils.stimulus_file import parse_stimulus_file, read_stimulus_file
+
+
+def write_stimulus_file(filename, samples):
+    with open(filename, "w") as f:
+        f.write("# analog output: AO-1\n#   sample rate: 20000Hz\n# Settings\n#   contrast = 0.3\n\n#Key\n# t x\n# s 1\n")
+        for i, x in enumerate(samples):
+            f.write(f"  {i / 20000:.5f}  {x:7.4f}\n")
+        f.write("\n# name: second\n")
+        for i, x in enumerate(samples[:5]):
+            f.write(f"  {i:d}  {x:7.4f}  {2 * x:7.4f}\n")
+
+
+def test_parse_stimulus_file(tmp_path):
+    filename = os.path.join(tmp_path, "noise.dat")
+    samples = np.round(np.random.default_rng(3).normal(0.0, 1.0, 1000), 4)
+    write_stimulus_file(filename, samples)
+    blocks = parse_stimulus_file(filename)
+    assert len(blocks) == 2
+    assert blocks[0]["analog output"] == "AO-1" and blocks[0]["Settings"]["contrast"] == "0.3"
+    assert blocks[0]["key"] == [("t", "x"), ("s", "1")]
+    assert blocks[0]["data"].shape == (1000, 2)
+    assert np.allclose(blocks[0]["data"][:, 0], np.arange(1000) / 20000)
+    assert np.allclose(blocks[0]["data"][:, 1], samples)
+    assert blocks[1]["name"] == "second"
+    assert np.allclose(blocks[1]["data"][:, 2], 2 * samples[:5])
+
+
+def test_read_stimulus_file(tmp_path):
+    filename = os.path.join(tmp_path, "noise.dat")
+    samples = np.round(np.random.default_rng(4).normal(0.0, 1.0, 1000), 4)
+    write_stimulus_file(filename, samples)
+    buffer = StimulusFileBuffer()
+    buffer.clear()
+    blocks = read_stimulus_file(filename, binary_cache=True)
+    again = read_stimulus_file(filename)
+    assert again[0] is not blocks[0] and again[0]["data"] is blocks[0]["data"]
+    again[0]["Settings"]["contrast"] = "0.5"
+    assert read_stimulus_file(filename)[0]["Settings"]["contrast"] == "0.3"
+    with pytest.raises(ValueError):
+        blocks[0]["data"][0, 0] = 1.0
+    assert os.path.exists(os.path.join(tmp_path, ".rlxnix_cache", "noise.dat.npz"))
+
+    buffer.clear()
+    cached = read_stimulus_file(filename, binary_cache=True)
+    assert cached is not blocks
+    for b, c in zip(blocks, cached):
+        assert {k: v for k, v in b.items() if k != "data"} == {k: v for k, v in c.items() if k != "data"}
+        assert np.array_equal(b["data"], c["data"]) and not c["data"].flags.writeable
+
+    write_stimulus_file(filename, samples[:500])  # modified files are parsed again
+    os.utime(filename, (os.path.getatime(filename), os.path.getmtime(filename) + 10))
+    assert len(read_stimulus_file(filename, binary_cache=True)[0]["data"]) == 500
+    assert len(buffer) == 1
+    buffer.clear()
+
+
+def test_resampled_stimulus(tmp_path):
+    from rlxnix.plugins.efish.filestimulus import FileStimulus
+    filename = os.path.join(tmp_path, "noise.dat")
+    samples = np.round(np.random.default_rng(6).normal(0.0, 1.0, 2000), 4)
+    write_stimulus_file(filename, samples)
+    r = FileStimulus.__new__(FileStimulus)  # no repro run needed to resample a file
+    r._binary_cache = False
+    r._resampled_stimuli = {}
+    original_time = np.arange(len(samples)) / 20000
+    for duration, rate in [(0.05, 1000.0), (0.2, 1000.0), (0.05, 40000.0)]:  # the file is 0.1 s long
+        stimulus, time = r._resampled_stimulus(filename, duration, rate)
+        expected_time = np.linspace(0.0, duration, int(duration * rate))
+        expected_time[expected_time > original_time[-1]] = original_time[-1]
+        assert np.allclose(time, expected_time) and np.allclose(stimulus, np.interp(expected_time, original_time, samples))
+        assert r._resampled_stimulus(filename, duration, rate)[0] is stimulus
+    assert len(r._resampled_stimuli) == 3
+
+    write_stimulus_file(filename, -samples)  # modified files are resampled again
+    os.utime(filename, (os.path.getatime(filename), os.path.getmtime(filename) + 10))
+    stimulus, _ = r._resampled_stimulus(filename, 0.05, 1000.0)
+    assert np.allclose(stimulus, -np.interp(np.linspace(0.0, 0.05, 50), original_time, samples))
+
+
+def test_load_stimuli(tmp_path, synthetic_dataset):
+    from rlxnix.plugins.efish.filestimulus import FileStimulus
+    samples = np.round(np.random.default_rng(5).normal(0.0, 1.0, 20000), 4)
+    dataset = rlx.Dataset(synthetic_dataset)
+    runs = [r for r in dataset.repro_runs() if isinstance(r, FileStimulus)]
+    assert len(runs) > 0
+    for r in runs:
+        write_stimulus_file(os.path.join(tmp_path, os.path.basename(convert_path(r.stimulus_filename))), samples)
+        r.stimulus_folder = str(tmp_path)
+        stimuli, times = r.load_stimuli(trace_name="V-1")
+        assert len(stimuli) == len(r.stimuli)
+        for i, s in enumerate(r.stimuli):
+            rate = 1. / s.trace_info("V-1").sampling_interval
+            expected_time = np.linspace(0.0, s.duration, int(s.duration * rate))
+            expected_time[expected_time > (len(samples) - 1) / 20000] = (len(samples) - 1) / 20000
+            expected = np.interp(expected_time, np.arange(len(samples)) / 20000, samples)
+            stimulus, time = r.load_stimulus(i, trace_name="V-1")
+            assert np.allclose(time, expected_time) and np.allclose(stimulus, expected)
+            assert np.allclose(stimuli[i], expected) and np.allclose(times[i], expected_time)
+        stimulus, time = r.load_stimulus(0, sampling_rate=1000.)
+        assert len(stimulus) == int(r.stimuli[0].duration * 1000.)
+    dataset.close()
@@ -0,0 +1,417 @@
+import logging
+import numpy as np
+
+_methods = ["auto", "direct", "fft"]
+
+
+def _lag_count(length, max_lags):
+    """The number of lags np.correlate(x, x, "same") yields for non-negative lags, limited to max_lags.
+    """
+    return max(0, min(max_lags, length - length // 2))
+
+
+def _use_fft(method, length, lags):
+    if method not in _methods:
+        logging.error(f"serial_correlation: invalid method {method}! Methods are {_methods}.")
+        raise ValueError(f"serial_correlation: invalid method {method}! Methods are {_methods}.")
+    if method == "auto":
+        return lags > 4 * np.log2(max(length, 2))
+    return method == "fft"
+
+
+def serial_correlations(sequences, max_lags=50, method="auto") -> list:
+    """Serial correlations of several sequences, e.g. the interspike intervals of many baseline recordings, computed in one batch. The sequences are zero-padded into a matrix and only the requested lags are computed, either directly (O(n * lags)) or via the FFT (O(n log n)).
+
+    The result for each sequence equals ``np.correlate(u, u, "same")[len(u) // 2:][:max_lags] / np.sum(u**2)`` with the mean-free sequence u, i.e. the correlations for lags 0 to max_lags - 1, but at most len(u) - len(u) // 2 values.
+
+    Parameters
+    ----------
+    sequences : list of np.ndarray
+        The sequences.
+    max_lags : int, optional
+        The number of lags, by default 50
+    method : str, optional
+        "direct", "fft", or "auto", by default "auto", i.e. the FFT is used for large lag counts.
+
+    Returns
+    -------
+    list of np.ndarray
+        The serial correlations of each sequence.
+
+    Raises
+    ------
+    ValueError
+        If the method is invalid.
+    """
+    sequences = [np.asarray(s, dtype=float) for s in sequences]
+    lengths = np.array([len(s) for s in sequences], dtype=int)
+    if len(sequences) == 0:
+        return []
+    width = max(lengths.max(), 1)
+    lags = max([_lag_count(n, max_lags) for n in lengths])
+    unbiased = np.zeros((len(sequences), width))
+    for i, s in enumerate(sequences):
+        if len(s) > 0:
+            unbiased[i, :len(s)] = s - np.mean(s)
+
+    if _use_fft(method, width, lags):
+        size = 1 << int(np.ceil(np.log2(2 * width)))
+        spectrum = np.fft.rfft(unbiased, n=size, axis=1)
+        correlations = np.fft.irfft(spectrum * np.conj(spectrum), n=size, axis=1)[:, :lags]
+    else:
+        correlations = np.empty((len(sequences), lags))
+        for k in range(lags):
+            correlations[:, k] = np.einsum("ij,ij->i", unbiased[:, :width - k], unbiased[:, k:])
+    norms = np.einsum("ij,ij->i", unbiased, unbiased)
+    results = []
+    for i, n in enumerate(lengths):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results.append(correlations[i, :_lag_count(n, max_lags)] / norms[i])
+    return results
+
+
+def serial_correlation(sequence, max_lags=50, method="auto") -> np.ndarray:
+    """Serial correlation of a sequence, e.g. of interspike intervals, for lags 0 to max_lags - 1. See serial_correlations.
+
+    Parameters
+    ----------
+    sequence : np.ndarray
+        The sequence.
+    max_lags : int, optional
+        The number of lags, by default 50
+    method : str, optional
+        "direct", "fft", or "auto", by default "auto"
+
+    Returns
+    -------
+    np.ndarray
+        The serial correlations, at most len(sequence) - len(sequence) // 2 values.
+    """
+    return serial_correlations([sequence], max_lags, method)[0]
+
+
+def binned_rates(times, trials, trial_count, window_start, bin_width, bin_count) -> np.ndarray:
+    """Histograms of the event times of all trials at once, as rates.
+
+    Parameters
+    ----------
+    times : np.ndarray
+        The event times relative to trial start (see rlxnix.utils.event_trains.partition_events).
+    trials : np.ndarray
+        The trial index of each event.
+    trial_count : int
+        The number of trials.
+    window_start : float
+        The left edge of the first bin.
+    bin_width : float
+        The bin width.
+    bin_count : int
+        The number of bins.
+
+    Returns
+    -------
+    np.ndarray
+        The rates (events per bin divided by the bin width), trials x bins.
+    """
+    bins = np.floor((np.asarray(times) - window_start) / bin_width).astype(int)
+    valid = (bins >= 0) & (bins < bin_count)
+    counts = np.bincount(np.asarray(trials)[valid] * bin_count + bins[valid], minlength=trial_count * bin_count)
+    return counts.reshape(trial_count, bin_count) / bin_width
+
+
+def kernel_rates(times, trials, trial_count, window_start, dt, sample_count, kernel_width) -> np.ndarray:
+    """Convolves the event trains of all trials with a Gaussian kernel at once, using the FFT.
+
+    Parameters
+    ----------
+    times : np.ndarray
+        The event times relative to trial start (see rlxnix.utils.event_trains.partition_events).
+    trials : np.ndarray
+        The trial index of each event.
+    trial_count : int
+        The number of trials.
+    window_start : float
+        The time of the first sample.
+    dt : float
+        The temporal resolution.
+    sample_count : int
+        The number of samples.
+    kernel_width : float
+        The standard deviation of the Gaussian kernel.
+
+    Returns
+    -------
+    np.ndarray
+        The firing rates, trials x samples.
+    """
+    trains = binned_rates(times, trials, trial_count, window_start - dt / 2, dt, sample_count)
+    half_width = int(np.ceil(4 * kernel_width / dt))
+    kernel_time = np.arange(-half_width, half_width + 1) * dt
+    kernel = np.exp(-0.5 * (kernel_time / kernel_width) ** 2)
+    kernel /= np.sum(kernel)
+    size = 1 << int(np.ceil(np.log2(max(sample_count + len(kernel) - 1, 1))))
+    rates = np.fft.irfft(np.fft.rfft(trains, n=size, axis=1) * np.fft.rfft(kernel, n=size), n=size, axis=1)
+    return rates[:, half_width:half_width + sample_count]
+
+
+def sampled_windows(data, starts, sample_count, groups=None) -> np.ndarray:
+    """Cuts windows of sample_count samples out of a 1-D sampled array, e.g. the responses to many chirps. The windows of each group (e.g. the chirps of one stimulus) are read in one slice, the slices of groups that overlap or touch are merged. data may thus be a nixio.DataArray, only the spanned parts are read from file.
+
+    Parameters
+    ----------
+    data : np.ndarray or nixio.DataArray
+        The sampled data, anything that supports len() and slicing.
+    starts : np.ndarray
+        The index of the first sample of each window, may be outside the data.
+    sample_count : int
+        The number of samples of each window.
+    groups : np.ndarray, optional
+        The group of each window, by default None, i.e. all windows are read in one slice.
+
+    Returns
+    -------
+    np.ndarray
+        The windows x samples, NaN where a window exceeds the data.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    windows = np.full((len(starts), sample_count), np.nan)
+    if len(starts) == 0 or sample_count == 0:
+        return windows
+    groups = np.zeros(len(starts), dtype=int) if groups is None else np.asarray(groups)
+    labels, window_groups = np.unique(groups, return_inverse=True)
+    firsts = np.full(len(labels), np.iinfo(np.int64).max)
+    lasts = np.full(len(labels), np.iinfo(np.int64).min)
+    np.minimum.at(firsts, window_groups, starts)
+    np.maximum.at(lasts, window_groups, starts + sample_count)
+    firsts = np.clip(firsts, 0, len(data))
+    lasts = np.clip(lasts, 0, len(data))
+    segments = []
+    group_segments = np.zeros(len(labels), dtype=int)
+    for g in np.argsort(firsts, kind="stable"):
+        if len(segments) > 0 and firsts[g] <= segments[-1][1]:
+            segments[-1][1] = max(segments[-1][1], lasts[g])
+        else:
+            segments.append([firsts[g], lasts[g]])
+        group_segments[g] = len(segments) - 1
+    window_segments = group_segments[window_groups]
+    for i, (first, last) in enumerate(segments):
+        if last <= first:
+            continue
+        rows = np.nonzero(window_segments == i)[0]
+        chunk = np.asarray(data[first:last], dtype=float)
+        indices = starts[rows, np.newaxis] + np.arange(sample_count)
+        valid = (indices >= first) & (indices < last)
+        block = np.full((len(rows), sample_count), np.nan)
+        block[valid] = chunk[indices[valid] - first]
+        windows[rows] = block
+    return windows
+
+
+def instantaneous_frequency(event_times, smoothing=None, resolution=None, start=None, stop=None):
+    """The instantaneous frequency of a periodic event train, e.g. of the EOD times, i.e. the inverse of the intervals, assigned to the interval centers. Optionally smoothed with a running average and resampled on a regular time grid.
+
+    Parameters
+    ----------
+    event_times : np.ndarray
+        The sorted event times.
+    smoothing : float, optional
+        Width of the running average in seconds (converted to a number of intervals using the mean interval), by default None, i.e. no smoothing.
+    resolution : float, optional
+        Temporal resolution of the returned trace in seconds, the frequency is linearly interpolated at these times, by default None, i.e. the interval centers are returned.
+    start : float, optional
+        Start of the regular time grid, by default None, i.e. the first event time.
+    stop : float, optional
+        End of the regular time grid, by default None, i.e. the last event time.
+
+    Returns
+    -------
+    np.ndarray
+        The time axis.
+    np.ndarray
+        The frequency in Hz.
+    """
+    event_times = np.asarray(event_times, dtype=float)
+    if len(event_times) < 2:
+        return np.array([]), np.array([])
+    intervals = np.diff(event_times)
+    time = event_times[:-1] + intervals / 2
+    frequency = 1. / intervals
+    if smoothing is not None and smoothing > 0:
+        width = int(np.round(smoothing / np.mean(intervals)))
+        if width > 1 and width <= len(frequency):
+            cumulative = np.concatenate(([0.], np.cumsum(frequency)))
+            frequency = (cumulative[width:] - cumulative[:-width]) / width
+            time = time[width // 2:width // 2 + len(frequency)]
+    if resolution is not None:
+        start = event_times[0] if start is None else start
+        stop = event_times[-1] if stop is None else stop
+        grid = np.arange(start, stop, resolution)
+        frequency = np.interp(grid, time, frequency)
+        time = grid
+    return time, frequency
+
+
+def window_frequencies(event_times, window_starts, window_stops) -> np.ndarray:
+    """The mean frequency of a periodic event train in many windows at once, i.e. the number of complete periods between the first and the last event in each window divided by their duration.
+
+    Parameters
+    ----------
+    event_times : np.ndarray
+        The sorted event times.
+    window_starts : np.ndarray
+        The window starts.
+    window_stops : np.ndarray
+        The window ends.
+
+    Returns
+    -------
+    np.ndarray
+        The frequency in Hz for each window, NaN if a window contains less than two events.
+    """
+    event_times = np.asarray(event_times, dtype=float)
+    lo = np.searchsorted(event_times, window_starts, side="left")
+    hi = np.searchsorted(event_times, window_stops, side="left") - 1
+    frequencies = np.full(len(lo), np.nan)
+    valid = hi > lo
+    frequencies[valid] = (hi[valid] - lo[valid]) / (event_times[hi[valid]] - event_times[lo[valid]])
+    return frequencies
+
+
+def cycle_phases(event_times, cycle_times) -> np.ndarray:
+    """The phases of events within the cycles of a periodic reference, e.g. of spikes relative to the EOD. The cycle of each event is found with a binary search, the phase is interpolated linearly within the cycle.
+
+    Parameters
+    ----------
+    event_times : np.ndarray
+        The event times.
+    cycle_times : np.ndarray
+        The sorted cycle start times, e.g. the EOD times.
+
+    Returns
+    -------
+    np.ndarray
+        The phases in radians in [0, 2 pi), NaN for events before the first or after the last cycle start.
+    """
+    event_times = np.asarray(event_times, dtype=float)
+    cycle_times = np.asarray(cycle_times, dtype=float)
+    phases = np.full(len(event_times), np.nan)
+    if len(cycle_times) < 2:
+        return phases
+    cycles = np.searchsorted(cycle_times, event_times, side="right") - 1
+    valid = (cycles >= 0) & (cycles < len(cycle_times) - 1)
+    cycles = cycles[valid]
+    periods = cycle_times[cycles + 1] - cycle_times[cycles]
+    phases[valid] = 2 * np.pi * (event_times[valid] - cycle_times[cycles]) / periods
+    return phases
+
+
+def periodic_phases(times, trials, frequencies) -> np.ndarray:
+    """The phases of events within a periodic signal of known frequency, e.g. a beat, that starts with phase zero at trial start.
+
+    Parameters
+    ----------
+    times : np.ndarray
+        The event times relative to trial start.
+    trials : np.ndarray
+        The trial index of each event.
+    frequencies : np.ndarray
+        The frequency of each trial in Hz, the sign is ignored.
+
+    Returns
+    -------
+    np.ndarray
+        The phases in radians in [0, 2 pi), NaN for trials with frequency zero.
+    """
+    frequencies = np.abs(np.asarray(frequencies, dtype=float))
+    frequencies[frequencies == 0.0] = np.nan  # not periodic
+    return 2 * np.pi * np.mod(np.asarray(times, dtype=float) * frequencies[np.asarray(trials, dtype=int)], 1.0)
+
+
+def vector_strengths(phases, trials, trial_count):
+    """Vector strength and mean phase of the event phases of all trials at once. Events with NaN phases are ignored.
+
+    Parameters
+    ----------
+    phases : np.ndarray
+        The event phases in radians.
+    trials : np.ndarray
+        The trial index of each event.
+    trial_count : int
+        The number of trials.
+
+    Returns
+    -------
+    np.ndarray
+        The vector strength of each trial, NaN for trials without events.
+    np.ndarray
+        The mean phase of each trial in radians in [0, 2 pi), NaN for trials without events.
+    """
+    phases = np.asarray(phases, dtype=float)
+    valid = ~np.isnan(phases)
+    trials = np.asarray(trials)[valid]
+    counts = np.bincount(trials, minlength=trial_count)
+    x = np.bincount(trials, weights=np.cos(phases[valid]), minlength=trial_count)
+    y = np.bincount(trials, weights=np.sin(phases[valid]), minlength=trial_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        strengths = np.where(counts > 0, np.sqrt(x ** 2 + y ** 2) / counts, np.nan)
+    mean_phases = np.where(counts > 0, np.mod(np.arctan2(y, x), 2 * np.pi), np.nan)
+    return strengths, mean_phases
+
+
+def phase_histograms(phases, trials, trial_count, bin_count) -> np.ndarray:
+    """Histograms of the event phases of all trials at once. Events with NaN phases are ignored.
+
+    Parameters
+    ----------
+    phases : np.ndarray
+        The event phases in radians in [0, 2 pi).
+    trials : np.ndarray
+        The trial index of each event.
+    trial_count : int
+        The number of trials.
+    bin_count : int
+        The number of bins between 0 and 2 pi.
+
+    Returns
+    -------
+    np.ndarray
+        The fraction of the events of each trial in each bin, trials x bins.
+    """
+    phases = np.asarray(phases, dtype=float)
+    valid = ~np.isnan(phases)
+    bins = np.minimum(np.floor(phases[valid] / (2 * np.pi) * bin_count).astype(int), bin_count - 1)
+    trials = np.asarray(trials)[valid]
+    counts = np.bincount(trials * bin_count + bins, minlength=trial_count * bin_count).reshape(trial_count, bin_count)
+    totals = np.sum(counts, axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(totals > 0, counts / totals, 0.0)
+
+
+def grid_average(positions, values):
+    """Averages values that were measured at positions on a grid, e.g. the responses of a receptive field measurement, with one bincount. NaN values are ignored.
+
+    Parameters
+    ----------
+    positions : list of np.ndarray
+        One array per dimension holding the coordinate of each value.
+    values : np.ndarray
+        The values.
+
+    Returns
+    -------
+    list of np.ndarray
+        The unique coordinates of each dimension, i.e. the grid axes.
+    np.ndarray
+        The mean value at each grid position, one axis per dimension, NaN where there are no values.
+    """
+    axes, cell_indices = zip(*[np.unique(np.asarray(p, dtype=float).ravel(), return_inverse=True) for p in positions])
+    shape = tuple(len(a) for a in axes)
+    values = np.asarray(values, dtype=float)
+    cells = np.ravel_multi_index(cell_indices, shape)
+    valid = ~np.isnan(values)
+    size = int(np.prod(shape))
+    sums = np.bincount(cells[valid], weights=values[valid], minlength=size)
+    counts = np.bincount(cells[valid], minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        averages = np.where(counts > 0, sums / counts, np.nan).reshape(shape)
+    return list(axes), averages
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import threading
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .data_loader import load_data_segment
+
+_max_workers = 4
+_executor = None
+_executor_lock = threading.Lock()
+_container_file_locks = weakref.WeakKeyDictionary()
+
+
+def set_max_workers(count):
+    """Sets the number of threads that run the reads of the async functions. Reads that have already been submitted are finished by the previous threads.
+
+    Parameters
+    ----------
+    count : int
+        The maximum number of threads, by default 4.
+
+    Raises
+    ------
+    ValueError
+        If count is less than 1.
+    """
+    global _max_workers, _executor
+    if count < 1:
+        logging.error(f"set_max_workers: count must be at least 1, got {count}!")
+        raise ValueError(f"set_max_workers: count must be at least 1, got {count}!")
+    with _executor_lock:
+        _max_workers = count
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="rlxnix-io")
+        return _executor
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Runs a blocking function in the bounded executor that is shared by the async functions of rlxnix.
+
+    Parameters
+    ----------
+    func : callable
+        The function.
+    args, kwargs
+        Its arguments.
+
+    Returns
+    -------
+    Any
+        The return value of func.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def load_data_segment_async(data_link, trace_name, before=0.0, after=0.0, data_location=".", store_location=None):
+    """Async variant of ``rlxnix.load_data_segment``. The data is read in the bounded executor (see set_max_workers), the files are taken from the FileHandlePool and reads from the same file are serialized by the file's lock. Many segments can be awaited concurrently:
+
+    .. code-block:: python
+
+        results = await asyncio.gather(*[rlx.load_data_segment_async(dl, "V-1", data_location="data") for dl in data_links])
+
+    Parameters
+    ----------
+    data_link : DataLink
+        The DataLink object pointing at the selected data segment.
+    trace_name : str
+        The name of the recorded signal that should be read.
+    before : float, optional
+        If possible, read data from before segment start, by default 0.0
+    after : float, optional
+        If possible, also read the data after segment stop, by default 0.0
+    data_location : str, optional
+        The folder where to find the dataset, by default "."
+    store_location : str, optional
+        The folder where to find the segment store of the dataset, by default None, i.e. the data_location.
+
+    Returns
+    -------
+    np.ndarray
+        The data read from the trace (trace_name).
+    np.ndarray or None
+        The respective time axis if the data trace is continuous data trace, None, otherwise.
+    """
+    return await run_in_executor(load_data_segment, data_link, trace_name, before=before, after=after,
+                                 data_location=data_location, store_location=store_location)
+
+
+def container_file_lock(nix_file) -> threading.RLock:
+    """The lock that serializes the async reads of TraceContainers from the same (Dataset's) nix file.
+
+    Parameters
+    ----------
+    nix_file : nixio.File
+        The file.
+
+    Returns
+    -------
+    threading.RLock
+        The lock.
+    """
+    with _executor_lock:
+        if nix_file not in _container_file_locks:
+            _container_file_locks[nix_file] = threading.RLock()
+        return _container_file_locks[nix_file]
@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 
 
 class Singleton(type):
@@ -59,10 +60,11 @@ class FeatureBuffer(metaclass=Singleton):
         logging.debug(f"FeatureBuffer: feature data for feature {feature_name} and tag {tag_id} in buffer: {found}!")
         return found
 
-    def get(self, tag_id, feature_name):
+    def get(self, tag_id, feature_name, copy=True):
         if self.has(tag_id, feature_name) :
             logging.debug(f"FeatureBuffer: found feature data for feature {feature_name} and tag {tag_id}!")
-            return self._buffer[tag_id][feature_name].copy()
+            data = self._buffer[tag_id][feature_name]
+            return data.copy() if copy else data
         else:
             logging.debug(f"FeatureBuffer: did not find Feature {feature_name} for tag {tag_id}!")
             return None
@@ -71,3 +73,103 @@ class FeatureBuffer(metaclass=Singleton):
         if show_log:
             logging.debug("FeatureBuffer cleared!")
         self._buffer.clear()
+
+
+class SectionIndexBuffer(metaclass=Singleton):
+    def __init__(self) -> None:
+        super().__init__()
+        self._buffer = {}
+
+    def put(self, file_id, section_index):
+        logging.debug(f"SectionIndexBuffer: add section index for file {file_id}!")
+        if file_id not in self._buffer.keys():
+            self._buffer[file_id] = section_index
+
+    def has(self, file_id):
+        return file_id in self._buffer.keys()
+
+    def get(self, file_id):
+        if self.has(file_id):
+            return self._buffer[file_id]
+        else:
+            logging.debug(f"SectionIndexBuffer: did not find section index for file {file_id}!")
+            return None
+
+    def clear(self, show_log=True):
+        if show_log:
+            logging.debug("SectionIndexBuffer cleared!")
+        self._buffer.clear()
+
+
+class TagIndexBuffer(metaclass=Singleton):
+    def __init__(self) -> None:
+        super().__init__()
+        self._buffer = {}
+
+    def put(self, tag_id, tag_index):
+        logging.debug(f"TagIndexBuffer: add name index for tag {tag_id}!")
+        if tag_id not in self._buffer.keys():
+            self._buffer[tag_id] = tag_index
+
+    def has(self, tag_id):
+        return tag_id in self._buffer.keys()
+
+    def get(self, tag_id):
+        if self.has(tag_id):
+            return self._buffer[tag_id]
+        else:
+            logging.debug(f"TagIndexBuffer: did not find name index for tag {tag_id}!")
+            return None
+
+    def clear(self, show_log=True):
+        if show_log:
+            logging.debug("TagIndexBuffer cleared!")
+        self._buffer.clear()
+
+
+class StimulusFileBuffer(metaclass=Singleton):
+    """Process-wide buffer of parsed stimulus files, keyed by path and modification time. If more than max_size files are buffered, the least recently used one is dropped.
+    """
+    def __init__(self, max_size=16) -> None:
+        super().__init__()
+        self._max_size = max_size
+        self._buffer = OrderedDict()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, count):
+        self._max_size = count
+        while len(self._buffer) > self._max_size:
+            self._buffer.popitem(last=False)
+
+    def put(self, path, mtime, content):
+        logging.debug(f"StimulusFileBuffer: add content of file {path}!")
+        for key in [k for k in self._buffer.keys() if k[0] == path and k[1] != mtime]:
+            del self._buffer[key]  # outdated
+        self._buffer[(path, mtime)] = content
+        self._buffer.move_to_end((path, mtime))
+        while len(self._buffer) > self._max_size:
+            self._buffer.popitem(last=False)
+
+    def has(self, path, mtime):
+        return (path, mtime) in self._buffer.keys()
+
+    def get(self, path, mtime):
+        if self.has(path, mtime):
+            self._buffer.move_to_end((path, mtime))
+            return self._buffer[(path, mtime)]
+        else:
+            logging.debug(f"StimulusFileBuffer: did not find file {path}!")
+            return None
+
+    def clear(self, show_log=True):
+        if show_log:
+            logging.debug("StimulusFileBuffer cleared!")
+        self._buffer.clear()
+
+    def __len__(self):
+        return len(self._buffer)
+
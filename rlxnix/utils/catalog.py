@@ -0,0 +1,339 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+import logging
+import multiprocessing
+import urllib.parse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from .data_loader import DataLink, SegmentType
+from .util import nix_metadata_to_dict, metadata_to_json
+
+catalog_columns = DataLink.columns() + ["repro_name"]
+partition_columns = ["dataset_name", "segment_type"]
+_formats = {"parquet": "parquet", "arrow": "ipc"}
+fingerprint_file = "_fingerprints.json"  # the leading underscore hides it from the pyarrow dataset discovery
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:
+        logging.error("catalog: pyarrow is required for reading and writing catalogs, install it with 'pip install rlxnix[catalog]'!")
+        raise ImportError("catalog: pyarrow is required for reading and writing catalogs, install it with 'pip install rlxnix[catalog]'!") from e
+    return pyarrow
+
+
+def _file_format(format):
+    if format not in _formats:
+        logging.error(f"catalog: invalid format {format}! Supported formats are {list(_formats.keys())}.")
+        raise ValueError(f"catalog: invalid format {format}! Supported formats are {list(_formats.keys())}.")
+    return _formats[format]
+
+
+def catalog_schema():
+    """The arrow schema of the catalog.
+
+    Returns
+    -------
+    pyarrow.Schema
+        The schema.
+    """
+    pa = _pyarrow()
+    return pa.schema([("dataset_name", pa.string()), ("block_id", pa.string()), ("tag_id", pa.string()),
+                      ("segment_type", pa.string()), ("start_time", pa.float64()), ("stop_time", pa.float64()),
+                      ("index", pa.int64()), ("max_before", pa.float64()), ("max_after", pa.float64()),
+                      ("mapping_version", pa.float64()), ("metadata", pa.string()), ("repro_name", pa.string())])
+
+
+def _partitioning():
+    pa = _pyarrow()
+    schema = catalog_schema()
+    return pa.dataset.partitioning(pa.schema([schema.field(c) for c in partition_columns]), flavor="hive")
+
+
+def export_catalog(data_links, path, format="parquet"):
+    """Writes DataLinks to a catalog folder. The catalog is partitioned by dataset name and segment type (hive style, e.g. ``dataset_name=2021-11-11-aa.nix/segment_type=StimulusSegment``), partitions of the exported datasets that already exist are replaced.
+
+    Parameters
+    ----------
+    data_links : pandas.DataFrame or dict
+        The DataLinks, e.g. the DataFrame returned by Dataset.to_pandas or a dictionary of columns. The repro_name column is optional.
+    path : str
+        The catalog folder.
+    format : str, optional
+        The file format, either "parquet" or "arrow", by default "parquet"
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported, a DataLink column is missing, or the metadata are deduplicated.
+    """
+    pa = _pyarrow()
+    file_format = _file_format(format)
+    if "metadata_base" in data_links:
+        logging.error("export_catalog: metadata must not be deduplicated, use to_pandas(deduplicate_metadata=False)!")
+        raise ValueError("export_catalog: metadata must not be deduplicated, use to_pandas(deduplicate_metadata=False)!")
+    columns = {}
+    for c in catalog_columns:
+        if c in data_links:
+            values = data_links[c]
+            columns[c] = values.tolist() if isinstance(values, (pd.Series, np.ndarray)) else list(values)
+        elif c == "repro_name":
+            columns[c] = [None] * len(columns["dataset_name"])
+        else:
+            logging.error(f"export_catalog: required column {c} is missing!")
+            raise ValueError(f"export_catalog: required column {c} is missing!")
+    for c in ["index", "max_before"]:
+        columns[c] = [None if v is None or (isinstance(v, float) and np.isnan(v)) else v for v in columns[c]]
+    table = pa.Table.from_pydict(columns, schema=catalog_schema())
+    logging.info(f"export_catalog: writing {table.num_rows} DataLinks to {path}.")
+    pa.dataset.write_dataset(table, path, format=file_format, partitioning=_partitioning(),
+                             basename_template="part-{i}." + format,
+                             existing_data_behavior="delete_matching")
+
+
+def _isin(field, values):
+    if isinstance(values, (str, SegmentType)):
+        values = [values]
+    return field.isin([str(v) for v in values])
+
+
+def load_catalog(path, columns=None, dataset_name=None, segment_type=None, repro_name=None,
+                 time_range=None, format="parquet") -> pd.DataFrame:
+    """Reads a catalog written by export_catalog. Only the requested columns are read and the selection by dataset name and segment type skips whole partitions, the other predicates are evaluated while reading.
+
+    .. code-block:: python
+
+        df = rlx.load_catalog("catalog", columns=["dataset_name", "tag_id", "start_time", "stop_time"],
+                              dataset_name="2021-11-11-aa.nix", segment_type=SegmentType.StimulusSegment,
+                              repro_name="Beats")
+
+    Parameters
+    ----------
+    path : str
+        The catalog folder.
+    columns : list of str, optional
+        The columns that should be read, by default None, i.e. all columns.
+    dataset_name : str or list of str, optional
+        Select the DataLinks of the given dataset(s), by default None
+    segment_type : SegmentType, str or list, optional
+        Select the DataLinks of the given segment type(s), by default None
+    repro_name : str or list of str, optional
+        Select the segments that belong to the given repro run(s), e.g. "Beats_1", by default None
+    time_range : tuple of float, optional
+        Select the segments that overlap with the (start, stop) interval, either limit can be None, by default None
+    format : str, optional
+        The file format, by default "parquet"
+
+    Returns
+    -------
+    pandas.DataFrame
+        The selected DataLinks, they can be converted to DataLink objects using rlxnix.from_pandas if all DataLink columns are read. The index column has the nullable Int64 dtype.
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported or a column does not exist.
+    """
+    pa = _pyarrow()
+    file_format = _file_format(format)
+    if not os.path.exists(path):
+        logging.error(f"load_catalog: catalog {path} does not exist!")
+        raise ValueError(f"load_catalog: catalog {path} does not exist!")
+    if columns is not None:
+        missing = [c for c in columns if c not in catalog_columns]
+        if len(missing) > 0:
+            logging.error(f"load_catalog: invalid columns {missing}! Columns are {catalog_columns}.")
+            raise ValueError(f"load_catalog: invalid columns {missing}! Columns are {catalog_columns}.")
+    dataset = pa.dataset.dataset(path, schema=catalog_schema(), format=file_format, partitioning=_partitioning())
+    field = pa.dataset.field
+    expression = None
+    for name, values in (("dataset_name", dataset_name), ("segment_type", segment_type), ("repro_name", repro_name)):
+        if values is not None:
+            e = _isin(field(name), values)
+            expression = e if expression is None else expression & e
+    if time_range is not None:
+        start, stop = time_range
+        if start is not None:
+            expression = field("stop_time") > start if expression is None else expression & (field("stop_time") > start)
+        if stop is not None:
+            expression = field("start_time") < stop if expression is None else expression & (field("start_time") < stop)
+    table = dataset.to_table(columns=columns if columns is not None else catalog_columns, filter=expression)
+    return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+
+def dataset_fingerprint(filename, content_hash=True) -> dict:
+    """The fingerprint of a nix file that is used to detect new or modified datasets: the file size, the modification time, and a hash of the block names, ids and block metadata.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the nix file.
+    content_hash : bool, optional
+        Whether or not the content hash is calculated, this requires opening the file, by default True
+
+    Returns
+    -------
+    dict
+        The fingerprint with the keys size, mtime and hash (None if not calculated).
+    """
+    import nixio
+    stat = os.stat(filename)
+    fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": None}
+    if content_hash:
+        digest = hashlib.sha1()
+        nix_file = nixio.File.open(filename, nixio.FileMode.ReadOnly)
+        try:
+            for b in nix_file.blocks:
+                digest.update(f"{b.name}/{b.id}".encode())
+                if b.metadata is not None:
+                    digest.update(metadata_to_json(nix_metadata_to_dict(b.metadata)).encode())
+        finally:
+            nix_file.close()
+        fingerprint["hash"] = digest.hexdigest()
+    return fingerprint
+
+
+def _changed(filename, previous):
+    """Returns the current fingerprint of the file if it differs from the previous one, None otherwise. The content hash is only calculated if size or modification time differ.
+    """
+    current = dataset_fingerprint(filename, content_hash=False)
+    if previous is not None and current["size"] == previous["size"] and current["mtime"] == previous["mtime"]:
+        return None
+    current = dataset_fingerprint(filename)
+    if previous is not None and current["size"] == previous["size"] and current["hash"] == previous["hash"]:
+        return None
+    return current
+
+
+def _scan_dataset(filename, include_repros):
+    """Scans a nix file and returns its DataLink columns, runs in the worker processes of update_catalog.
+    """
+    from ..dataset import Dataset
+    dataset = Dataset(filename)
+    try:
+        return dataset._data_link_columns(include_repros)
+    finally:
+        dataset.close()
+
+
+def read_fingerprints(path) -> dict:
+    """Reads the fingerprints of the datasets in a catalog that has been written by update_catalog.
+
+    Parameters
+    ----------
+    path : str
+        The catalog folder.
+
+    Returns
+    -------
+    dict
+        The file name (relative to the data folder) as key and the fingerprint, extended by the dataset_name, as value. Empty if there are no fingerprints.
+    """
+    filename = os.path.join(path, fingerprint_file)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)
+
+
+def update_catalog(data_location, path, format="parquet", include_repros=True, workers=1, pattern="*.nix",
+                   remove_missing=False) -> list:
+    """Incrementally builds a catalog of all datasets in a data folder. The fingerprint of each file (size, modification time, and a hash of the block metadata, see dataset_fingerprint) is stored in the catalog. Only new files and files whose fingerprint changed are scanned, their partitions are added or replaced. Files that only have been touched (same size and block metadata) are not scanned again.
+
+    .. code-block:: python
+
+        updated = rlx.update_catalog("data", "catalog", workers=4)
+        df = rlx.load_catalog("catalog", dataset_name=updated)
+
+    Parameters
+    ----------
+    data_location : str
+        The data folder.
+    path : str
+        The catalog folder.
+    format : str, optional
+        The file format, either "parquet" or "arrow", by default "parquet". Must be the same for all updates of a catalog.
+    include_repros : bool, optional
+        Whether or not to include the ReProRuns, by default True
+    workers : int, optional
+        The number of processes that scan the files in parallel, by default 1
+    pattern : str, optional
+        Glob pattern of the nix files, relative to the data folder, by default "*.nix"
+    remove_missing : bool, optional
+        Whether or not the partitions of datasets whose files no longer exist are removed, by default False
+
+    Returns
+    -------
+    list of str
+        The names of the datasets that have been added or updated.
+
+    Raises
+    ------
+    ValueError
+        If the format is not supported.
+    """
+    _pyarrow()
+    _file_format(format)
+    os.makedirs(path, exist_ok=True)
+    fingerprints = read_fingerprints(path)
+    files = sorted([os.path.relpath(f, data_location) for f in glob.glob(os.path.join(data_location, pattern))])
+    changed = {}
+    for f in files:
+        fingerprint = _changed(os.path.join(data_location, f), fingerprints.get(f))
+        if fingerprint is not None:
+            changed[f] = fingerprint
+        elif f in fingerprints:
+            fingerprints[f]["mtime"] = os.path.getmtime(os.path.join(data_location, f))
+    logging.info(f"update_catalog: {len(changed)} of {len(files)} files in {data_location} are new or modified.")
+
+    updated = []
+
+    def store(f, columns):
+        previous = fingerprints.get(f, {}).get("dataset_name")
+        if previous is not None:  # segments that no longer exist must not remain in the catalog
+            shutil.rmtree(_partition_folder(path, previous), ignore_errors=True)
+        if len(columns["dataset_name"]) > 0:
+            export_catalog(columns, path, format=format)
+            changed[f]["dataset_name"] = columns["dataset_name"][0]
+            updated.append(columns["dataset_name"][0])
+        else:
+            changed[f]["dataset_name"] = None
+        fingerprints[f] = changed[f]
+        _write_fingerprints(path, fingerprints)
+
+    names = list(changed.keys())
+    if workers > 1 and len(names) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(_scan_dataset, os.path.join(data_location, f), include_repros) for f in names]
+            for f, future in zip(names, futures):
+                store(f, future.result())
+    else:
+        for f in names:
+            store(f, _scan_dataset(os.path.join(data_location, f), include_repros))
+
+    if remove_missing:
+        for f in [f for f in fingerprints if f not in files]:
+            dataset_name = fingerprints.pop(f).get("dataset_name")
+            if dataset_name is not None and dataset_name not in updated:
+                logging.info(f"update_catalog: removing dataset {dataset_name}, file {f} does not exist anymore.")
+                shutil.rmtree(_partition_folder(path, dataset_name), ignore_errors=True)
+    _write_fingerprints(path, fingerprints)
+    return updated
+
+
+def _partition_folder(path, dataset_name):
+    return os.path.join(path, "dataset_name=" + urllib.parse.quote(dataset_name, safe=""))
+
+
+def _write_fingerprints(path, fingerprints):
+    filename = os.path.join(path, fingerprint_file)
+    with open(filename + ".tmp", "w") as f:
+        json.dump(fingerprints, f, indent=1)
+    os.replace(filename + ".tmp", filename)
@@ -88,6 +88,26 @@ class Config(metaclass=Singleton):
             return cfg
         return self._get_trace_config(self._default_config, plugin, signal)
 
+    def configured_signals(self, plugin):
+        """Names of the signals for which trace names are configured for a plugin set, either in the local or the default configuration.
+
+        Parameters
+        ----------
+        plugin : str
+            The name of the plugin set, e.g. "efish".
+
+        Returns
+        -------
+        list of str
+            The signal names, empty if the plugin set is not configured.
+        """
+        signals = []
+        for config_dict in [self._local_config, self._default_config]:
+            cfg = self._get_trace_config(config_dict, plugin)
+            if cfg is not None:
+                signals.extend([s for s in cfg.keys() if s not in signals])
+        return signals
+
     def _get_log_level(self, configuration):
         if self.log_level_name in configuration:
             return configuration[self.log_level_name]
@@ -1,13 +1,22 @@
 import os
+import copy
+import json
 import nixio
+import multiprocessing
 import logging
 import numpy as np
 import pandas as pd
 from enum import Enum
 from typing import Optional, Tuple
+from collections import deque, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 
-from .util import convert_path
+from .util import convert_path, metadata_to_json, apply_metadata_delta
 from .mappings import DataType, type_map
+from .file_pool import FileHandlePool
+from .segment_store import SegmentStore
+from . import indexing
 
 from IPython import embed
 class SegmentType(Enum):
@@ -22,10 +31,12 @@ class DataLink(object):
     """Instances of this class contain all information needed to uniquely identify a data segment and read it from a NIX file.
     """
     _cols = ["dataset_name", "block_id", "tag_id", "segment_type", "start_time", "stop_time", "index", "max_before", "max_after", "mapping_version", "metadata"]
+    __slots__ = ["_dataset_name", "_block_id", "_tag_id", "_segment_type", "_start_time", "_stop_time", "_index",
+                 "_max_before", "_max_after", "_metadata", "_metadata_base", "_metadata_delta", "_mapping_version"]
 
-    
     def __init__(self, dataset_name : str, block_id : str, tag_id : str, segment_type : SegmentType,
-                 start_time : float, stop_time : float, index=None, max_before= 0.0, max_after=0.0, metadata=None, mapping_version=1.1) -> None:
+                 start_time : float, stop_time : float, index=None, max_before= 0.0, max_after=0.0, metadata=None, mapping_version=1.1,
+                 metadata_base=None, metadata_delta=None) -> None:
         """DataLink object that uniquely identifies a segment of the data in a relacs recorded nix file.
 
         Parameters
@@ -52,6 +63,10 @@ class DataLink(object):
             The metadata belonging to the data segment. e.g. in JSON
         mapping_version: float
             The mapping version from relacs to nix files.
+        metadata_base : dict or str, optional
+            Alternative to metadata, the metadata dictionary (or its JSON representation) that is shared by several segments, e.g. all stimuli of a MultiTag. It is not copied and must not be modified. By default None
+        metadata_delta : list or str, optional
+            The segment specific part of the metadata (or its JSON representation) that is applied to the metadata_base, list of (path, value) pairs (see rlxnix.utils.util.apply_metadata_delta). By default None
         
         Raises
         ------
@@ -72,6 +87,8 @@ class DataLink(object):
         self._max_before = max_before
         self._max_after = max_after
         self._metadata = metadata
+        self._metadata_base = metadata_base
+        self._metadata_delta = metadata_delta
         self._mapping_version = mapping_version
 
     @property
@@ -115,9 +132,45 @@ class DataLink(object):
         return self._max_after
 
     @property
-    def metadata(self)->dict:
+    def metadata(self)->str:
+        """The metadata of the segment in JSON. If the DataLink was created from shared base metadata and a segment specific delta, they are merged and serialized on first access.
+        """
+        if self._metadata is None and self._metadata_base is not None:
+            self._metadata = metadata_to_json(self.metadata_dict())
         return self._metadata
 
+    def metadata_dict(self)->dict:
+        """The metadata of the segment as dictionary.
+
+        Returns
+        -------
+        dict
+            The metadata, None if there are no metadata. A new dictionary is returned on each call.
+        """
+        if self._metadata_base is None:
+            return json.loads(self._metadata) if self._metadata is not None else None
+        base = self._metadata_base
+        base = json.loads(base) if isinstance(base, str) else base
+        if isinstance(base, Mapping) and not isinstance(base, dict):
+            base = base.to_dict()
+        delta = self._metadata_delta
+        delta = json.loads(delta) if isinstance(delta, str) else delta
+        if delta is None or len(delta) == 0:
+            return copy.deepcopy(base)  # the base is shared by all DataLinks of a run
+        return apply_metadata_delta(copy.deepcopy(base), delta)
+
+    @property
+    def metadata_base(self):
+        """The shared base metadata, None if the DataLink has been created with the full metadata.
+        """
+        return self._metadata_base
+
+    @property
+    def metadata_delta(self):
+        """The segment specific metadata that is applied to the metadata_base.
+        """
+        return self._metadata_delta
+
     @property
     def mapping_version(self):
         return self._mapping_version
@@ -158,10 +211,53 @@ class DataLink(object):
                 logging.error(f"DataLink.from_pandas: required column {c} not in data frame!")
                 raise ValueError(f"DataLink.from_pandas: required column {c} not in data frame!")
             specs[c] = row[c].values[0]
+        if "metadata_base" in data_frame.columns:
+            specs = DataLink._merge_deduplicated(specs, row["metadata_base"].values[0])
         link = DataLink(**specs)
 
         return link
 
+    @staticmethod
+    def from_data_frame(data_frame : pd.DataFrame) -> list:
+        """Creates DataLink objects for all rows of a data_frame. The columns are checked once and then walked in a single pass.
+
+        Parameters
+        ----------
+        data_frame : pandas.DataFrame
+            The data frame, e.g. the one created by exporting the contents of a rlxnix.Dataset (to_pandas).
+
+        Returns
+        -------
+        list of DataLink
+            The DataLinks in the order of the rows.
+
+        Raises
+        ------
+        ValueError
+            If a required column is missing.
+        """
+        cols = DataLink.columns()
+        for c in cols:
+            if c not in data_frame.columns:
+                logging.error(f"DataLink.from_data_frame: required column {c} not in data frame!")
+                raise ValueError(f"DataLink.from_data_frame: required column {c} not in data frame!")
+        columns = [data_frame[c].to_numpy() for c in cols]
+        if "metadata_base" in data_frame.columns:
+            bases = data_frame["metadata_base"].to_numpy()
+            return [DataLink(**DataLink._merge_deduplicated(dict(zip(cols, values)), base))
+                    for values, base in zip(zip(*columns), bases)]
+        return [DataLink(**dict(zip(cols, values))) for values in zip(*columns)]
+
+    @staticmethod
+    def _merge_deduplicated(specs, metadata_base):
+        """In a data frame with deduplicated metadata (see Dataset.to_pandas), the metadata column contains the delta to the metadata_base, if the latter is given.
+        """
+        if isinstance(metadata_base, str):
+            specs["metadata_delta"] = specs["metadata"]
+            specs["metadata_base"] = metadata_base
+            specs["metadata"] = None
+        return specs
+
     def __repr__(self) -> str:
         repr = "DataLink for {type}, {id} of dataset {name} from {start:.4f}s to {stop:.4f}s at {self_id}"
         return repr.format(type=str(self.segment_type), id=self.tag_id, name=self.dataset_name,
@@ -187,16 +283,15 @@ def from_pandas(data_frame: pd.DataFrame, index: Optional[int] = None, segment_t
     """
     if index is None:
         if segment_type is not None:
-            df = data_frame[data_frame.segment_type == str(segment_type)]
-            return [DataLink.from_pandas(df, index) for index in df.index]
+            return DataLink.from_data_frame(data_frame[data_frame.segment_type == str(segment_type)])
         else:
-            return [DataLink.from_pandas(data_frame, index) for index in data_frame.index]
+            return DataLink.from_data_frame(data_frame)
     else:
         return DataLink.from_pandas(data_frame, index)
 
 
 def load_data_segment(data_link : DataLink, trace_name : str, before=0.0, after=0.0,
-                      data_location=".")->Tuple[np.ndarray, Optional[np.ndarray]]:
+                      data_location=".", store_location=None)->Tuple[np.ndarray, Optional[np.ndarray]]:
     """Loads the data specified from the DataLink (link to a stimulus or repro run segment) and the trace name. Optionally one can ask to return more data by specifying a before and/or after time. If these are invalid (because there was no data recorded before or after the respective segment) they will be reset to zero or the maximal possible values. 
 
     The DataLink object contains only the name of the dataset not its location of the hard drive. The data location must be specified, if the dataset is not located in the present directory.
@@ -213,6 +308,8 @@ def load_data_segment(data_link : DataLink, trace_name : str, before=0.0, after=
         If possible, also read the data after segment stop, by default 0.0
     data_location : str, optional
         The folder where to find the dataset, by default ".", i.e. the present working directory
+    store_location : str, optional
+        The folder where to find the segment store of the dataset (see Dataset.export_segments), by default None, i.e. the data_location. Stimulus segments are read from the store if it exists and contains the requested data, otherwise from the nix file.
 
     Returns
     -------
@@ -221,70 +318,288 @@ def load_data_segment(data_link : DataLink, trace_name : str, before=0.0, after=
     np.ndarray or None
         The respective time axis if the data trace is continuous data trace, None, otherwise.
     """
-    converted_path = convert_path(data_link.dataset_name)
-    filename  = converted_path.split(os.sep)[-1]
-    converted_path = os.sep.join((data_location, filename))
-
+    pool = FileHandlePool()
+    store_path = SegmentStore.store_filename(data_link.dataset_name, store_location if store_location else data_location)
+    if os.path.exists(store_path):
+        with pool.file_lock(store_path):
+            store = pool.segment_store(store_path)
+            segment = store.read(data_link, trace_name, before, after) if store is not None else None
+        if segment is not None:
+            return segment
+
+    converted_path = _dataset_path(data_link.dataset_name, data_location)
     if not os.path.exists(converted_path):
-        logging.error(f"Nix file {filename} could not be read from path {converted_path}!")
+        logging.error(f"Nix file {os.path.basename(converted_path)} could not be read from path {converted_path}!")
         return None, None
 
-    nf = nixio.File.open(converted_path, nixio.FileMode.ReadOnly)
-    if data_link.block_id not in nf.blocks:
-        logging.error(f"Block with id {data_link.block_id} is not found in {filename}!")
+    if SegmentType[data_link.segment_type] not in [SegmentType.ReproRun, SegmentType.StimulusSegment]:
+        logging.error(f"load_data_segment: Segment type ({data_link.segment_type}) is invalid! Allowed values are {SegmentType.StimulusSegment} or {SegmentType.ReproRun}!")
         return None, None
-    block = nf.blocks[data_link.block_id]
+    multi_tag = SegmentType[data_link.segment_type] is SegmentType.StimulusSegment
 
-    tag = None
-    if SegmentType[data_link.segment_type] is SegmentType.ReproRun:
-        if data_link.tag_id not in block.tags:
-            logging.error(f"Tag with id {data_link.tag_id} is not found in {block}!")
-            return None, None
-        tag = block.tags[data_link.tag_id]
-    elif SegmentType[data_link.segment_type] is SegmentType.StimulusSegment:
-        if data_link.tag_id not in block.multi_tags:
-            logging.error(f"MultiTag with id {data_link.tag_id} is not found in {block}!")
+    with pool.file_lock(converted_path):
+        tag = pool.tag(converted_path, data_link.block_id, data_link.tag_id, multi_tag=multi_tag)
+        if tag is None:
             return None, None
-        tag = block.multi_tags[data_link.tag_id]
-    else:
-        logging.error(f"load_data_segment: Segment type ({data_link.segment_type}) is invalid! Allowed values are {SegmentType.StimulusSegment} or {SegmentType.ReproRun}!")
-        return None, None
+        return _read_segment(tag, data_link, trace_name, before, after)
 
+
+def _dataset_path(dataset_name, data_location):
+    converted_path = convert_path(dataset_name)
+    filename  = converted_path.split(os.sep)[-1]
+    return os.sep.join((data_location, filename))
+
+
+def _trace_array(tag, trace_name, mapping_version):
+    """Returns the referenced data array and whether it contains continuous data, None, None if the tag does not refer to a valid trace.
+    """
     if trace_name not in tag.references:
         logging.error(f"The given tag does not refer to a trace {trace_name}! Or a trace with that name does not exist (traces are: {tag.references})!")
         return None, None
     data_array = tag.references[trace_name]
     t = data_array.type
 
-    event_type = type_map[data_link.mapping_version][DataType.Event]
-    continuous_type = type_map[data_link.mapping_version][DataType.Continuous]
+    event_type = type_map[mapping_version][DataType.Event]
+    continuous_type = type_map[mapping_version][DataType.Continuous]
     if (event_type not in t) and (continuous_type not in t):
         logging.error(f"Can only process event ({event_type}) or continuous ({continuous_type}) data! Found type: {data_array.type}!")
         return None, None
-    trace_type = event_type if event_type in t else continuous_type
+    return data_array, event_type not in t
 
+
+def _segment_interval(data_link, before, after, log=True):
+    """The start and stop time of the data that is read, before and after are limited to the maximum valid times.
+    """
     start_time = data_link.start_time
     if before > data_link.max_before:
-        logging.warning(f"The given before time {before} exceeds the maximum valid before time {data_link.max_before}. Set to maximum valid time!")
+        if log:
+            logging.warning(f"The given before time {before} exceeds the maximum valid before time {data_link.max_before}. Set to maximum valid time!")
         start_time -= data_link.max_before
     else:
         start_time -= before
     
     stop_time = data_link.stop_time
     if after > data_link.max_after:
-        logging.warning(f"The given after time {before} exceeds the maximum valid after time {data_link.max_after}. Set to maximum valid time!")
+        if log:
+            logging.warning(f"The given after time {before} exceeds the maximum valid after time {data_link.max_after}. Set to maximum valid time!")
         stop_time += data_link.max_after
     else:
         stop_time += after
+    return start_time, stop_time
+
+
+def _read_segment(tag, data_link, trace_name, before, after):
+    data_array, continuous = _trace_array(tag, trace_name, data_link.mapping_version)
+    if data_array is None:
+        return None, None
+    start_time, stop_time = _segment_interval(data_link, before, after)
     extent = stop_time - start_time
     logging.info(f"Reading data from data array {data_array} in the interval {start_time}, {stop_time}.")
     data = data_array.get_slice([start_time], [extent], nixio.DataSliceMode.Data)[:]
     time = None
-    if trace_type == continuous_type:
+    if continuous:
         time = np.array(data_array.dimensions[0].axis(len(data)))
         time -= before
     else:
         data -=  data_link.start_time
-    
-    nf.close()  # all done, close the file
-    return data, time
\ No newline at end of file
+    return data, time
+
+
+_SegmentRequest = namedtuple("_SegmentRequest", ["block_id", "tag_id", "segment_type", "start_time", "stop_time",
+                                                 "max_before", "max_after", "mapping_version"])
+_MAX_BLOCK_SAMPLES = 2**22
+
+
+def _segment_requests(data_links, data_location):
+    """Converts DataFrame rows or DataLinks to a list of file path and _SegmentRequest tuples.
+    """
+    if isinstance(data_links, pd.DataFrame):
+        for c in ["dataset_name"] + list(_SegmentRequest._fields):
+            if c not in data_links.columns:
+                logging.error(f"load_data_segments: required column {c} not in data frame!")
+                raise ValueError(f"load_data_segments: required column {c} not in data frame!")
+        paths = [_dataset_path(n, data_location) for n in data_links["dataset_name"].to_numpy()]
+        columns = [data_links[c].to_numpy() for c in _SegmentRequest._fields]
+        return list(zip(paths, [_SegmentRequest(*values) for values in zip(*columns)]))
+    return [(_dataset_path(dl.dataset_name, data_location), _SegmentRequest(*[getattr(dl, c) for c in _SegmentRequest._fields]))
+            for dl in data_links]
+
+
+def _merged_blocks(starts, stops, rows, gap):
+    """Groups the index ranges of the given rows into blocks that are read at once. Ranges are merged if they are less than gap samples apart.
+    """
+    order = rows[np.argsort(starts[rows], kind="stable")]
+    blocks = []
+    for i in order:
+        if len(blocks) > 0 and starts[i] <= blocks[-1][1] + gap and max(stops[i], blocks[-1][1]) - blocks[-1][0] <= _MAX_BLOCK_SAMPLES:
+            blocks[-1][1] = max(stops[i], blocks[-1][1])
+            blocks[-1][2].append(i)
+        else:
+            blocks.append([starts[i], stops[i], [i]])
+    return blocks
+
+
+def _read_slices(data_array, continuous, link_starts, intervals, before, merge_gap):
+    """Reads the data of several intervals from a 1-D data array. The index ranges are determined exactly as nixio.DataArray.get_slice does, nearby ranges are merged into a single read.
+    """
+    count = len(intervals)
+    data = [np.array([])] * count
+    positions = np.array([start for start, _ in intervals], dtype=float)
+    extents = np.array([stop - start for start, stop in intervals], dtype=float)
+    dimension = data_array.dimensions[0] if len(data_array.dimensions) > 0 else None
+    dimension_type = dimension.dimension_type if dimension is not None else None
+    if len(data_array.shape) != 1 or dimension_type not in [nixio.DimensionType.Sample, nixio.DimensionType.Range]:
+        for i in range(count):
+            data[i] = data_array.get_slice([positions[i]], [extents[i]], nixio.DataSliceMode.Data)[:]
+    elif dimension_type == nixio.DimensionType.Sample:
+        interval = dimension.sampling_interval
+        starts, stops, valid, errors = indexing.sampled_slices(positions, extents, dimension.offset, interval, data_array.shape[0])
+        for i in np.nonzero(errors)[0]:  # nixio raises an IndexError
+            data_array.get_slice([positions[i]], [extents[i]], nixio.DataSliceMode.Data)
+        for lo, hi, rows in _merged_blocks(starts, stops, np.nonzero(valid)[0], int(merge_gap / interval)):
+            logging.info(f"Reading data from data array {data_array} in the index range {lo}, {hi} for {len(rows)} segments.")
+            block = data_array[lo:hi]
+            for i in rows:
+                data[i] = block[starts[i] - lo:stops[i] - lo].copy()
+    else:
+        ticks = data_array[:]
+        starts, stops, valid = indexing.range_slices(positions, extents, ticks)
+        for i in np.nonzero(valid)[0]:
+            data[i] = ticks[starts[i]:stops[i]].copy()
+
+    results = []
+    for i in range(count):
+        time = None
+        if continuous:
+            offset = dimension.offset if dimension.offset else 0.0
+            time = np.arange(len(data[i])) * dimension.sampling_interval + offset
+            time -= before
+        else:
+            data[i] -= link_starts[i]
+        results.append((data[i], time))
+    return results
+
+
+def _load_file_segments(path, requests, trace_name, before, after, merge_gap):
+    """Loads the data segments of the requests, which all refer to the same file. Returns the data and time tuples in the order of the requests.
+    """
+    results = [(None, None)] * len(requests)
+    if not os.path.exists(path):
+        logging.error(f"Nix file {os.path.basename(path)} could not be read from path {path}!")
+        return results
+    pool = FileHandlePool()
+    with pool.file_lock(path):
+        arrays = {}
+        groups = {}
+        for i, r in enumerate(requests):
+            segment_type = SegmentType[r.segment_type]
+            if segment_type not in [SegmentType.ReproRun, SegmentType.StimulusSegment]:
+                logging.error(f"load_data_segments: Segment type ({r.segment_type}) is invalid! Allowed values are {SegmentType.StimulusSegment} or {SegmentType.ReproRun}!")
+                continue
+            key = (r.block_id, r.tag_id, segment_type, r.mapping_version)
+            if key not in arrays:
+                tag = pool.tag(path, r.block_id, r.tag_id, multi_tag=segment_type is SegmentType.StimulusSegment)
+                arrays[key] = _trace_array(tag, trace_name, r.mapping_version) if tag is not None else (None, None)
+            data_array, continuous = arrays[key]
+            if data_array is None:
+                continue
+            group = groups.setdefault((data_array.id, continuous), (data_array, continuous, []))
+            group[2].append(i)
+        for data_array, continuous, rows in groups.values():
+            intervals = [_segment_interval(requests[i], before, after) for i in rows]
+            segments = _read_slices(data_array, continuous, [requests[i].start_time for i in rows], intervals, before, merge_gap)
+            for i, segment in zip(rows, segments):
+                results[i] = segment
+    return results
+
+
+def load_data_segments(data_links, trace_name : str, before=0.0, after=0.0, data_location=".", workers=1,
+                       chunk_size=256, merge_gap=1.0):
+    """Loads the data of many segments, e.g. all rows of the DataFrame returned by Dataset.to_pandas. The result is the same as calling load_data_segment for each segment but the segments are grouped by file, the index ranges are determined at once, and nearby reads from the same trace are merged into a single read.
+
+    The segments are processed in chunks, the results are yielded in input order. With workers > 1, the files of a chunk are read in a pool of processes and the next chunks are loaded while the results of the current one are consumed.
+
+    .. code-block:: python
+
+        df = dataset.to_pandas()
+        stimuli = df[df.segment_type == "StimulusSegment"]
+        for (data, time) in rlx.load_data_segments(stimuli, "V-1", before=0.1, after=0.1, workers=4):
+            ...
+
+    Parameters
+    ----------
+    data_links : pandas.DataFrame or list of DataLink
+        The segments, a DataFrame must contain the DataLink columns.
+    trace_name : str
+        The name of the recorded signal that should be read.
+    before : float, optional
+        If possible, read data from before segment start, by default 0.0
+    after : float, optional
+        If possible, also read the data after segment stop, by default 0.0
+    data_location : str, optional
+        The folder where to find the datasets, by default ".", i.e. the present working directory
+    workers : int, optional
+        The number of worker processes, by default 1, i.e. the data is read in the calling process.
+    chunk_size : int, optional
+        The number of segments that are loaded at once, by default 256. Controls the memory consumption.
+    merge_gap : float, optional
+        Segments that are less than merge_gap seconds apart are read at once, by default 1.0
+
+    Yields
+    ------
+    np.ndarray
+        The data read from the trace (trace_name), None if the segment could not be read.
+    np.ndarray or None
+        The respective time axis if the data trace is continuous data trace, None, otherwise.
+
+    Raises
+    ------
+    ValueError
+        If the DataFrame lacks a required column.
+    """
+    requests = _segment_requests(data_links, data_location)
+    executor = None
+    if workers > 1:
+        # h5py file handles must not be shared with forked processes
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(chunk_start):
+        chunk = requests[chunk_start:chunk_start + chunk_size]
+        by_file = {}
+        for i, (path, request) in enumerate(chunk):
+            by_file.setdefault(path, ([], []))
+            by_file[path][0].append(i)
+            by_file[path][1].append(request)
+        tasks = []
+        for path, (rows, file_requests) in by_file.items():
+            args = (path, file_requests, trace_name, before, after, merge_gap)
+            tasks.append((rows, executor.submit(_load_file_segments, *args) if executor is not None else _load_file_segments(*args)))
+        return len(chunk), tasks
+
+    pending = deque()
+    try:
+        chunk_starts = iter(range(0, len(requests), chunk_size))
+        ahead = workers if executor is not None else 0
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) <= ahead:
+                chunk_start = next(chunk_starts, None)
+                if chunk_start is None:
+                    exhausted = True
+                else:
+                    pending.append(submit(chunk_start))
+            if len(pending) == 0:
+                break
+            count, tasks = pending.popleft()
+            results = [None] * count
+            for rows, task in tasks:
+                for i, segment in zip(rows, task.result() if executor is not None else task):
+                    results[i] = segment
+            for segment in results:
+                yield segment
+    finally:
+        if executor is not None:
+            for _, tasks in pending:  # Executor.shutdown(cancel_futures=True) requires python 3.9
+                for _, task in tasks:
+                    task.cancel()
+            executor.shutdown(wait=True)
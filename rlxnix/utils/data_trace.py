@@ -1,6 +1,7 @@
 import logging
 
 from .mappings import DataType, type_map
+from .config import Config
 
 
 class DataTrace(object):
@@ -131,3 +132,48 @@ class TraceList(list):
             raise ValueError("TraceList can only accommodate DataTrace objects!")
         super().append(trace)
 
+
+
+class TraceMap(dict):
+    """Dictionary of the DataTraces of a dataset with the trace names as keys. Additionally, it keeps the mapping of the signals of a plugin set (e.g. the "spikes" of the "efish" plugins) to the trace names. The mapping is created once per plugin set and shared by all ReproRuns of the dataset.
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._signal_maps = {}
+
+    def __setitem__(self, key, value) -> None:
+        if not isinstance(value, DataTrace):
+            raise ValueError("TraceMap can only accommodate DataTrace objects!")
+        self._signal_maps.clear()
+        super().__setitem__(key, value)
+
+    def signal_trace_map(self, pluginset, signals=None) -> dict:
+        """Maps the signals of a plugin set to the names of the traces. The trace names that are expected for each signal are read from the configuration. If more than one trace matches, the last one is used.
+
+        Parameters
+        ----------
+        pluginset : str
+            The name of the plugin set, e.g. "efish".
+        signals : list of str, optional
+            The signals, by default None, i.e. all signals configured for the plugin set.
+
+        Returns
+        -------
+        dict
+            The signal names as keys and the trace names as values. The dictionary is shared, do not modify it.
+        """
+        key = (pluginset, tuple(signals) if signals is not None else None)
+        if key not in self._signal_maps:
+            config = Config()
+            if signals is None:
+                signals = config.configured_signals(pluginset)
+            mapping = {}
+            for s in signals:
+                signal_traces = config.trace_configuration(pluginset, s)
+                if signal_traces is not None:
+                    for t in self.keys():
+                        if t in signal_traces:
+                            mapping[s] = t
+            logging.debug(f"TraceMap: created signal to trace map for plugin set {pluginset}: {mapping}")
+            self._signal_maps[key] = mapping
+        return self._signal_maps[key]
@@ -0,0 +1,288 @@
+import os
+import json
+import bisect
+import logging
+import numpy as np
+import pandas as pd
+
+from . import indexing
+
+
+class EventTrains(object):
+    """Ragged collection of the event times (e.g. spike times) of many data segments in compressed sparse row layout. The times of all segments are stored in a single values array, the events of segment i are ``values[offsets[i]:offsets[i + 1]]``. A table (pandas.DataFrame) holds one row of properties per segment.
+
+    Indexing returns views into the values array, no data is copied. Use ``Dataset.export_event_trains`` to create and ``rlxnix.load_event_trains`` to read them.
+
+    .. code-block:: python
+
+        trains = rlx.load_event_trains("spikes")
+        beats = trains.table[trains.table.repro_name.str.startswith("Beats")].index
+        rates = [len(trains[i]) / trains.table.duration[i] for i in beats]
+    """
+    values_file = "values.npy"
+    offsets_file = "offsets.npy"
+    table_file = "stimuli.csv"
+    info_file = "info.json"
+
+    def __init__(self, values, offsets, table, info=None) -> None:
+        """Create the event trains.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            The event times of all segments, concatenated.
+        offsets : np.ndarray
+            The start indices of the segments in values plus the total number of values, i.e. one more entry than segments.
+        table : pandas.DataFrame
+            The segment properties, one row per segment.
+        info : dict, optional
+            Additional information, e.g. the trace name, by default None
+
+        Raises
+        ------
+        ValueError
+            If offsets, values and table do not match.
+        """
+        super().__init__()
+        if len(offsets) != len(table) + 1 or offsets[0] != 0 or offsets[-1] != len(values):
+            logging.error(f"EventTrains: offsets (length {len(offsets)}) do not match the {len(table)} table rows and {len(values)} values!")
+            raise ValueError(f"EventTrains: offsets (length {len(offsets)}) do not match the {len(table)} table rows and {len(values)} values!")
+        self._values = values
+        self._offsets = offsets
+        self._table = table
+        self._info = info if info is not None else {}
+
+    @property
+    def values(self) -> np.ndarray:
+        """The event times of all segments.
+
+        Returns
+        -------
+        np.ndarray
+            The concatenated event times.
+        """
+        return self._values
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """The start indices of the segments in values, the last entry is the number of values.
+
+        Returns
+        -------
+        np.ndarray
+            The offsets.
+        """
+        return self._offsets
+
+    @property
+    def counts(self) -> np.ndarray:
+        """The number of events of each segment.
+
+        Returns
+        -------
+        np.ndarray
+            The event counts.
+        """
+        return np.diff(self._offsets)
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """The segment properties.
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per segment.
+        """
+        return self._table
+
+    @property
+    def info(self) -> dict:
+        """Additional information, e.g. trace_name, before, and after for exported stimulus segments.
+
+        Returns
+        -------
+        dict
+            The information.
+        """
+        return self._info
+
+    def save(self, path):
+        """Saves the event trains to a folder (values.npy, offsets.npy, stimuli.csv, and info.json). Existing files are replaced.
+
+        Parameters
+        ----------
+        path : str
+            The folder.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, self.values_file), self._values)
+        np.save(os.path.join(path, self.offsets_file), self._offsets)
+        self._table.to_csv(os.path.join(path, self.table_file), index=False)
+        with open(os.path.join(path, self.info_file), "w") as f:
+            json.dump(self._info, f)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Loads event trains from a folder.
+
+        Parameters
+        ----------
+        path : str
+            The folder.
+        mmap : bool, optional
+            If True, the values and offsets are memory-mapped read-only and only the accessed segments are read from disk, by default True
+
+        Returns
+        -------
+        EventTrains
+            The event trains.
+        """
+        mmap_mode = "r" if mmap else None
+        values = np.load(os.path.join(path, EventTrains.values_file), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(path, EventTrains.offsets_file), mmap_mode=mmap_mode)
+        table = pd.read_csv(os.path.join(path, EventTrains.table_file))
+        info = {}
+        if os.path.exists(os.path.join(path, EventTrains.info_file)):
+            with open(os.path.join(path, EventTrains.info_file)) as f:
+                info = json.load(f)
+        return EventTrains(values, offsets, table, info)
+
+    def __getitem__(self, index) -> np.ndarray:
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(f"EventTrains: index {index} out of range for {len(self)} segments!")
+        return self._values[self._offsets[index]:self._offsets[index + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __repr__(self) -> str:
+        return f"EventTrains with {len(self)} segments and {len(self._values)} events at {hex(id(self))}"
+
+
+def load_event_trains(path, mmap=True) -> EventTrains:
+    """Loads event trains that have been exported with ``Dataset.export_event_trains``.
+
+    Parameters
+    ----------
+    path : str
+        The folder.
+    mmap : bool, optional
+        If True, the values and offsets are memory-mapped, by default True
+
+    Returns
+    -------
+    EventTrains
+        The event trains.
+    """
+    return EventTrains.load(path, mmap=mmap)
+
+
+def segment_event_trains(data_array, start_times, stop_times, max_before, max_after, before=0.0, after=0.0):
+    """Reads the events of many segments from a 1-D event data array (with a range dimension) at once. The events of each segment are the same that ``rlxnix.load_data_segment`` returns, i.e. before and after are limited to max_before and max_after and event times are relative to the segment start.
+
+    Parameters
+    ----------
+    data_array : nixio.DataArray
+        The event data array.
+    start_times : np.ndarray
+        The segment start times.
+    stop_times : np.ndarray
+        The segment stop times.
+    max_before : np.ndarray
+        The maximum time before each segment that can be read, NaN if not limited.
+    max_after : np.ndarray
+        The maximum time after each segment that can be read.
+    before : float, optional
+        Time before segment start that is read, by default 0.0
+    after : float, optional
+        Time after segment stop that is read, by default 0.0
+
+    Returns
+    -------
+    np.ndarray
+        The event times of all segments.
+    np.ndarray
+        The offsets of the segments in the values, with one more entry than segments.
+    """
+    start_times = np.asarray(start_times, dtype=float)
+    stop_times = np.asarray(stop_times, dtype=float)
+    max_before = np.asarray(max_before, dtype=float)
+    max_after = np.asarray(max_after, dtype=float)
+    positions = start_times - np.where(before > max_before, max_before, before)
+    ends = stop_times + np.where(after > max_after, max_after, after)
+    ticks = data_array[:]
+    starts, stops, valid = indexing.range_slices(positions, ends - positions, ticks)
+    indices, rows, offsets = indexing.range_indices(np.where(valid, starts, 0), np.where(valid, stops, 0))
+    values = ticks[indices] - start_times[rows]
+    return values, offsets
+
+
+def partition_events(events, window_starts, window_stops, onsets, chunk_size=None):
+    """Assigns sorted event times to many, possibly overlapping, windows in one pass. Only the part of the event array that is spanned by the windows is read (located with a binary search), at once or in chunks of chunk_size events. The events of each chunk are assigned to all windows with a binary search. Events that fall into several windows are contained in each of them.
+
+    Parameters
+    ----------
+    events : np.ndarray or nixio.DataArray
+        The sorted event times, anything that supports len() and slicing.
+    window_starts : np.ndarray
+        The window starts (inclusive).
+    window_stops : np.ndarray
+        The window ends (exclusive).
+    onsets : np.ndarray
+        The times the events of each window are aligned to, i.e. subtracted from the event times.
+    chunk_size : int, optional
+        The number of events that are read at once, by default None, i.e. all.
+
+    Returns
+    -------
+    np.ndarray
+        The aligned event times of all windows.
+    np.ndarray
+        The offsets of the windows in the values, with one more entry than windows.
+
+    Raises
+    ------
+    ValueError
+        If chunk_size is not positive.
+    """
+    if chunk_size is not None and chunk_size < 1:
+        logging.error(f"partition_events: chunk_size must be positive, got {chunk_size}!")
+        raise ValueError(f"partition_events: chunk_size must be positive, got {chunk_size}!")
+    window_starts = np.asarray(window_starts, dtype=float)
+    window_stops = np.asarray(window_stops, dtype=float)
+    onsets = np.asarray(onsets, dtype=float)
+    first, last = 0, 0
+    if len(window_starts) > 0 and len(events) > 0:
+        first = bisect.bisect_left(events, np.min(window_starts))
+        last = bisect.bisect_left(events, np.max(window_stops), lo=first)
+    chunk_size = last - first if chunk_size is None else chunk_size
+    values = []
+    windows = []
+    for chunk_start in range(first, last, max(chunk_size, 1)):
+        chunk = np.asarray(events[chunk_start:min(chunk_start + chunk_size, last)], dtype=float)
+        if len(chunk) == 0:
+            continue
+        active = np.nonzero((window_stops > chunk[0]) & (window_starts <= chunk[-1]))[0]
+        lo = np.searchsorted(chunk, window_starts[active], side="left")
+        hi = np.searchsorted(chunk, window_stops[active], side="left")
+        indices, rows, _ = indexing.range_indices(lo, hi)
+        values.append(chunk[indices] - onsets[active][rows])
+        windows.append(active[rows])
+    offsets = np.zeros(len(window_starts) + 1, dtype=np.int64)
+    if len(values) == 0:
+        return np.array([], dtype=float), offsets
+    values = np.concatenate(values)
+    windows = np.concatenate(windows)
+    if len(values) > 0 and len(windows) > 1 and np.any(np.diff(windows) < 0):
+        order = np.argsort(windows, kind="stable")  # chunks are in time order, stable sorting keeps it within windows
+        values = values[order]
+        windows = windows[order]
+    offsets[1:] = np.cumsum(np.bincount(windows, minlength=len(window_starts)))
+    return values, offsets
@@ -0,0 +1,269 @@
+import os
+import atexit
+import nixio
+import logging
+import threading
+from collections import OrderedDict
+
+from .buffers import Singleton
+
+
+class FileHandlePool(metaclass=Singleton):
+    """Process-local pool of nix files (and segment stores) that are opened read-only. Files are kept open and reused until more than max_open files are in the pool, then the least recently used one is closed. Blocks and tags that have been resolved by id are cached along with the file. If a file has been modified since it was opened, it is reopened. All files are closed at exit.
+
+    The pool is used by ``rlxnix.load_data_segment``. The pool itself is guarded by the pool's lock, reading from a file from several threads must be guarded by the lock of the respective file. A file is not closed to make room for others while its lock is held.
+
+    .. code-block:: python
+
+        pool = FileHandlePool()
+        with pool.file_lock("data/2021-11-11-aa.nix"):
+            tag = pool.tag("data/2021-11-11-aa.nix", block_id, tag_id)
+            data = tag.references["V-1"][:]
+    """
+    def __init__(self, max_open=8) -> None:
+        """Create the pool.
+
+        Parameters
+        ----------
+        max_open : int, optional
+            The maximum number of open files, by default 8
+        """
+        super().__init__()
+        self._max_open = max_open
+        self._files = OrderedDict()
+        self._blocks = {}
+        self._tags = {}
+        self._file_locks = {}
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+        atexit.register(self.close_all)
+
+    @property
+    def lock(self) -> threading.RLock:
+        """The (reentrant) lock that guards the pool and the open files.
+
+        Returns
+        -------
+        threading.RLock
+            The lock.
+        """
+        return self._lock
+
+    def file_lock(self, path) -> threading.RLock:
+        """The (reentrant) lock that guards reading from a file. Must be acquired before the pool's lock if both are needed.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        Returns
+        -------
+        threading.RLock
+            The lock of the file, the same lock is returned for the same path, even if the file has been closed in between.
+        """
+        with self._lock:
+            self._check_process()
+            return self._file_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+    @property
+    def max_open(self) -> int:
+        """The maximum number of files that are kept open.
+
+        Returns
+        -------
+        int
+            The maximum number of open files.
+        """
+        return self._max_open
+
+    @max_open.setter
+    def max_open(self, count):
+        if count < 1:
+            logging.error(f"FileHandlePool: max_open must be at least 1, got {count}!")
+            raise ValueError(f"FileHandlePool: max_open must be at least 1, got {count}!")
+        with self._lock:
+            self._max_open = count
+            self._evict()
+
+    @property
+    def open_files(self) -> list:
+        """The paths of the open files, least recently used first.
+
+        Returns
+        -------
+        list of str
+            The file paths.
+        """
+        with self._lock:
+            return list(self._files.keys())
+
+    def _evict(self, keep=None):
+        for path in list(self._files.keys()):
+            if len(self._files) <= self._max_open:
+                break
+            if path == keep:
+                continue
+            lock = self._file_locks.get(path)
+            if lock is not None and not lock.acquire(blocking=False):
+                continue  # in use by another thread
+            try:
+                logging.debug(f"FileHandlePool: closing least recently used file {path}.")
+                self._close(path)
+            finally:
+                if lock is not None:
+                    lock.release()
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            # forked process, the inherited handles and locks belong to the parent and must not be used or closed
+            self._files.clear()
+            self._blocks.clear()
+            self._tags.clear()
+            self._file_locks = {}
+            self._pid = os.getpid()
+
+    def _close(self, path):
+        nix_file, _ = self._files.pop(path)
+        self._blocks = {k: v for k, v in self._blocks.items() if k[0] != path}
+        self._tags = {k: v for k, v in self._tags.items() if k[0] != path}
+        if nix_file.is_open():
+            nix_file.close()
+
+    def file(self, path) -> nixio.File:
+        """Returns the open file, the file is opened if it is not in the pool or has been modified since it was opened.
+
+        Parameters
+        ----------
+        path : str
+            The path of the nix file.
+
+        Returns
+        -------
+        nixio.File
+            The file opened in read-only mode, None if it does not exist.
+        """
+        return self._handle(path, lambda p: nixio.File.open(p, nixio.FileMode.ReadOnly))
+
+    def segment_store(self, path):
+        """Returns the open segment store (see rlxnix.utils.segment_store.SegmentStore), it is handled like the nix files.
+
+        Parameters
+        ----------
+        path : str
+            The path of the store file.
+
+        Returns
+        -------
+        SegmentStore
+            The store opened in read-only mode, None if it does not exist.
+        """
+        from .segment_store import SegmentStore
+        return self._handle(path, SegmentStore)
+
+    def _handle(self, path, opener):
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            logging.error(f"FileHandlePool: file {path} does not exist!")
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            self._check_process()
+            if path in self._files:
+                nix_file, opened_mtime = self._files[path]
+                if opened_mtime == mtime and nix_file.is_open():
+                    self._files.move_to_end(path)
+                    return nix_file
+                logging.debug(f"FileHandlePool: file {path} has been modified, reopening.")
+                self._close(path)
+            logging.debug(f"FileHandlePool: opening file {path}.")
+            nix_file = opener(path)
+            self._files[path] = (nix_file, mtime)
+            self._evict(keep=path)
+            return nix_file
+
+    def block(self, path, block_id) -> nixio.Block:
+        """Returns the block with the given id.
+
+        Parameters
+        ----------
+        path : str
+            The path of the nix file.
+        block_id : str
+            The id of the block.
+
+        Returns
+        -------
+        nixio.Block
+            The block, None if the file or the block does not exist.
+        """
+        with self._lock:
+            nix_file = self.file(path)
+            if nix_file is None:
+                return None
+            key = (os.path.abspath(path), block_id)
+            if key not in self._blocks:
+                if block_id not in nix_file.blocks:
+                    logging.error(f"FileHandlePool: Block with id {block_id} is not found in {path}!")
+                    return None
+                self._blocks[key] = nix_file.blocks[block_id]
+            return self._blocks[key]
+
+    def tag(self, path, block_id, tag_id, multi_tag=False):
+        """Returns the Tag or MultiTag with the given id.
+
+        Parameters
+        ----------
+        path : str
+            The path of the nix file.
+        block_id : str
+            The id of the block.
+        tag_id : str
+            The id of the tag.
+        multi_tag : bool, optional
+            Whether a MultiTag or a Tag is requested, by default False
+
+        Returns
+        -------
+        nixio.Tag or nixio.MultiTag
+            The tag, None if the file, block or tag does not exist.
+        """
+        with self._lock:
+            block = self.block(path, block_id)
+            if block is None:
+                return None
+            key = (os.path.abspath(path), block_id, tag_id, multi_tag)
+            if key not in self._tags:
+                tags = block.multi_tags if multi_tag else block.tags
+                if tag_id not in tags:
+                    logging.error(f"FileHandlePool: {'MultiTag' if multi_tag else 'Tag'} with id {tag_id} is not found in {block}!")
+                    return None
+                self._tags[key] = tags[tag_id]
+            return self._tags[key]
+
+    def close(self, path):
+        """Closes a file and removes it from the pool.
+
+        Parameters
+        ----------
+        path : str
+            The path of the nix file.
+        """
+        path = os.path.abspath(path)
+        with self.file_lock(path), self._lock:
+            if path in self._files:
+                self._close(path)
+
+    def close_all(self):
+        """Closes all files in the pool.
+        """
+        if self._pid != os.getpid():
+            return
+        for path in self.open_files:
+            self.close(path)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __repr__(self) -> str:
+        return f"FileHandlePool with {len(self)} of max. {self._max_open} open files at {hex(id(self))}"
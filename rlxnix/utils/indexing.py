@@ -0,0 +1,143 @@
+import numpy as np
+
+
+def sampled_indices(positions, offset, interval, greater_or_equal=True):
+    """Vectorized version of nixio.SampledDimension.index_of in the modes GreaterOrEqual and LessOrEqual, i.e. positions that match a sample (within the tolerance of numpy.isclose) are mapped onto this sample, others onto the next (GreaterOrEqual) or previous (LessOrEqual) sample.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        The positions in data coordinates.
+    offset : float
+        The offset of the dimension, may be None.
+    interval : float
+        The sampling interval of the dimension.
+    greater_or_equal : bool, optional
+        The index mode, by default True, i.e. GreaterOrEqual
+
+    Returns
+    -------
+    np.ndarray
+        The indices. Positions left of the first sample give 0 for GreaterOrEqual and -1 for LessOrEqual (nixio raises an IndexError in that case).
+    """
+    offset = offset if offset else 0
+    scaled = (np.asarray(positions, dtype=float) - offset) / interval
+    index = np.round(scaled).astype(int)
+    exact = np.isclose(scaled, index)
+    if greater_or_equal:
+        result = np.where(exact | (index >= scaled), index, index + 1)
+        result[scaled < 0] = 0
+    else:
+        result = np.where(exact | (index < scaled), index, index - 1)
+        result[scaled < 0] = -1
+    return result
+
+
+def sampled_slices(positions, extents, offset, interval, length):
+    """The index ranges nixio.DataArray.get_slice reads from a 1-D data array with a sampled dimension in DataSliceMode.Data.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        The start positions of the slices.
+    extents : np.ndarray
+        The extents of the slices.
+    offset : float
+        The offset of the dimension, may be None.
+    interval : float
+        The sampling interval of the dimension.
+    length : int
+        The length of the data array.
+
+    Returns
+    -------
+    np.ndarray
+        The start indices.
+    np.ndarray
+        The stop indices (exclusive).
+    np.ndarray
+        Boolean mask of valid slices. Invalid slices give an empty array in nixio.
+    np.ndarray
+        Boolean mask of slices for which nixio raises an IndexError, because the slice ends left of the first sample.
+    """
+    positions = np.asarray(positions, dtype=float)
+    starts = sampled_indices(positions, offset, interval, greater_or_equal=True)
+    stops = sampled_indices(positions + np.asarray(extents, dtype=float), offset, interval, greater_or_equal=False)
+    errors = stops < 0
+    valid = ~errors & (stops >= starts) & (stops <= length)
+    return starts, stops, valid, errors
+
+
+def range_slices(positions, extents, ticks):
+    """The index ranges nixio.DataArray.get_slice reads from a 1-D data array with a range dimension (e.g. event times that use themselves as ticks) in DataSliceMode.Data.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        The start positions of the slices.
+    extents : np.ndarray
+        The extents of the slices.
+    ticks : np.ndarray
+        The ticks of the range dimension.
+
+    Returns
+    -------
+    np.ndarray
+        The start indices.
+    np.ndarray
+        The stop indices (exclusive).
+    np.ndarray
+        Boolean mask of valid slices. Invalid slices give an empty array in nixio.
+    """
+    positions = np.asarray(positions, dtype=float)
+    ends = positions + np.asarray(extents, dtype=float)
+    starts = np.zeros(len(positions), dtype=int)
+    stops = np.zeros(len(positions), dtype=int)
+    if len(ticks) == 0:
+        return starts, stops, np.zeros(len(positions), dtype=bool)
+    ticks = np.asarray(ticks)
+    valid = (positions <= ticks[-1]) & (ends >= ticks[0])
+    if np.all(ticks[1:] >= ticks[:-1]):
+        starts = np.searchsorted(ticks, positions, side="left")
+        stops = np.searchsorted(ticks, ends, side="right") - 1
+    else:  # unsorted ticks, do as nixio does
+        for i, (p, e) in enumerate(zip(positions, ends)):
+            ge = np.where(ticks >= p)[0]
+            le = np.where(ticks <= e)[0]
+            if len(ge) == 0 or len(le) == 0:
+                valid[i] = False
+                continue
+            starts[i] = ge[0]
+            stops[i] = le[-1]
+    starts[positions < ticks[0]] = 0
+    stops[ends > ticks[-1]] = len(ticks) - 1
+    valid &= stops >= starts
+    return starts, stops, valid
+
+
+def range_indices(starts, stops):
+    """The indices of many index ranges [starts[i], stops[i]) concatenated, e.g. to gather the events of many windows from one array at once. Ranges with stops[i] <= starts[i] are empty.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        The start indices of the ranges.
+    stops : np.ndarray
+        The stop indices (exclusive) of the ranges.
+
+    Returns
+    -------
+    np.ndarray
+        The indices of all ranges.
+    np.ndarray
+        The range each index belongs to.
+    np.ndarray
+        The offsets of the ranges in the indices, with one more entry than ranges.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.maximum(np.asarray(stops, dtype=np.int64) - starts, 0)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    indices = np.arange(offsets[-1]) - offsets[rows] + starts[rows]
+    return indices, rows, offsets
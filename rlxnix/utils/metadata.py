@@ -0,0 +1,172 @@
+import nixio
+import logging
+from collections.abc import Mapping
+
+from .buffers import SectionIndexBuffer
+
+
+class SectionIndex(object):
+    """Index of all metadata sections of a nix file by name and type. The section tree is traversed only once (breadth first, the same order nixio.find_sections uses), afterwards lookups are dictionary accesses. Each section is also indexed under all its ancestors, so that lookups within a section (e.g. the settings of a repro run) do not depend on the number of sections in the file.
+    """
+    def __init__(self, nix_file: nixio.File) -> None:
+        """Create the index by traversing the section tree of the file.
+
+        Parameters
+        ----------
+        nix_file : nixio.File
+            The open nix file.
+        """
+        super().__init__()
+        self._sections = {}
+        self._within = {}
+        self._by_name = {}
+        self._by_type = {}
+        fifo = [(s, (None,)) for s in nix_file.sections]  # None is the scope of the whole file
+        while len(fifo) > 0:
+            section, ancestors = fifo.pop(0)
+            section_id = section.id
+            self._sections[section_id] = section
+            scopes = ancestors + (section_id,)
+            for root_id in scopes:
+                self._within.setdefault(root_id, []).append(section_id)
+                self._by_name.setdefault((root_id, section.name), []).append(section_id)
+                self._by_type.setdefault((root_id, section.type), []).append(section_id)
+            fifo.extend([(s, scopes) for s in section.sections])
+        logging.debug(f"SectionIndex: indexed {len(self._sections)} sections.")
+
+    def find(self, name=None, type=None, within=None) -> list:
+        """Find sections by name and/or type.
+
+        Parameters
+        ----------
+        name : str, optional
+            The section name, by default None, i.e. any name
+        type : str, optional
+            The section type, by default None, i.e. any type
+        within : nixio.Section, optional
+            Restrict the search to this section and its subsections (like nixio.Section.find_sections does), by default None, i.e. the whole file.
+
+        Returns
+        -------
+        list of nixio.Section
+            The matching sections in breadth first order.
+        """
+        root_id = None if within is None else within.id
+        if name is None and type is None:
+            candidates = self._within.get(root_id, [])
+        elif name is None:
+            candidates = self._by_type.get((root_id, type), [])
+        elif type is None:
+            candidates = self._by_name.get((root_id, name), [])
+        else:
+            types = set(self._by_type.get((root_id, type), []))
+            candidates = [i for i in self._by_name.get((root_id, name), []) if i in types]
+        return [self._sections[i] for i in candidates]
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+
+def section_index(nix_file: nixio.File) -> SectionIndex:
+    """Returns the SectionIndex of the given file. The index is created on first request and then kept in the SectionIndexBuffer.
+
+    Parameters
+    ----------
+    nix_file : nixio.File
+        The open nix file.
+
+    Returns
+    -------
+    SectionIndex
+        The index of the file's sections.
+    """
+    buffer = SectionIndexBuffer()
+    if not buffer.has(nix_file.id):
+        buffer.put(nix_file.id, SectionIndex(nix_file))
+    return buffer.get(nix_file.id)
+
+
+class MetadataProxy(Mapping):
+    """Read-only, dict-like view on a nixio.Section. Entries are read from file only when they are accessed. Properties are returned as tuple of the list of values and the unit (empty string if not given), subsections as MetadataProxy, i.e. the same structure ``nix_metadata_to_dict`` creates, which is returned by to_dict().
+
+    .. code-block:: python
+
+        pause = repro_run.metadata["RePro-Info"]["settings"]["pause"][0][0]
+    """
+    def __init__(self, section: nixio.Section) -> None:
+        """Create the proxy.
+
+        Parameters
+        ----------
+        section : nixio.Section
+            The section, may be None which gives an empty proxy.
+        """
+        super().__init__()
+        self._section = section
+        self._entries = {}
+        self._keys = None
+
+    @property
+    def section(self) -> nixio.Section:
+        """The underlying nix section.
+
+        Returns
+        -------
+        nixio.Section
+            The section.
+        """
+        return self._section
+
+    def _entry(self, key):
+        if self._section is None:
+            raise KeyError(key)
+        if key in self._section.sections:
+            return MetadataProxy(self._section.sections[key])
+        if key in self._section.props:
+            p = self._section.props[key]
+            return ([v for v in p.values], p.unit if p.unit is not None else "")
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key not in self._entries:
+            self._entries[key] = self._entry(key)
+        return self._entries[key]
+
+    def __contains__(self, key) -> bool:
+        if key in self._entries:
+            return True
+        if self._section is None or not isinstance(key, str):
+            return False
+        return key in self._section.sections or key in self._section.props
+
+    def keys(self):
+        if self._keys is None:
+            self._keys = []
+            if self._section is not None:
+                self._keys = [p.name for p in self._section.props]
+                self._keys.extend([s.name for s in self._section.sections if s.name not in self._keys])
+        return self._keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def to_dict(self) -> dict:
+        """Converts the complete section tree to a dictionary.
+
+        Returns
+        -------
+        dict
+            The metadata dictionary.
+        """
+        info = {}
+        for k in self.keys():
+            value = self[k]
+            info[k] = value.to_dict() if isinstance(value, MetadataProxy) else value
+        return info
+
+    def __repr__(self) -> str:
+        name = self._section.name if self._section is not None else None
+        return f"MetadataProxy of section {name} at {hex(id(self))}"
@@ -0,0 +1,317 @@
+import logging
+import numpy as np
+
+from .metadata import section_index
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _equals(a, b) -> bool:
+    """Equality of two entries that is False if the comparison does not give a single truth value (e.g. for sequences).
+    """
+    try:
+        result = a == b
+    except (TypeError, ValueError):
+        return False
+    return bool(result) if isinstance(result, (bool, np.bool_)) else False
+
+
+def _matches(column, value) -> np.ndarray:
+    """Evaluates a single predicate on a column of a SegmentTable.
+
+    Parameters
+    ----------
+    column : np.ndarray
+        The column values.
+    value : Any
+        The predicate. A callable is applied to the whole column and must return a boolean array. A tuple of two numbers defines an inclusive (lower, upper) range, either limit may be None, non-numeric entries do not match. A list, set or array selects all entries that are contained in it. A string matches all string entries that contain it (as the *in* operator would do). Any other value is tested for equality.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask of matching entries.
+    """
+    if callable(value):
+        return np.asarray(value(column), dtype=bool)
+    if isinstance(value, tuple) and len(value) == 2 and column.dtype.kind == "O" and \
+            all(v is None or _is_number(v) for v in value) and not all(v is None for v in value):
+        numeric = np.fromiter((_is_number(c) for c in column), dtype=bool, count=len(column))
+        column = np.array([c if n else np.nan for c, n in zip(column, numeric)], dtype=float)
+    if isinstance(value, tuple) and len(value) == 2 and column.dtype.kind in "iuf":
+        mask = np.ones(len(column), dtype=bool)
+        if value[0] is not None:
+            mask &= column >= value[0]
+        if value[1] is not None:
+            mask &= column <= value[1]
+        return mask
+    if isinstance(value, (list, set, frozenset, np.ndarray)):
+        return np.isin(column, list(value))
+    if isinstance(value, str):
+        if column.dtype.kind == "U":
+            return np.char.find(column, value) >= 0
+        return np.fromiter((isinstance(c, str) and value in c for c in column), dtype=bool, count=len(column))
+    if column.dtype.kind == "O":
+        return np.fromiter((_equals(c, value) for c in column), dtype=bool, count=len(column))
+    if not np.isscalar(value):
+        return np.zeros(len(column), dtype=bool)
+    return np.asarray(column == value, dtype=bool)
+
+
+class SegmentTable(object):
+    """Column store of cheap, indexable attributes (e.g. name, type, start time and duration, settings) of a list of data segments, i.e. ReProRuns or Stimuli.
+    Predicates on these columns are evaluated as array operations, the segments themselves are only touched for the matching rows.
+
+    .. code-block:: python
+
+        table = dataset.repro_table
+        beats = table.select(name="Beats", duration=(1.0, None))
+    """
+    def __init__(self, items, columns) -> None:
+        """Create a SegmentTable.
+
+        Parameters
+        ----------
+        items : list
+            The segments, e.g. ReProRun or Stimulus instances.
+        columns : dict
+            The column name as key and the list of values (one for each item) as value.
+
+        Raises
+        ------
+        ValueError
+            If the length of a column does not match the number of items.
+        """
+        super().__init__()
+        self._items = list(items)
+        self._columns = {}
+        for name, values in columns.items():
+            self.add_column(name, values)
+
+    def add_column(self, name, values):
+        """Adds or replaces a column.
+
+        Parameters
+        ----------
+        name : str
+            The column name.
+        values : list or np.ndarray
+            The values, one for each segment.
+
+        Raises
+        ------
+        ValueError
+            If the number of values does not match the number of segments.
+        """
+        if len(values) != len(self._items):
+            raise ValueError(f"SegmentTable: column {name} has {len(values)} entries, expected {len(self._items)}!")
+        if isinstance(values, np.ndarray):
+            self._columns[name] = values
+        else:
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            if len(values) > 0 and all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool) for v in values):
+                column = column.astype(float if any(isinstance(v, (float, np.floating)) for v in values) else int)
+            elif len(values) > 0 and all(isinstance(v, str) for v in values):
+                column = column.astype(str)
+            self._columns[name] = column
+
+    @property
+    def columns(self) -> list:
+        """The names of the columns.
+
+        Returns
+        -------
+        list of str
+            The column names.
+        """
+        return list(self._columns.keys())
+
+    @property
+    def items(self) -> list:
+        """The indexed segments.
+
+        Returns
+        -------
+        list
+            The segments in table order.
+        """
+        return self._items
+
+    def column(self, name) -> np.ndarray:
+        """Returns the values of a column.
+
+        Parameters
+        ----------
+        name : str
+            The column name.
+
+        Returns
+        -------
+        np.ndarray
+            The column values.
+
+        Raises
+        ------
+        KeyError
+            If the column does not exist.
+        """
+        if name not in self._columns:
+            raise KeyError(f"SegmentTable: column {name} does not exist! Columns are {self.columns}.")
+        return self._columns[name]
+
+    def mask(self, **predicates) -> np.ndarray:
+        """Evaluates the given predicates (column name as key, see ``rlxnix.utils.query._matches`` for the possible values) and returns the combined boolean mask.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask, True for all segments that match all predicates.
+
+        Raises
+        ------
+        KeyError
+            If a predicate refers to an unknown column.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in predicates.items():
+            if not np.any(mask):
+                break
+            mask &= _matches(self.column(name), value)
+        return mask
+
+    def select(self, mask=None, **predicates) -> list:
+        """Returns the segments that match all predicates.
+
+        Parameters
+        ----------
+        mask : np.ndarray, optional
+            Additional boolean mask that is combined with the predicates, by default None
+
+        Returns
+        -------
+        list
+            The matching segments in table order.
+        """
+        m = self.mask(**predicates)
+        if mask is not None:
+            m &= mask
+        return [self._items[i] for i in np.nonzero(m)[0]]
+
+    def __contains__(self, name) -> bool:
+        return name in self._columns
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __repr__(self) -> str:
+        return f"SegmentTable with {len(self)} rows and columns {self.columns}"
+
+
+def _settings_section(tag):
+    index = section_index(tag.file)
+    sections = index.find(type="settings", within=tag.metadata) + index.find(name="settings", within=tag.metadata)
+    return sections[0] if len(sections) > 0 else None
+
+
+def _property_value(prop):
+    values = [v.decode() if isinstance(v, bytes) else v for v in prop.values]
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+def build_repro_table(repros) -> SegmentTable:
+    """Creates the SegmentTable of a list of ReProRuns. Columns are the name, type, start_time, duration and stop_time of the runs plus one column for each repro setting found in the runs' metadata. Numeric settings that are missing in some runs are NaN there, other missing settings are None.
+
+    Parameters
+    ----------
+    repros : list of rlxnix.ReProRun
+        The repro runs.
+
+    Returns
+    -------
+    SegmentTable
+        The table.
+    """
+    columns = {"name": [r.name for r in repros],
+               "type": [r.type for r in repros],
+               "start_time": np.array([r.start_time for r in repros], dtype=float),
+               "duration": np.array([r.duration for r in repros], dtype=float)}
+    columns["stop_time"] = columns["start_time"] + columns["duration"]
+    settings = {}
+    for i, r in enumerate(repros):
+        if r.repro_tag.metadata is None:
+            continue
+        section = _settings_section(r.repro_tag)
+        if section is None:
+            continue
+        for p in section.props:
+            if p.name in columns:
+                continue
+            if p.name not in settings:
+                settings[p.name] = [None] * len(repros)
+            settings[p.name][i] = _property_value(p)
+    for name, values in settings.items():
+        present = [v for v in values if v is not None]
+        if len(present) < len(values) and len(present) > 0 and all(_is_number(v) for v in present):
+            settings[name] = np.array([np.nan if v is None else v for v in values], dtype=float)
+    columns.update(settings)
+    logging.debug(f"repro_table: indexed {len(repros)} repro runs, settings {list(settings.keys())}")
+    return SegmentTable(repros, columns)
+
+
+def build_stimulus_table(stimuli) -> SegmentTable:
+    """Creates the SegmentTable of a list of Stimuli. Columns are the name, type, index, start_time, duration and stop_time of the stimulus outputs, the timing features delay, abs_time (the absolute start time), and repro_tag_id, the next_stimulus_start and max_after (the time that can be read after stimulus stop), plus one column for each scalar mutable feature (e.g. the DeltaF of a Beats stimulus) that is stored in the respective MultiTag.
+    The feature data is read once per MultiTag, missing values are NaN (None for the repro_tag_id).
+
+    Parameters
+    ----------
+    stimuli : list of rlxnix.Stimulus
+        The stimuli.
+
+    Returns
+    -------
+    SegmentTable
+        The table.
+    """
+    columns = {"name": [s.name for s in stimuli],
+               "type": [s.type for s in stimuli],
+               "index": np.array([s._index for s in stimuli], dtype=int),
+               "start_time": np.array([s.start_time for s in stimuli], dtype=float),
+               "duration": np.array([s.duration for s in stimuli], dtype=float)}
+    columns["stop_time"] = columns["start_time"] + columns["duration"]
+    next_starts = [s.next_stimulus_start for s in stimuli]
+    columns["next_stimulus_start"] = np.array([np.nan if n is None else n for n in next_starts], dtype=float)
+    columns["max_after"] = np.where(np.isnan(columns["next_stimulus_start"]), 0.0,
+                                    columns["next_stimulus_start"] - columns["stop_time"])
+    timing_columns = {"delay": np.full(len(stimuli), np.nan),
+                      "abs_time": np.full(len(stimuli), np.nan),
+                      "repro_tag_id": np.full(len(stimuli), None, dtype=object)}
+    columns.update(timing_columns)
+
+    settings = {}
+    groups = {}
+    for i, s in enumerate(stimuli):
+        groups.setdefault(s.id, []).append(i)
+    for rows in groups.values():
+        first = stimuli[rows[0]]
+        positions = columns["index"][rows]
+        timing = first.timing
+        for key, values in (("delay", timing.delay), ("abs_time", timing.absolute_start_time),
+                            ("repro_tag_id", timing.repro_tag_id)):
+            if values is not None:
+                timing_columns[key][rows] = values[positions]
+        for _, name, feature_type in first.features:
+            if "mutable" not in feature_type:
+                continue
+            data = first._feature_array(name)
+            if data.dtype.kind not in "iufb" or data.shape[0] <= np.max(positions) or np.prod(data.shape[1:], dtype=int) != 1:
+                continue
+            suffix = name.split(first.name + "_")[-1]
+            if suffix in columns:
+                continue
+            if suffix not in settings:
+                settings[suffix] = np.full(len(stimuli), np.nan)
+            settings[suffix][rows] = data.reshape(data.shape[0])[positions]
+    columns.update(settings)
+    return SegmentTable(stimuli, columns)
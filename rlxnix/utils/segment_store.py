@@ -0,0 +1,254 @@
+import os
+import h5py
+import logging
+import numpy as np
+import pandas as pd
+
+from . import indexing
+
+
+class SegmentStore(object):
+    """HDF5 file that contains the stimulus aligned segments of continuous traces of a dataset, one HDF5 dataset (and chunk) per stimulus and trace, together with the DataLink catalog of the dataset. Stores are written by ``Dataset.export_segments``, ``rlxnix.load_data_segment`` reads from them if the store is found and contains the requested data.
+
+    The file is named after the dataset, e.g. ``2021-11-11-aa.segments.h5`` for ``2021-11-11-aa.nix``. Layout:
+
+        * /catalog/<column>: the columns of the DataLink catalog (Dataset.to_pandas).
+        * /traces/<trace name>: the sampling of the trace in the nix file as attributes.
+        * /traces/<trace name>/<tag id>/<stimulus index>: the data, the attributes index_start and index_stop give the index range in the nix data array.
+    """
+    suffix = ".segments.h5"
+
+    def __init__(self, filename, mode="r") -> None:
+        """Opens a store.
+
+        Parameters
+        ----------
+        filename : str
+            The path of the store file.
+        mode : str, optional
+            The h5py file mode, by default "r", i.e. read-only.
+        """
+        super().__init__()
+        self._filename = filename
+        self._file = h5py.File(filename, mode)
+
+    @staticmethod
+    def store_filename(dataset_name, location=".") -> str:
+        """The name of the store file of a dataset.
+
+        Parameters
+        ----------
+        dataset_name : str
+            The dataset name, e.g. "2021-11-11-aa.nix", path information is ignored.
+        location : str, optional
+            The folder of the store, by default "."
+
+        Returns
+        -------
+        str
+            The path of the store file.
+        """
+        name = os.path.basename(dataset_name.replace("\\", "/"))
+        if name.endswith(".nix"):
+            name = name[:-4]
+        return os.path.join(location, name + SegmentStore.suffix)
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @property
+    def traces(self) -> list:
+        """The names of the stored traces.
+
+        Returns
+        -------
+        list of str
+            The trace names.
+        """
+        return list(self._file["traces"].keys()) if "traces" in self._file else []
+
+    @property
+    def catalog(self) -> pd.DataFrame:
+        """The DataLink catalog of the dataset.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The catalog, the index column has the nullable Int64 dtype.
+        """
+        group = self._file["catalog"]
+        columns = {}
+        for name in group.attrs["columns"]:
+            data = group[name][:]
+            if data.dtype.kind == "O" or data.dtype.kind == "S":
+                data = [v.decode() if isinstance(v, bytes) else v for v in data]
+            columns[name] = data
+        df = pd.DataFrame(columns)
+        df["index"] = pd.array(np.where(df["index"] < 0, None, df["index"]), dtype="Int64")
+        return df
+
+    def segment(self, trace_name, tag_id, index):
+        """Returns the stored segment.
+
+        Parameters
+        ----------
+        trace_name : str
+            The trace name.
+        tag_id : str
+            The id of the stimulus MultiTag.
+        index : int
+            The stimulus index.
+
+        Returns
+        -------
+        h5py.Dataset
+            The stored data, None if the segment is not in the store.
+        """
+        key = f"traces/{trace_name}/{tag_id}/{index}"
+        return self._file[key] if key in self._file else None
+
+    def read(self, data_link, trace_name, before=0.0, after=0.0):
+        """Reads a data segment from the store. The data and time axis are the same as if they were read from the nix file using load_data_segment.
+
+        Parameters
+        ----------
+        data_link : rlxnix.DataLink
+            The DataLink of a stimulus segment.
+        trace_name : str
+            The trace name.
+        before : float, optional
+            Time before the segment, by default 0.0
+        after : float, optional
+            Time after the segment, by default 0.0
+
+        Returns
+        -------
+        np.ndarray
+            The data.
+        np.ndarray
+            The time axis.
+        Or None, if the store does not contain the requested data, e.g. because before or after exceed the stored time range.
+        """
+        from .data_loader import SegmentType, _segment_interval
+        if data_link.segment_type != str(SegmentType.StimulusSegment):
+            return None
+        if "traces" not in self._file or trace_name not in self._file["traces"]:
+            return None
+        segment = self.segment(trace_name, data_link.tag_id, data_link.index)
+        if segment is None:
+            return None
+        trace = self._file["traces"][trace_name]
+        offset = trace.attrs["offset"]
+        interval = trace.attrs["sampling_interval"]
+        start_time, stop_time = _segment_interval(data_link, before, after, log=False)
+        starts, stops, valid, errors = indexing.sampled_slices([start_time], [stop_time - start_time], offset,
+                                                               interval, trace.attrs["length"])
+        if errors[0]:
+            return None
+        if not valid[0]:
+            data = np.array([])
+        elif starts[0] >= segment.attrs["index_start"] and stops[0] <= segment.attrs["index_stop"]:
+            data = segment[starts[0] - segment.attrs["index_start"]:stops[0] - segment.attrs["index_start"]]
+        else:
+            return None
+        _segment_interval(data_link, before, after)  # log the warnings as load_data_segment does
+        time = np.arange(len(data)) * interval + (offset if offset else 0.0)
+        time -= before
+        return data, time
+
+    def is_open(self) -> bool:
+        return bool(self._file)
+
+    def close(self):
+        if self.is_open():
+            self._file.close()
+
+    def __repr__(self) -> str:
+        return f"SegmentStore {self._filename} at {hex(id(self))}"
+
+
+def write_segment_store(dataset, store_path, traces, before=0.0, after=0.0) -> str:
+    """Writes the stimulus aligned segments of the given continuous traces and the DataLink catalog of a dataset to a SegmentStore. An existing store of the dataset is replaced.
+
+    Parameters
+    ----------
+    dataset : rlxnix.Dataset
+        The dataset.
+    store_path : str
+        The folder of the store.
+    traces : list of str
+        The names of the continuous traces.
+    before : float, optional
+        Time before stimulus onset that is stored, limited to the stimulus delay, by default 0.0
+    after : float, optional
+        Time after stimulus offset that is stored, limited to the start of the next stimulus, by default 0.0
+
+    Returns
+    -------
+    str
+        The path of the store file.
+
+    Raises
+    ------
+    ValueError
+        If a trace does not exist.
+    """
+    from .data_loader import load_data_segments, _segment_interval, SegmentType
+    df = dataset.to_pandas()
+    stimuli = df[df.segment_type == str(SegmentType.StimulusSegment)]
+    dataset_name = df.dataset_name.values[0] if len(df) > 0 else os.path.basename(dataset.name)
+    data_location = os.path.dirname(os.path.abspath(dataset.name))
+    os.makedirs(store_path, exist_ok=True)
+    filename = SegmentStore.store_filename(dataset_name, store_path)
+    logging.info(f"write_segment_store: exporting {len(stimuli)} stimulus segments of traces {traces} to {filename}.")
+
+    store = SegmentStore(filename, "w")
+    try:
+        h5 = store._file
+        h5.attrs["dataset_name"] = dataset_name
+        h5.attrs["before"] = before
+        h5.attrs["after"] = after
+        _write_catalog(h5.create_group("catalog"), df)
+        trace_group = h5.create_group("traces")
+        for trace_name in traces:
+            if trace_name not in dataset.data_traces:
+                if trace_name in dataset.event_traces:
+                    logging.warning(f"write_segment_store: trace {trace_name} is not a continuous trace, skipped!")
+                    continue
+                logging.error(f"write_segment_store: trace {trace_name} does not exist!")
+                raise ValueError(f"write_segment_store: trace {trace_name} does not exist!")
+            trace = dataset.data_traces[trace_name]
+            dimension = trace.data_array.dimensions[0]
+            group = trace_group.create_group(trace_name)
+            group.attrs["offset"] = dimension.offset if dimension.offset else 0.0
+            group.attrs["sampling_interval"] = dimension.sampling_interval
+            group.attrs["length"] = trace.data_array.shape[0]
+            intervals = [_segment_interval(dl, before, after, log=False) for dl in stimuli.itertuples()]
+            starts, stops, _, _ = indexing.sampled_slices([i[0] for i in intervals], [i[1] - i[0] for i in intervals],
+                                                          dimension.offset, dimension.sampling_interval,
+                                                          trace.data_array.shape[0])
+            segments = load_data_segments(stimuli, trace_name, before, after, data_location=data_location)
+            for dl, start, stop, (data, _) in zip(stimuli.itertuples(), starts, stops, segments):
+                if data is None:
+                    continue
+                tag_group = group.require_group(dl.tag_id)
+                ds = tag_group.create_dataset(str(dl.index), data=data, chunks=data.shape if len(data) > 0 else None)
+                ds.attrs["index_start"] = start
+                ds.attrs["index_stop"] = start + len(data)
+    finally:
+        store.close()
+    return filename
+
+
+def _write_catalog(group, df):
+    group.attrs["columns"] = list(df.columns)
+    for c in df.columns:
+        values = df[c]
+        if c == "index":
+            group.create_dataset(c, data=np.array([-1 if v is None or pd.isna(v) else v for v in values], dtype=int))
+        elif c in ["start_time", "stop_time", "max_before", "max_after", "mapping_version"]:
+            group.create_dataset(c, data=np.array([np.nan if v is None else v for v in values], dtype=float))
+        else:
+            group.create_dataset(c, data=np.array(["" if v is None else v for v in values], dtype=object),
+                                 dtype=h5py.string_dtype())
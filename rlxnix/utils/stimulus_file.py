@@ -0,0 +1,170 @@
+import os
+import copy
+import json
+import logging
+import numpy as np
+
+from .buffers import StimulusFileBuffer
+
+cache_folder = ".rlxnix_cache"
+
+
+def _parse_header(lines, dat):
+    """Parses the comment lines of a block into dat, the same way relacs' own loaders do.
+    """
+    keyon = False
+    currkey = None
+    for l in lines:
+        if '---' in l:
+            continue
+        if ":" in l:
+            tmp = [e.strip() for e in l[1:].split(':')]
+            if currkey is None:
+                dat[tmp[0]] = tmp[1]
+            else:
+                dat[currkey][tmp[0]] = tmp[1]
+        elif "=" in l:
+            tmp = [e.strip() for e in l[1:].split('=')]
+            if currkey is None:
+                dat[tmp[0]] = tmp[1]
+            else:
+                dat[currkey][tmp[0]] = tmp[1]
+        elif l[1:].lower().startswith('key'):
+            dat['key'] = []
+            keyon = True
+        elif keyon:
+            dat['key'].append(tuple([e.strip() for e in l[1:].split()]))
+        else:
+            currkey = l[1:].strip()
+            dat[currkey] = {}
+
+
+def _parse_data(lines) -> np.ndarray:
+    """Converts the lines of a numeric block at once, rows x columns.
+    """
+    columns = len(lines[0].split())
+    values = np.array(" ".join(lines).split(), dtype=float)
+    if columns == 0 or len(values) != len(lines) * columns:
+        return np.array([[float(e) for e in l.split()] for l in lines])
+    return values.reshape(len(lines), columns)
+
+
+def parse_stimulus_file(filename) -> tuple:
+    """Parses a data file saved by relacs, e.g. a stimulus file. Header (comment) and data lines are separated first, the numbers of each data block are then converted in bulk.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+
+    Returns
+    -------
+    tuple of dict
+        One dictionary per data block containing the header information and the data ("data" key, rows x columns).
+    """
+    with open(filename, 'r') as fid:
+        lines = [l.strip() for l in fid.read().splitlines()]
+
+    ret = []
+    header = []
+    data = []
+    for l in lines:
+        if (not l or l.startswith('#')) and len(data) > 0:
+            dat = {}
+            _parse_header(header, dat)
+            dat['data'] = _parse_data(data)
+            ret.append(dat)
+            header = []
+            data = []
+        if l.startswith('#'):
+            header.append(l)
+        elif l:
+            data.append(l)
+    dat = {}
+    _parse_header(header, dat)
+    dat['data'] = _parse_data(data) if len(data) > 0 else []
+    ret.append(dat)
+    return tuple(ret)
+
+
+def _cache_filename(filename) -> str:
+    folder, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(folder, cache_folder, name + ".npz")
+
+
+def _read_binary_cache(filename, mtime):
+    cache_file = _cache_filename(filename)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file, allow_pickle=False) as npz:
+            if float(npz["mtime"]) != mtime:
+                return None
+            headers = json.loads(str(npz["headers"]))
+            ret = []
+            for i, dat in enumerate(headers):
+                if isinstance(dat.get("key"), list):
+                    dat["key"] = [tuple(k) for k in dat["key"]]
+                dat["data"] = npz[f"data_{i}"] if f"data_{i}" in npz else []
+                ret.append(dat)
+            return tuple(ret)
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"read_stimulus_file: could not read cache file {cache_file}: {e}")
+        return None
+
+
+def _write_binary_cache(filename, mtime, blocks):
+    cache_file = _cache_filename(filename)
+    headers = [{k: v for k, v in dat.items() if k != "data"} for dat in blocks]
+    arrays = {f"data_{i}": dat["data"] for i, dat in enumerate(blocks) if len(dat["data"]) > 0}
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = cache_file + f".{os.getpid()}.tmp.npz"
+        np.savez(temp_file, mtime=mtime, headers=json.dumps(headers), **arrays)
+        os.replace(temp_file, cache_file)
+    except OSError as e:
+        logging.warning(f"read_stimulus_file: could not write cache file {cache_file}: {e}")
+
+
+def _copy_headers(blocks) -> tuple:
+    """Copies the header dictionaries of the blocks, the data arrays are shared.
+    """
+    return tuple(copy.deepcopy(dat, {id(dat["data"]): dat["data"]}) if isinstance(dat["data"], np.ndarray)
+                 else copy.deepcopy(dat) for dat in blocks)
+
+
+def read_stimulus_file(filename, binary_cache=False) -> tuple:
+    """Reads a relacs stimulus file (see parse_stimulus_file). Parsed files are kept in the process-wide StimulusFileBuffer (least recently used files are dropped), keyed by path and modification time, so that files that are shared by many datasets are parsed once.
+
+    With binary_cache, the parsed data is additionally stored in a .npz file in the .rlxnix_cache subfolder of the file's folder and read from there as long as the file has not been modified.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+    binary_cache : bool, optional
+        Whether to read and write the binary cache, by default False
+
+    Returns
+    -------
+    tuple of dict
+        One dictionary per data block containing the header information and the data. The dictionaries are copies, the data arrays are shared with the buffer and are read-only.
+    """
+    path = os.path.abspath(filename)
+    mtime = os.path.getmtime(path)
+    buffer = StimulusFileBuffer()
+    blocks = buffer.get(path, mtime)
+    if blocks is not None:
+        return _copy_headers(blocks)
+    if binary_cache:
+        blocks = _read_binary_cache(path, mtime)
+    if blocks is None:
+        logging.debug(f"read_stimulus_file: parsing {path}")
+        blocks = parse_stimulus_file(path)
+        if binary_cache:
+            _write_binary_cache(path, mtime, blocks)
+    for dat in blocks:
+        if isinstance(dat["data"], np.ndarray):
+            dat["data"].setflags(write=False)
+    buffer.put(path, mtime, blocks)
+    return _copy_headers(blocks)
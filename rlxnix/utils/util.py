@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 
 from tqdm import tqdm
+from collections.abc import Mapping
 
 def nix_metadata_to_dict(section):
     info = {}
@@ -15,6 +16,83 @@ def nix_metadata_to_dict(section):
     return info
 
 
+def find_metadata_path(metadata, key) -> tuple:
+    """Finds the path of a (dotted) key in a metadata dictionary. The first part of a dotted key is looked up in the dictionary itself or, if not found there, in its subdictionaries (depth first). The last part of the key does not need to exist.
+
+    Parameters
+    ----------
+    metadata : dict
+        The metadata dictionary.
+    key : str
+        The key, e.g. "Amplitude" or "Sine.Frequency".
+
+    Returns
+    -------
+    tuple of str
+        The keys that lead to the entry, None if a part of a dotted key could not be found.
+    """
+    def find_subdict(mdata, key, path):
+        if key in mdata.keys():
+            return path + (key,)
+        for k in mdata.keys():
+            if isinstance(mdata[k], dict):
+                found = find_subdict(mdata[k], key, path + (k,))
+                if found is not None:
+                    return found
+        return None
+
+    path = ()
+    parts = key.split(".")
+    for part in parts[:-1]:
+        subpath = (part,) if part in metadata.keys() else find_subdict(metadata, part, ())
+        if subpath is None or not isinstance(get_metadata_entry(metadata, subpath), dict):
+            logging.error(f"Could not find subdict for key {part}! Skipping")
+            return None
+        metadata = get_metadata_entry(metadata, subpath)
+        path += subpath
+    return path + (parts[-1],)
+
+
+def get_metadata_entry(metadata, path):
+    """Returns the entry of a metadata dictionary at the given path.
+
+    Parameters
+    ----------
+    metadata : dict
+        The metadata dictionary.
+    path : tuple of str
+        The keys that lead to the entry.
+
+    Returns
+    -------
+    Any
+        The entry.
+    """
+    for key in path:
+        metadata = metadata[key]
+    return metadata
+
+
+def apply_metadata_delta(metadata, delta) -> dict:
+    """Sets the entries given in delta in the metadata dictionary.
+
+    Parameters
+    ----------
+    metadata : dict
+        The metadata dictionary, it is modified in place.
+    delta : list
+        List of (path, value) pairs, the path is the sequence of keys leading to the entry (see find_metadata_path).
+
+    Returns
+    -------
+    dict
+        The modified metadata dictionary.
+    """
+    for path, value in delta:
+        get_metadata_entry(metadata, path[:-1])[path[-1]] = value
+    return metadata
+
+
 def np_encoder(object : np.generic):
     """Makes sure to properly convert numpy types for the json dump
 
@@ -38,12 +116,14 @@ def metadata_to_json(metadata_dict: dict)->str:
     Parameters
     ----------
     metadata_dict : dict
-        The metadata dictionary
+        The metadata dictionary, or a dict-like MetadataProxy which will be converted to a dictionary.
     Returns
     -------
     str
         A json string.
     """
+    if isinstance(metadata_dict, Mapping) and not isinstance(metadata_dict, dict):
+        metadata_dict = metadata_dict.to_dict()
     return json.dumps(metadata_dict, default=np_encoder)
 
 
@@ -66,6 +146,38 @@ def convert_path(path):
     return converted
 
 
+def _concat_dtype(values):
+    """The dtype pandas assigns to a column that is created by concatenating one-row DataFrames, one for each of the given values.
+    """
+    samples = {}
+    for v in values:
+        samples.setdefault(type(v), v)
+    frames = [pd.DataFrame({"column": [v]}) for v in samples.values()]
+    return pd.concat(frames, ignore_index=True)["column"].dtype
+
+
+def columns_to_pandas(columns) -> pd.DataFrame:
+    """Creates a pandas.DataFrame from columns of values. The column dtypes are the same as if the DataFrame had been created row by row (see data_links_to_pandas).
+
+    Parameters
+    ----------
+    columns : dict
+        Column names as keys, lists of values as values. All lists must have the same length.
+
+    Returns
+    -------
+    pd.DataFrame
+        The DataFrame.
+    """
+    data = {}
+    for name, values in columns.items():
+        if len(values) == 0:
+            data[name] = pd.Series([], dtype=object)
+        else:
+            data[name] = pd.Series(values, dtype=_concat_dtype(values))
+    return pd.DataFrame(data)
+
+
 def data_links_to_pandas(data_links) -> pd.DataFrame:
     """Export the rlxnix.DataLink objects to a pandas.DataFrame.
 
@@ -27,6 +27,7 @@ with open(README, encoding="utf-8") as f:
 
 install_req = ["numpy", "scipy", "h5py", "pandas",
                "matplotlib", "nixio>=1.5", "tqdm"]
+extras_req = {"catalog": ["pyarrow"]}
 
 setup(
     name=NAME,
@@ -37,6 +38,7 @@ setup(
     classifiers=classifiers,
     packages=find_packages(),
     install_requires=install_req,
+    extras_require=extras_req,
     python_requires=">=3.6",
     package_data={"rlxnix": [
         'utils/default_config.json', 'info.json']},